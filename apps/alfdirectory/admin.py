@@ -58,13 +58,17 @@ class FacilityAdmin(admin.ModelAdmin):
     def handle_upload(self, request):
         temp_file_name = "/tmp/alf-directory-upload.pdf"
         f = request.FILES["pdf_file"]
-        with open(temp_file_name, "w") as destination:
+        with open(temp_file_name, "wb") as destination:
             for chunk in f.chunks():
                 destination.write(chunk)
 
-        facilities = import_facilities_from_pdf(temp_file_name)
+        result = import_facilities_from_pdf(temp_file_name)
 
-        messages.success(request, "Imported %s facilities" % len(facilities))
+        messages.success(
+            request,
+            "Imported %s facilities (%s created, %s updated, %s deleted)"
+            % (result.parsed, result.created, result.updated, result.deleted),
+        )
         return HttpResponseRedirect(
             reverse(
                 "admin:%s_%s_changelist" % (self.model._meta.app_label, self.model._meta.model_name)
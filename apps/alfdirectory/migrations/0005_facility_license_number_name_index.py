@@ -0,0 +1,19 @@
+# Generated by Django 3.2.19 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("alfdirectory", "0004_alfdirectory_state_migration"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="facility",
+            index=models.Index(
+                fields=["license_number", "name"], name="alfdirector_license_251b83_idx"
+            ),
+        ),
+    ]
@@ -23,6 +23,7 @@ class Facility(models.Model):
 
     class Meta:
         verbose_name_plural = "facilities"
+        indexes = [models.Index(fields=["license_number", "name"])]
 
     @property
     def capacity(self):
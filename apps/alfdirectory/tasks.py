@@ -1,3 +1,4 @@
+import logging
 import re
 
 import requests
@@ -9,6 +10,9 @@ from .utils import import_facilities_from_pdf
 AHCA_BASE_URL = "http://ahca.myflorida.com/MCHQ/Health_Facility_Regulation/Assisted_Living/"
 AHCA_DOWNLOADS_URL = AHCA_BASE_URL + "alf.shtml"
 PDF_URL_RE = re.compile("^docs/alf/Directory_ALF")
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -22,8 +26,15 @@ def import_ahca_facilities():
             r = requests.get(full_pdf_url, stream=True)
             if r.status_code == 200:
                 temp_file_name = "/tmp/alf-directory-upload.pdf"
-                with open(temp_file_name, "w") as destination:
-                    for chunk in r.iter_content():
+                with open(temp_file_name, "wb") as destination:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                         destination.write(chunk)
 
-                import_facilities_from_pdf(temp_file_name)
+                result = import_facilities_from_pdf(temp_file_name)
+                logger.info(
+                    "AHCA import: %s parsed, %s created, %s updated, %s deleted",
+                    result.parsed,
+                    result.created,
+                    result.updated,
+                    result.deleted,
+                )
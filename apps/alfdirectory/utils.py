@@ -1,28 +1,38 @@
-import operator
+import csv
+import io
 import re
 import subprocess
-from functools import reduce
+from collections import namedtuple
 
-from django.db import transaction
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
 
 from .models import Facility
 
+name_re = re.compile(r"\s{3,}(.+?)\s{2,}LIC TYPE")
+license_re = re.compile(r"License #(\d+)")
+oss_bed_re = re.compile(r"OSS BEDS : (\d+)")
+private_beds_label = re.compile(r"PRIVATE BEDS[ :]*$")
+private_beds_value = re.compile(r"(\d+)$")
 
-def import_facilities_from_pdf(temp_file_name):
-    name_re = re.compile(r"\s{3,}(.+?)\s{2,}LIC TYPE")
-    license_re = re.compile(r"License #(\d+)")
-    oss_bed_re = re.compile(r"OSS BEDS : (\d+)")
-    private_beds_label = re.compile(r"PRIVATE BEDS[ :]*$")
-    private_beds_value = re.compile(r"(\d+)$")
+ParsedFacility = namedtuple("ParsedFacility", "name license_number oss_beds private_beds")
+ImportResult = namedtuple("ImportResult", "parsed created updated deleted")
 
-    facilities = []
-    private_beds_label_found = False
+IMPORT_TABLE = "alfdirectory_facility_import"
 
-    output = subprocess.check_output(["pdftotext", "-layout", temp_file_name, "-"])
-    lines = output.split("\n")
+
+def parse_facilities(lines):
+    """
+    Parses the `pdftotext -layout` output of the AHCA directory, yielding a
+    `ParsedFacility` as soon as its last field (the private beds) is read.
+    """
+    name = license_number = None
+    oss_beds = 0
+    private_beds_label_found = False
 
     for line in lines:
+        line = line.rstrip("\n")
+
         if "LIC TYPE" in line:
             name_match = name_re.search(line)
             if name_match:
@@ -36,7 +46,7 @@ def import_facilities_from_pdf(temp_file_name):
         if "OSS BEDS" in line:
             oss_bed_match = oss_bed_re.search(line)
             if oss_bed_match:
-                oss_beds = oss_bed_match.group(1)
+                oss_beds = int(oss_bed_match.group(1))
             else:
                 # Some lines don't have a number after OSS Beds: for some reason.
                 oss_beds = 0
@@ -45,37 +55,147 @@ def import_facilities_from_pdf(temp_file_name):
             private_beds_label_found = False
             private_beds_value_match = private_beds_value.search(line)
             if private_beds_value_match:
-                private_beds = private_beds_value_match.group(1)
-                facilities.append(
-                    Facility(
-                        name=name,
-                        license_number=license_number,
-                        oss_beds=oss_beds,
-                        private_beds=private_beds,
-                    )
+                yield ParsedFacility(
+                    name=name,
+                    license_number=license_number,
+                    oss_beds=oss_beds,
+                    private_beds=int(private_beds_value_match.group(1)),
                 )
 
         if private_beds_label.search(line):
             private_beds_label_found = True
 
+
+def import_facilities_from_pdf(temp_file_name):
+    """
+    Syncs the directory with the facilities found in the AHCA pdf.
+
+    The pdf text is streamed through the parser into a temporary table, which
+    is then diffed against `alfdirectory_facility` with one DELETE, one UPDATE
+    and one INSERT so the import only touches the rows that actually changed.
+    """
+    process = subprocess.Popen(
+        ["pdftotext", "-layout", temp_file_name, "-"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    try:
+        with process.stdout:
+            buffer, parsed = _facilities_to_csv(parse_facilities(process.stdout))
+    except BaseException:
+        # Don't leave pdftotext running (or a zombie) when the parsing fails.
+        process.kill()
+        process.wait()
+        raise
+    retcode = process.wait()
+    if retcode:
+        raise subprocess.CalledProcessError(retcode, process.args)
+
+    return _import_csv(buffer, parsed)
+
+
+def import_facilities(facilities):
+    """
+    Syncs the directory with the `ParsedFacility` of `facilities`.
+    """
+    return _import_csv(*_facilities_to_csv(facilities))
+
+
+def _import_csv(buffer, parsed):
+    # Nothing parsed means the pdf format changed, not an empty directory:
+    # don't delete the whole directory.
+    if not parsed:
+        raise ValueError("No facilities found in the AHCA directory")
+
     with transaction.atomic():
-        Facility.objects.exclude(
-            reduce(
-                operator.or_,
-                (
-                    Q(license_number=facility.license_number, name=facility.name)
-                    for facility in facilities
-                ),
+        return ImportResult(parsed, *_apply_import(buffer))
+
+
+def _facilities_to_csv(facilities):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for facility in facilities:
+        writer.writerow(facility)
+        count += 1
+    buffer.seek(0)
+    return buffer, count
+
+
+def _apply_import(buffer):
+    table = Facility._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE {import_table} (
+                name varchar(255) NOT NULL,
+                license_number varchar(255) NOT NULL,
+                oss_beds integer NOT NULL,
+                private_beds integer NOT NULL
+            ) ON COMMIT DROP
+            """.format(
+                import_table=IMPORT_TABLE
+            )
+        )
+        cursor.copy_expert(
+            "COPY {import_table} (name, license_number, oss_beds, private_beds) "
+            "FROM STDIN WITH (FORMAT csv)".format(import_table=IMPORT_TABLE),
+            buffer,
+        )
+        # The pdf may list a facility more than once, the last entry wins.
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE {import_table}_latest ON COMMIT DROP AS
+            SELECT DISTINCT ON (license_number, name) *
+            FROM {import_table}
+            ORDER BY license_number, name, ctid DESC
+            """.format(
+                import_table=IMPORT_TABLE
+            )
+        )
+        cursor.execute("ANALYZE {import_table}_latest".format(import_table=IMPORT_TABLE))
+
+        removed = """
+            SELECT f.id FROM {table} f
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {import_table}_latest i
+                WHERE i.license_number = f.license_number AND i.name = f.name
+            )
+        """.format(
+            table=table, import_table=IMPORT_TABLE
+        )
+        # Deleted through the ORM so the `on_delete` of the foreign keys to the
+        # directory (the trainings facilities) is applied, in bulk queries.
+        _, deleted_by_model = Facility.objects.filter(id__in=RawSQL(removed, [])).delete()
+        deleted = deleted_by_model.get(Facility._meta.label, 0)
+
+        cursor.execute(
+            """
+            UPDATE {table} f
+            SET oss_beds = i.oss_beds, private_beds = i.private_beds
+            FROM {import_table}_latest i
+            WHERE i.license_number = f.license_number
+                AND i.name = f.name
+                AND (f.oss_beds, f.private_beds) IS DISTINCT FROM (i.oss_beds, i.private_beds)
+            """.format(
+                table=table, import_table=IMPORT_TABLE
+            )
+        )
+        updated = cursor.rowcount
+
+        cursor.execute(
+            """
+            INSERT INTO {table} (name, license_number, oss_beds, private_beds)
+            SELECT i.name, i.license_number, i.oss_beds, i.private_beds
+            FROM {import_table}_latest i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table} f
+                WHERE f.license_number = i.license_number AND f.name = i.name
             )
-        ).delete()
-        for facility in facilities:
-            Facility.objects.update_or_create(
-                license_number=facility.license_number,
-                name=facility.name,
-                defaults={
-                    "oss_beds": facility.oss_beds,
-                    "private_beds": facility.private_beds,
-                },
+            """.format(
+                table=table, import_table=IMPORT_TABLE
             )
+        )
+        created = cursor.rowcount
 
-    return facilities
+    return created, updated, deleted
@@ -0,0 +1,395 @@
+"""
+Compiled read serializers.
+
+Serializing a list through a `ModelSerializer` walks the field tree of every
+row: `get_attribute`, `to_representation`, nested serializers... For the
+serializers made only of model columns, `compile_serializer` precompiles the
+walk into a flat list of (key, `.values()` lookup, function) mappings, so a
+list can be serialized straight from `queryset.values()`, without building
+model instances.
+
+A field is compiled when its output only depends on columns:
+
+- the fields of concrete model fields, including the primary keys of foreign
+  keys (`PrimaryKeyRelatedField`) and dotted sources through non null foreign
+  keys;
+- `get_<field>_display` fields of model choices;
+- `ThumbnailImageField` without thumbnail sizes;
+- nested model serializers of forward foreign keys and reverse one to ones,
+  compiled recursively;
+- many to many and reverse foreign keys, as primary keys or nested model
+  serializers, which are fetched with one `.values()` query per relation for
+  the whole list.
+
+Other fields (method fields, properties...) are compiled by hand: the
+`compiled_fields` of the serializer class map their names to `CompiledField`
+objects, which read columns or annotations of the queryset.
+
+The functions are the `to_representation` of the serializer fields, so the
+output is the same as the serializer's. Serializers with any other field or a
+custom `to_representation` are not compiled, `compile_serializer` returns None
+and the serializer is used as usual.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+
+from rest_framework import fields as drf_fields, relations, serializers
+
+from .fields import ThumbnailImageField, TimedeltaField
+
+# Fields whose `to_representation` only depends on the value of the column.
+COLUMN_FIELDS = (
+    drf_fields.BooleanField,
+    drf_fields.CharField,
+    drf_fields.ChoiceField,
+    drf_fields.DateField,
+    drf_fields.DateTimeField,
+    drf_fields.DecimalField,
+    drf_fields.DurationField,
+    drf_fields.EmailField,
+    drf_fields.FloatField,
+    drf_fields.IntegerField,
+    drf_fields.JSONField,
+    drf_fields.ReadOnlyField,
+    drf_fields.SlugField,
+    drf_fields.TimeField,
+    drf_fields.URLField,
+    drf_fields.UUIDField,
+    TimedeltaField,
+)
+
+
+class NotCompilable(Exception):
+    pass
+
+
+def identity(value):
+    return value
+
+
+# Alias of the primary key of the parent row in the queries of the relations.
+PARENT = "compiled_parent"
+
+
+class CompiledField(object):
+    """
+    The hand-written compilation of a serializer field, in the
+    `compiled_fields` of the serializer class.
+
+    The field reads the values of its `lookups`, relative to the model of the
+    serializer, then of its `annotation`: `annotation(prefix, context)`
+    returns the expression to annotate the list with, `prefix` being the
+    lookup of the model of the serializer from the listed model (e.g.
+    `OuterRef(prefix + "pk")`) and `context` the serializer context.
+
+    - `function(context, *values)` returns the representation of the field;
+    - or, without `function`, the single value is the representation;
+    - or `serializer`, a model serializer class, represents the object whose
+      primary key is the value;
+    - or `serializer` represents the objects of the many relation `source`,
+      filtered by `filter(context)` (no objects when it returns None).
+
+    The objects of `serializer` are fetched for all the rows at once. The
+    functions, annotations and filters share their logic with the methods of
+    the method fields, so both give the same output.
+    """
+
+    def __init__(
+        self, function=None, lookups=(), annotation=None, serializer=None, source=None, filter=None
+    ):
+        self.function = function
+        self.lookups = lookups
+        self.annotation = annotation
+        self.serializer = serializer
+        self.source = source
+        self.filter = filter
+
+
+class Relation(object):
+    """
+    Related objects fetched for all the rows at once: the objects of a many to
+    many or reverse foreign key (the rows of `query_name`), or, without
+    `many`, the object whose primary key the row has. `compiled` is the
+    `CompiledSerializer` of the nested serializer, or None for a list of
+    primary keys. `parent_lookup` is the lookup of the key of the row.
+    """
+
+    def __init__(self, model, query_name, compiled, parent_lookup="pk", many=True, filter=None):
+        self.model = model
+        self.query_name = query_name
+        self.compiled = compiled
+        self.parent_lookup = parent_lookup
+        self.many = many
+        self.filter = filter
+
+    def fetch(self, pks, context):
+        """
+        Returns the representations of the related objects of the rows `pks`,
+        by primary key of the row.
+        """
+        # Like `.all()` on the related manager, the related objects are in the
+        # default order of their model.
+        queryset = self.model._default_manager.filter(**{self.query_name + "__in": pks})
+        if self.filter is not None:
+            conditions = self.filter(context)
+            if conditions is None:
+                return {}
+            queryset = queryset.filter(**conditions)
+
+        parent = {PARENT: F(self.query_name)}
+        if self.compiled:
+            rows = self.compiled.values(queryset, context, **parent)
+        else:
+            rows = queryset.values("pk", **parent)
+        related = {}
+        for row in rows:
+            if self.compiled:
+                value = self.compiled.to_representation(row, context=context)
+            else:
+                value = row["pk"]
+            if self.many:
+                related.setdefault(row[PARENT], []).append(value)
+            else:
+                related[row[PARENT]] = value
+        return related
+
+    def get(self, related, value):
+        return related[self].get(value, [] if self.many else None)
+
+
+class CompiledSerializer(object):
+    def __init__(self, serializer):
+        self.lookups = []
+        self.annotations = []
+        self.relations = []
+        self.mappings = self.compile(serializer, "")
+
+    def compile(self, serializer, prefix):
+        """
+        Returns the mappings of the fields of `serializer`, reading the columns
+        of the model `prefix` leads to.
+        """
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise NotCompilable("{} has a custom to_representation".format(type(serializer)))
+
+        model = serializer.Meta.model
+        compiled_fields = getattr(serializer, "compiled_fields", {})
+        mappings = []
+        for field in serializer._readable_fields:
+            if field.field_name in compiled_fields:
+                compiled_field = compiled_fields[field.field_name]
+                mappings.append(self.compile_field(field, compiled_field, model, prefix))
+                continue
+
+            source = field.source
+            if source == "*":
+                raise NotCompilable("{} isn't a column".format(field.field_name))
+
+            if isinstance(field, (serializers.ListSerializer, relations.ManyRelatedField)):
+                mappings.append(self.compile_relation(field, model, prefix))
+                continue
+
+            display = source.startswith("get_") and source.endswith("_display")
+            attrs = (source[4:-8] if display else source).split(".")
+            lookup_model = model
+            for attr in attrs[:-1]:
+                # DRF doesn't output null for a missing object on the way.
+                foreign_key = self.get_model_field(lookup_model, attr, field)
+                if not foreign_key.many_to_one or foreign_key.null:
+                    raise NotCompilable("{} isn't a column".format(field.field_name))
+                lookup_model = foreign_key.related_model
+
+            model_field = self.get_model_field(lookup_model, attrs[-1], field)
+            lookup = prefix + "__".join(attrs[:-1] + [model_field.name])
+            if isinstance(field, serializers.ModelSerializer) and not display:
+                nested_prefix = lookup + "__"
+                if model_field.one_to_one and model_field.auto_created:
+                    # A reverse one to one, null when there is no related object.
+                    lookup = nested_prefix + "pk"
+                elif not model_field.concrete or not model_field.is_relation:
+                    raise NotCompilable("{} isn't a foreign key".format(field.field_name))
+                self.lookups.append(lookup)
+                nested = self.compile(field, nested_prefix)
+                mappings.append((field.field_name, lookup, nested))
+                continue
+
+            self.lookups.append(lookup)
+            function = self.compile_column(field, model_field, display)
+            if isinstance(function, CompiledField):
+                mappings.append((field.field_name, (lookup,), function))
+            else:
+                mappings.append((field.field_name, lookup, function))
+        return mappings
+
+    def compile_column(self, field, model_field, display):
+        """
+        Returns the function of the column `model_field` of the `field`, or
+        the `CompiledField` of the fields depending on the context.
+        """
+        if not model_field.concrete or model_field.many_to_many:
+            raise NotCompilable("{} isn't a column".format(field.field_name))
+
+        if display:
+            if not model_field.choices:
+                raise NotCompilable("{} has no choices".format(field.field_name))
+            if type(field) not in (drf_fields.CharField, drf_fields.ReadOnlyField):
+                raise NotCompilable("{} isn't a column".format(field.field_name))
+            return self.compile_display(field, dict(model_field.flatchoices))
+        if type(field) is relations.PrimaryKeyRelatedField:
+            if not model_field.is_relation or field.pk_field is not None:
+                raise NotCompilable("{} isn't a foreign key".format(field.field_name))
+            return identity
+        if type(field) is ThumbnailImageField and not field.sizes:
+            return CompiledField(self.compile_image(model_field))
+        if type(field) in COLUMN_FIELDS and not model_field.is_relation:
+            return field.to_representation
+        raise NotCompilable("{} isn't a column".format(field.field_name))
+
+    def compile_field(self, field, compiled_field, model, prefix):
+        if compiled_field.source:
+            relation = self.get_model_field(model, compiled_field.source, field)
+            return self.compile_relation(
+                field, model, prefix, relation, compiled_field.serializer, compiled_field.filter
+            )
+
+        lookups = [prefix + lookup for lookup in compiled_field.lookups]
+        self.lookups.extend(lookups)
+        if compiled_field.annotation:
+            alias = "compiled_{}".format(len(self.annotations))
+            self.annotations.append((alias, compiled_field.annotation, prefix))
+            lookups.append(alias)
+
+        if compiled_field.serializer:
+            if len(lookups) != 1:
+                raise NotCompilable("{} isn't a primary key".format(field.field_name))
+            compiled = self.compile_nested(field, compiled_field.serializer())
+            model = compiled_field.serializer.Meta.model
+            related = Relation(model, "pk", compiled, lookups[0], many=False)
+            self.relations.append(related)
+            return (field.field_name, lookups[0], related)
+        if compiled_field.function is None:
+            if len(lookups) != 1:
+                raise NotCompilable("{} isn't a single value".format(field.field_name))
+            return (field.field_name, lookups[0], identity)
+        return (field.field_name, tuple(lookups), compiled_field)
+
+    def compile_relation(
+        self, field, model, prefix, relation=None, serializer=None, relation_filter=None
+    ):
+        if relation is None:
+            relation = self.get_model_field(model, field.source, field)
+        if not relation.many_to_many and not relation.one_to_many:
+            raise NotCompilable("{} isn't a many relation".format(field.field_name))
+        if relation.auto_created:
+            # A reverse relation, queried through its foreign key or many to many.
+            query_name = relation.field.name
+        else:
+            query_name = relation.related_query_name()
+
+        if serializer is not None:
+            compiled = self.compile_nested(field, serializer())
+        elif isinstance(field, relations.ManyRelatedField):
+            child = field.child_relation
+            if type(child) is not relations.PrimaryKeyRelatedField or child.pk_field is not None:
+                raise NotCompilable("{} isn't a list of keys".format(field.field_name))
+            compiled = None
+        elif isinstance(field.child, serializers.ModelSerializer):
+            compiled = self.compile_nested(field, field.child)
+        else:
+            raise NotCompilable("{} isn't a model serializer".format(field.field_name))
+
+        parent_lookup = prefix + "pk"
+        if parent_lookup not in self.lookups:
+            self.lookups.append(parent_lookup)
+        related = Relation(
+            relation.related_model, query_name, compiled, parent_lookup, filter=relation_filter
+        )
+        self.relations.append(related)
+        return (field.field_name, parent_lookup, related)
+
+    def compile_nested(self, field, serializer):
+        compiled = CompiledSerializer(serializer)
+        if compiled.relations:
+            raise NotCompilable("{} is a nested relation".format(field.field_name))
+        return compiled
+
+    def get_model_field(self, model, name, field):
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            pass
+        # Reverse relations are read through their accessor, e.g. `task_set`.
+        for related_object in model._meta.related_objects:
+            if related_object.get_accessor_name() == name:
+                return related_object
+        raise NotCompilable("{} isn't a model field".format(field.field_name))
+
+    def compile_display(self, field, choices):
+        def display(value):
+            # Like `get_FOO_display`, unknown values are shown as they are.
+            return field.to_representation(choices.get(value, value))
+
+        return display
+
+    def compile_image(self, model_field):
+        def image(context, name):
+            # Like `ThumbnailImageField.to_representation` without sizes.
+            if not name:
+                return None
+            url = model_field.storage.url(name)
+            request = context.get("request")
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            return {"full_size": url}
+
+        return image
+
+    def values(self, queryset, context=None, **expressions):
+        context = context or {}
+        for alias, annotation, prefix in self.annotations:
+            expressions[alias] = annotation(prefix, context)
+        return queryset.values(*dict.fromkeys(self.lookups), **expressions)
+
+    def to_representation(self, row, mappings=None, related=None, context=None):
+        if mappings is None:
+            mappings = self.mappings
+
+        ret = {}
+        for key, lookup, function in mappings:
+            if isinstance(function, CompiledField):
+                ret[key] = function.function(context or {}, *[row[name] for name in lookup])
+                continue
+            value = row[lookup]
+            if isinstance(function, Relation):
+                ret[key] = function.get(related, value)
+            elif value is None:
+                ret[key] = None
+            elif isinstance(function, list):
+                ret[key] = self.to_representation(row, function, related, context)
+            else:
+                ret[key] = function(value)
+        return ret
+
+    def serialize(self, rows, context=None):
+        rows = list(rows)
+        related = {}
+        for relation in self.relations:
+            pks = {row[relation.parent_lookup] for row in rows} - {None}
+            related[relation] = relation.fetch(pks, context or {}) if pks else {}
+        return [self.to_representation(row, related=related, context=context) for row in rows]
+
+
+_compiled = {}
+
+
+def compile_serializer(serializer_class):
+    """
+    Returns the `CompiledSerializer` of `serializer_class`, or None when its
+    fields can't be compiled.
+    """
+    if serializer_class not in _compiled:
+        try:
+            _compiled[serializer_class] = CompiledSerializer(serializer_class())
+        except NotCompilable:
+            _compiled[serializer_class] = None
+    return _compiled[serializer_class]
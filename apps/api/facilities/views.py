@@ -9,6 +9,7 @@ from apps.facilities.models import BusinessAgreement, FacilityUser
 from apps.facilities.utils import generate_pdf
 from apps.trainings.models import Facility, FacilityQuestion
 
+from ..mixins import CompiledListMixin, ConditionalGetMixin
 from ..permissions import IsAuthenticated, IsExternalClient, IsRole, IsRoleForUpdate, IsSameFacility
 from .serializers import (
     BusinessAgreementSerializer,
@@ -36,9 +37,10 @@ class FacilityViewSet(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, viewse
         return queryset
 
 
-class FacilityQuestionViewSet(viewsets.ModelViewSet):
+class FacilityQuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = FacilityQuestion.objects.all()
     serializer_class = FacilityQuestionSerializer
+    conditional_get_related = ("rules",)
 
 
 class BusinessAgreementViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -72,7 +74,7 @@ class BusinessAgreementViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet)
         return response
 
 
-class CloudCareFacilityViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class CloudCareFacilityViewSet(CompiledListMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
 
     queryset = Facility.objects.all()
     permission_classes = [IsExternalClient]
@@ -1,8 +1,23 @@
+import hashlib
+import json
 import warnings
 
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, ManyToManyRel, Max, Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from expander import ExpanderSerializerMixin
 from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 
+from .compiled import compile_serializer
+
+# Field combinations cached by `DynamicFieldsMixin` and `SparseFieldsetMixin`.
+FIELDSET_CACHE_SIZE = 1000
+
 
 class DestroyModelMixin:
     """Destroy mixin that returns empty object as response.
@@ -25,34 +40,36 @@ class DynamicFieldsMixin(object):
     """
     A serializer mixin that takes an additional `fields` argument that controls
     which fields should be displayed.
+
+    Only the requested fields are built. The pruned field names are cached per
+    serializer class and field combination.
     """
 
-    @property
-    def fields(self):
+    _pruned_field_names = {}
+
+    def get_requested_fields(self):
         """
-        Filters the fields according to the `fields` query parameter.
-        A blank `fields` parameter (?fields) will remove all fields. Not
-        passing `fields` will pass all fields individual fields are comma
-        separated (?fields=id,name,url,email).
+        Returns the fields of the `fields` query parameter. A blank `fields`
+        parameter (?fields) will remove all fields. Not passing `fields` will
+        pass all fields (None). Individual fields are comma separated
+        (?fields=id,name,url,email).
         """
-        fields = super(DynamicFieldsMixin, self).fields
-
         if not hasattr(self, "_context"):
             # We are being called before a request cycle
-            return fields
+            return None
 
         # Only filter if this is the root serializer, or if the parent is the
         # root serializer with many=True
         is_root = self.root == self
         parent_is_list_root = self.parent == self.root and getattr(self.parent, "many", False)
         if not (is_root or parent_is_list_root):
-            return fields
+            return None
 
         try:
             request = self.context["request"]
         except KeyError:
             warnings.warn("Context does not have access to request")
-            return fields
+            return None
 
         # NOTE: drf test framework builds a request object where the query
         # parameters are found under the GET attribute.
@@ -60,22 +77,288 @@ class DynamicFieldsMixin(object):
         if params is None:
             warnings.warn("Request object does not contain query paramters")
 
-        try:
-            filter_fields = params.get("fields", None).split(",")
-        except AttributeError:
-            filter_fields = None
+        return get_requested_fields(params)
 
-        # Drop any fields that are not specified in the `fields` argument.
-        existing = set(fields.keys())
-        if filter_fields is None:
-            # no fields param given, don't filter.
-            allowed = existing
-        else:
-            allowed = set([_f for _f in filter_fields if _f])
+    def get_field_names(self, declared_fields, info):
+        field_names = super(DynamicFieldsMixin, self).get_field_names(declared_fields, info)
+        requested = self.get_requested_fields()
+        if requested is None:
+            return field_names
 
-        for field in existing:
+        # The cache is shared by the threads, another one may clear it at any
+        # time: only the local is returned.
+        key = (type(self), requested.intersection(field_names))
+        pruned = self._pruned_field_names.get(key)
+        if pruned is None:
+            pruned = [name for name in field_names if name in requested]
+            if len(self._pruned_field_names) >= FIELDSET_CACHE_SIZE:
+                self._pruned_field_names.clear()
+            self._pruned_field_names[key] = pruned
+        return pruned
 
-            if field not in allowed:
-                fields.pop(field, None)
+    def get_fields(self):
+        # Drop any fields that are not specified in the `fields` argument.
+        fields = super(DynamicFieldsMixin, self).get_fields()
+        requested = self.get_requested_fields()
+        if requested is None:
+            return fields
 
+        for field in set(fields) - requested:
+            fields.pop(field, None)
         return fields
+
+
+def get_requested_fields(params):
+    """
+    Returns the set of fields of the `fields` query parameter in `params`, or
+    None when it isn't passed.
+    """
+    try:
+        filter_fields = params.get("fields", None).split(",")
+    except AttributeError:
+        return None
+    return frozenset(_f for _f in filter_fields if _f)
+
+
+class SparseFieldsetMixin(object):
+    """
+    A viewset mixin pushing the `fields` query parameter of a
+    `DynamicFieldsMixin` serializer down to the queryset of the read requests:
+    only the columns of the requested fields are selected, and only the
+    relations they need are prefetched.
+
+    - `sparse_fieldset_prefetches` maps the serializer fields to the lookups
+      (or `Prefetch` objects) they need.
+    - `sparse_fieldset_columns` maps the serializer fields that aren't model
+      fields to the columns they read.
+    - `sparse_fieldset_required_columns` are always selected.
+
+    Without `fields` every relation of `sparse_fieldset_prefetches` is
+    prefetched and every column selected.
+    """
+
+    sparse_fieldset_prefetches = {}
+    sparse_fieldset_columns = {}
+    sparse_fieldset_required_columns = ("id",)
+
+    _sparse_fieldset_plans = {}
+
+    def get_queryset(self):
+        queryset = super(SparseFieldsetMixin, self).get_queryset()
+        requested = None
+        if self.request.method in SAFE_METHODS:
+            requested = get_requested_fields(self.request.query_params)
+
+        # Like the pruned field names, only the local plan is used.
+        key = (type(self), requested)
+        plan = self._sparse_fieldset_plans.get(key)
+        if plan is None:
+            plan = self.get_sparse_fieldset_plan(queryset.model, requested)
+            if len(self._sparse_fieldset_plans) >= FIELDSET_CACHE_SIZE:
+                self._sparse_fieldset_plans.clear()
+            self._sparse_fieldset_plans[key] = plan
+        columns, prefetches = plan
+
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset.prefetch_related(*prefetches)
+
+    def get_sparse_fieldset_plan(self, model, requested):
+        """
+        Returns the columns to select (None for all of them) and the lookups
+        to prefetch for the `requested` fields.
+        """
+        if requested is None:
+            prefetches = []
+            for lookups in self.sparse_fieldset_prefetches.values():
+                prefetches.extend(lookup for lookup in lookups if lookup not in prefetches)
+            return None, prefetches
+
+        model_fields = {field.name for field in model._meta.concrete_fields}
+        columns = list(self.sparse_fieldset_required_columns)
+        prefetches = []
+        for name in sorted(requested):
+            if name in self.sparse_fieldset_columns:
+                field_columns = self.sparse_fieldset_columns[name]
+            else:
+                field_columns = [name] if name in model_fields else []
+            columns.extend(column for column in field_columns if column not in columns)
+            prefetches.extend(
+                lookup
+                for lookup in self.sparse_fieldset_prefetches.get(name, [])
+                if lookup not in prefetches
+            )
+        return columns, prefetches
+
+
+class CompiledListMixin(object):
+    """
+    A viewset mixin serializing the list from `queryset.values()` with the
+    compiled serializer (see `apps.api.compiled`), when the serializer class
+    can be compiled. The output is the same as the serializer's.
+
+    The list isn't compiled when the fields of the serializer depend on the
+    request (`DynamicFieldsMixin`, or an `ExpanderSerializerMixin` with an
+    `expand` parameter), or when the queryset prefetches custom querysets
+    (`Prefetch(queryset=...)`), which the compiled relations would ignore.
+    """
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        compiled = compile_serializer(serializer_class)
+        queryset = self.filter_queryset(self.get_queryset())
+        if compiled is None or not self.can_compile_list(serializer_class, queryset):
+            return super(CompiledListMixin, self).list(request, *args, **kwargs)
+
+        # The relations are fetched by the compiled serializer.
+        context = self.get_serializer_context()
+        rows = compiled.values(queryset.prefetch_related(None), context)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page, context))
+        return Response(compiled.serialize(rows, context))
+
+    def can_compile_list(self, serializer_class, queryset):
+        params = self.request.query_params
+        if issubclass(serializer_class, DynamicFieldsMixin) and "fields" in params:
+            return False
+        expand = getattr(settings, "DRF_EXPANDER_EXPAND_ARG", "expand")
+        if issubclass(serializer_class, ExpanderSerializerMixin) and params.get(expand):
+            return False
+        return not any(
+            isinstance(lookup, Prefetch) and lookup.queryset is not None
+            for lookup in queryset._prefetch_related_lookups
+        )
+
+
+class ConditionalGetMixin(object):
+    """
+    A viewset mixin answering the conditional list and retrieve requests
+    (`If-None-Match`) with a 304, without serializing anything.
+
+    The ETag is computed from the latest `modified` and the number of the rows
+    of the filtered queryset, and of the relations of `conditional_get_related`
+    (the related rows in the response), for the facility, user, path and query
+    of the request. `get_conditional_get_extra` adds what else the response
+    depends on.
+
+    Only the `modified` of the rows is seen: changes made with `update()`, or
+    many to many changes of relations not in `conditional_get_related`, don't
+    change the ETag.
+    `Last-Modified` is only informational: without the count, it can't tell a
+    deleted row, so `If-Modified-Since` isn't answered.
+    """
+
+    conditional_get_related = ()
+    # Seconds the clients can use the response without revalidating it.
+    conditional_get_max_age = 0
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_get(
+            queryset, super(ConditionalGetMixin, self).list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return self.conditional_get(
+            queryset, super(ConditionalGetMixin, self).retrieve, request, *args, **kwargs
+        )
+
+    def conditional_get(self, queryset, view, request, *args, **kwargs):
+        etag, last_modified = self.get_conditional_get_validators(queryset)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        patch_cache_control(
+            response, private=True, max_age=self.conditional_get_max_age, must_revalidate=True
+        )
+        return response
+
+    def get_conditional_get_validators(self, queryset):
+        """
+        Returns the ETag and the last modification date of the response of
+        `queryset`.
+        """
+        state = self.get_conditional_get_state(queryset)
+        last_modified = max(
+            (value for key, value in state.items() if key.endswith("modified") and value),
+            default=None,
+        )
+        facility = getattr(self.request, "facility", None)
+        validator = [
+            facility.pk if facility else None,
+            self.request.user.pk,
+            self.request.path,
+            sorted(self.request.query_params.lists()),
+            self.request.accepted_media_type,
+            sorted(state.items()),
+            self.get_conditional_get_extra(queryset),
+        ]
+        payload = json.dumps(validator, cls=DjangoJSONEncoder)
+        return quote_etag(hashlib.sha1(payload.encode()).hexdigest()), last_modified
+
+    def get_conditional_get_state(self, queryset):
+        """
+        Returns the latest `modified` and the number of the rows of `queryset`
+        and of its `conditional_get_related` relations.
+
+        Each relation is aggregated in its own query, on the related rows
+        selected with a subquery: joining them all at once would aggregate
+        their cartesian product. For the many to many relations, the number
+        and the latest id of the rows of the through table are added too, so
+        that swapping a member changes the state.
+        """
+        queryset = queryset.order_by()
+        state = queryset.aggregate(count=Count("pk", distinct=True), modified=Max("modified"))
+        for relation in self.conditional_get_related:
+            model = queryset.model
+            names = relation.split("__")
+            for i, name in enumerate(names):
+                field = model._meta.get_field(name)
+                if field.many_to_many:
+                    path = "__".join(names[:i]) or "pk"
+                    key = "__".join(names[: i + 1])
+                    state.update(self.get_through_state(key, field, queryset.values(path)))
+                model = field.related_model
+            state.update(
+                model._default_manager.filter(pk__in=queryset.values(relation)).aggregate(
+                    **{
+                        relation + "_count": Count("pk"),
+                        relation + "_modified": Max("modified"),
+                    }
+                )
+            )
+        return state
+
+    def get_through_state(self, key, field, sources):
+        """
+        Returns the number and the latest id of the rows of the through table
+        of the many to many `field` (or relation) for the ids `sources`.
+        """
+        if isinstance(field, ManyToManyRel):
+            source = field.field.m2m_reverse_field_name()
+            through = field.field.remote_field.through
+        else:
+            source = field.m2m_field_name()
+            through = field.remote_field.through
+        return through._default_manager.filter(**{source + "__in": sources}).aggregate(
+            **{key + "_through_count": Count("pk"), key + "_through_id": Max("pk")}
+        )
+
+    def get_conditional_get_extra(self, queryset):
+        """
+        Returns what else the response of `queryset` depends on, JSON
+        serializable, e.g. the user's progress. Computed on every request.
+        """
+        return None
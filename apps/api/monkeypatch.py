@@ -1,5 +1,6 @@
-from rest_framework import views
+from rest_framework import serializers, views
 
+from apps.base.profiling import timed_serialization
 from apps.facilities.models import FacilityUser
 
 orig_perform_authentication = views.APIView.perform_authentication
@@ -18,3 +19,10 @@ def perform_authentication(self, request):
 
 
 views.APIView.perform_authentication = perform_authentication
+
+
+# Measures the time spent serializing in the profiled requests.
+serializers.Serializer.data = property(timed_serialization(serializers.Serializer.data.fget))
+serializers.ListSerializer.data = property(
+    timed_serialization(serializers.ListSerializer.data.fget)
+)
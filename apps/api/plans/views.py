@@ -2,9 +2,16 @@ from rest_framework import mixins, viewsets
 
 from apps.subscriptions.models import Plan
 
+from ..mixins import ConditionalGetMixin
 from .serializers import PlanSerializer
 
 
-class PlansViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+class PlansViewSet(
+    ConditionalGetMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
     queryset = Plan.objects.all()
     serializer_class = PlanSerializer
+    conditional_get_related = ("billing_intervals",)
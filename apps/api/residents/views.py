@@ -19,7 +19,7 @@ from apps.residents.validations import should_examiner_signature_be_deleted
 from apps.utils.viewsets import ChildViewSetMixin
 
 from ..facilities.permissions import NotManagerOrCanAccessResidents
-from ..mixins import DestroyModelMixin
+from ..mixins import CompiledListMixin, DestroyModelMixin, SparseFieldsetMixin
 from ..permissions import (
     FacilityHasResidentSubscription,
     IsAuthenticated,
@@ -37,8 +37,22 @@ from .serializers import (
     ResidentSerializer,
 )
 
+examiners_prefetch = Prefetch(
+    "examiners", queryset=ResidentAccess.objects.all().select_related("examiner__user")
+)
+user_invites_prefetch = Prefetch(
+    "user_invites", queryset=UserInviteResidentAccess.objects.all().select_related("invite")
+)
+examination_interval_columns = [
+    "is_active",
+    "examiner_signature",
+    "signature_on_file",
+    "has_assistive_care_services",
+]
+
 
 class ResidentsViewSet(
+    SparseFieldsetMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -46,19 +60,26 @@ class ResidentsViewSet(
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Resident.objects.all().prefetch_related(
-        "medications",
-        "services_offered",
-        "examination_requests",
-        Prefetch(
-            "examiners",
-            queryset=ResidentAccess.objects.all().select_related("examiner__user"),
-        ),
-        Prefetch(
-            "user_invites",
-            queryset=UserInviteResidentAccess.objects.all().select_related("invite"),
-        ),
-    )
+    queryset = Resident.objects.all()
+    # `Resident` has ~190 columns: `?fields=` lists select and prefetch only what they show.
+    sparse_fieldset_prefetches = {
+        "medications": ["medications"],
+        "services_offered": ["services_offered"],
+        "medication_files": ["medication_files"],
+        "examination_requested": ["examination_requests"],
+        "has_examiners_assigned": [examiners_prefetch],
+        "primary_is_examiner": [examiners_prefetch],
+        "primary_is_examiner_invited": [examiners_prefetch, user_invites_prefetch],
+    }
+    sparse_fieldset_columns = {
+        "age": ["date_of_birth"],
+        "examination_interval": examination_interval_columns,
+        "examination_due_date": examination_interval_columns
+        + ["date_of_admission", "examination_date"],
+        "primary_is_examiner": ["primary_doctor_email"],
+        "primary_is_examiner_invited": ["primary_doctor_email"],
+    }
+    sparse_fieldset_required_columns = ("id", "facility")
     serializer_class = ResidentSerializer
     permission_classes = [
         IsAuthenticated,
@@ -168,6 +189,7 @@ class ResidentsViewSet(
 
 
 class CloudCareResidentsViewSet(
+    CompiledListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -349,7 +371,7 @@ class ResidentsBlank1823PdfView(PdfView):
         return "{} 1823-blank.pdf"
 
 
-class ResidentBedHoldViewSet(viewsets.ModelViewSet):
+class ResidentBedHoldViewSet(CompiledListMixin, viewsets.ModelViewSet):
     queryset = ResidentBedHold.objects.all()
     serializer_class = ResidentBedHoldSerializer
     filter_backends = (DjangoFilterBackend,)
@@ -1,11 +1,14 @@
 import datetime
 
-from django.db.models import Q
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Value, prefetch_related_objects
 from django.utils import timezone
 
 from expander import ExpanderSerializerMixin
 from rest_framework import serializers
 
+from apps.api.compiled import CompiledField
 from apps.api.fields import ThumbnailImageField
 from apps.trainings.models import (
     Course,
@@ -15,12 +18,14 @@ from apps.trainings.models import (
     CourseItemMultiChoice,
     CourseItemText,
     CourseItemVideo,
+    Employee,
     EmployeeCourse,
     EmployeeCourseItem,
     MultiChoiceOption,
     Task,
     TaskType,
 )
+from apps.trainings.scoring import check_answer
 
 
 class CourseItemTextSerializer(serializers.ModelSerializer):
@@ -197,6 +202,10 @@ class CourseItemSerializer(ExpanderSerializerMixin, serializers.ModelSerializer)
             return None
 
 
+def get_employee_course_status_name(status):
+    return EmployeeCourse.STATUSES[status][1]
+
+
 class CourseTakenSerializer(serializers.ModelSerializer):
     status_name = serializers.SerializerMethodField()
 
@@ -213,8 +222,42 @@ class CourseTakenSerializer(serializers.ModelSerializer):
             "completed_date",
         )
 
+    compiled_fields = {
+        "status_name": CompiledField(
+            lambda context, status: get_employee_course_status_name(status), lookups=("status",)
+        ),
+    }
+
     def get_status_name(self, employee_course):
-        return EmployeeCourse.STATUSES[employee_course.status][1]
+        return get_employee_course_status_name(employee_course.status)
+
+
+def get_context_employee(context):
+    try:
+        return context["request"].user.employee
+    except (KeyError, AttributeError, ObjectDoesNotExist):
+        return None
+
+
+def get_employee_courses_filter(context):
+    employee = get_context_employee(context)
+    return {"employee": employee} if employee else None
+
+
+def get_started_course_items(employee, course):
+    """The course items `employee` started in `course`, the last started first."""
+    return EmployeeCourseItem.objects.filter(
+        course_item__course=course, employee=employee
+    ).order_by("-started_at", "-pk")
+
+
+def get_last_started_course_item_annotation(prefix, context):
+    employee = get_context_employee(context)
+    if employee is None:
+        return Value(None, output_field=IntegerField())
+    return Subquery(
+        get_started_course_items(employee, OuterRef(prefix + "pk")).values("course_item")[:1]
+    )
 
 
 class CourseSerializer(ExpanderSerializerMixin, serializers.ModelSerializer):
@@ -245,35 +288,36 @@ class CourseSerializer(ExpanderSerializerMixin, serializers.ModelSerializer):
             "items": (CourseItemSerializer, (), {"many": True}),
         }
 
+    compiled_fields = {
+        "course_taken": CompiledField(
+            serializer=CourseTakenSerializer,
+            source="employee_courses",
+            filter=get_employee_courses_filter,
+        ),
+        "max_points": CompiledField(lookups=("max_points",)),
+        "last_started_course_item": CompiledField(
+            annotation=get_last_started_course_item_annotation
+        ),
+    }
+
     def get_course_taken(self, course):
-        try:
-            employee = self.context["request"].user.employee
-            return CourseTakenSerializer(
-                instance=course.employee_courses.filter(employee=employee), many=True
-            ).data
-        except Exception:
+        employee_courses_filter = get_employee_courses_filter(self.context)
+        if employee_courses_filter is None:
             return []
+        return CourseTakenSerializer(
+            instance=course.employee_courses.filter(**employee_courses_filter), many=True
+        ).data
 
     def get_max_points(self, course):
-        return (
-            course.items.filter(boolean__isnull=False).count()
-            + course.items.filter(choices__isnull=False).count()
-        )
+        return course.max_points
 
     def get_last_started_course_item(self, course):
-        try:
-            employee = self.context["request"].user.employee
-            employee_course_item = (
-                EmployeeCourseItem.objects.filter(course_item__course=course, employee=employee)
-                .order_by("-started_at")
-                .first()
-            )
-            if employee_course_item:
-                return employee_course_item.course_item.id
-            else:
-                return None
-        except Exception:
+        employee = get_context_employee(self.context)
+        if employee is None:
             return None
+        return (
+            get_started_course_items(employee, course).values_list("course_item", flat=True).first()
+        )
 
 
 class TaskTypeSerializer(serializers.ModelSerializer):
@@ -293,6 +337,18 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = ("id", "type")
 
 
+def get_or_create_course_task(employee, course):
+    try:
+        return Task.objects.select_related("type").get(employee=employee, type=course.task_type_id)
+    except Task.DoesNotExist:
+        return Task.objects.create(
+            employee=employee,
+            type=course.task_type,
+            due_date=datetime.date.today(),  # today
+            is_optional=True,  # because if the task was not created via signals, it has to be from course dropdown
+        )
+
+
 class CourseOpenSerializer(ExpanderSerializerMixin, serializers.ModelSerializer):
 
     last_started_course_item = serializers.SerializerMethodField()
@@ -331,19 +387,7 @@ class CourseOpenSerializer(ExpanderSerializerMixin, serializers.ModelSerializer)
                     "User": "Your user doesn't appear to be linked with an Employee. Please reach out to an administrator"
                 }
             )
-        employee = user.employee
-
-        try:
-            task = Task.objects.get(employee=employee, type=course.task_type)
-            return TaskSerializer(task).data
-        except Task.DoesNotExist:
-            task = Task.objects.create(
-                employee=employee,
-                type=course.task_type,
-                due_date=datetime.date.today(),  # today
-                is_optional=True,  # because if the task was not created via signals, it has to be from course dropdown
-            )
-            return TaskSerializer(task).data
+        return TaskSerializer(get_or_create_course_task(user.employee, course)).data
 
     def get_last_started_course_item(self, course):
         try:
@@ -487,7 +531,7 @@ class EmployeeCourseSerializer(ExpanderSerializerMixin, serializers.ModelSeriali
         }
 
     def get_total(self, obj):
-        return obj.course.items.filter(Q(boolean__isnull=False) | Q(choices__isnull=False)).count()
+        return obj.course.scorable_items
 
     def get_is_approved(self, obj):
 
@@ -582,8 +626,215 @@ class EmployeeCourseItemSerializer(ExpanderSerializerMixin, serializers.ModelSer
         return super().update(instance, validated_data)
 
     def check_answer_correct(self, answer, course_item):
-        if course_item.boolean.exists():
-            return course_item.boolean.first().answer is answer
-        elif course_item.choices.exists():
-            return course_item.choices.first().answers.first().id == answer
-        return False  # Return False for other kinds of answers such as Text or Video
+        # False for other kinds of items such as Text or Video
+        return check_answer(course_item.course, course_item.pk, answer)
+
+
+class CourseBundleMultiChoiceSerializer(serializers.ModelSerializer):
+    options = MultiChoiceOptionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CourseItemMultiChoice
+        fields = (
+            "id",
+            "item",
+            "question",
+            "options",
+            "answers",
+            "order",
+        )
+
+
+class CourseBundleItemSerializer(serializers.ModelSerializer):
+    texts = CourseItemTextSerializer(many=True, read_only=True)
+    videos = CourseItemVideoSerializer(many=True, read_only=True)
+    letter_size_image = CourseItemLetterSizeImageSerializer(many=True, read_only=True)
+    boolean = CourseItemBooleanSerializer(many=True, read_only=True)
+    choices = CourseBundleMultiChoiceSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CourseItem
+        fields = (
+            "id",
+            "course",
+            "title",
+            "order",
+            "image",
+            "texts",
+            "videos",
+            "letter_size_image",
+            "boolean",
+            "choices",
+            "min_duration",
+        )
+
+
+class CourseBundleSerializer(serializers.ModelSerializer):
+    """
+    The content of a course, the same for every employee: the course with its
+    items and their texts, videos, images, questions and options. The course
+    must go through `CourseBundleSerializer.prefetch()`, so it is read in a
+    fixed number of queries.
+    """
+
+    items = CourseBundleItemSerializer(many=True, read_only=True)
+    max_points = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Course
+        fields = (
+            "id",
+            "task_type",
+            "name",
+            "description",
+            "objective",
+            "duration",
+            "minimum_score",
+            "max_points",
+            "published",
+            "language",
+            "statement_required",
+            "items",
+        )
+
+    @staticmethod
+    def prefetch(courses):
+        prefetch_related_objects(
+            courses,
+            "items__texts",
+            "items__videos",
+            "items__letter_size_image",
+            "items__boolean",
+            "items__choices__options",
+            "items__choices__answers",
+        )
+
+    def get_max_points(self, course):
+        return course.max_points
+
+
+class CourseItemProgressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EmployeeCourseItem
+        fields = (
+            "course_item",
+            "started_at",
+            "completed_at",
+            "is_correct",
+        )
+
+
+def get_course_progress_data(employee, course):
+    """
+    Returns the progress of `employee` in `course`, as `CourseOpenSerializer`
+    and `CourseItemSerializer.started_at` show it, in three queries.
+    """
+    course_items = list(
+        EmployeeCourseItem.objects.filter(course_item__course=course, employee=employee)
+    )
+    completed = [item for item in course_items if item.completed_at is not None]
+    last_started = max(course_items, key=lambda item: item.started_at, default=None)
+    last_completed = max(completed, key=lambda item: item.completed_at, default=None)
+    return {
+        "task": TaskSerializer(get_or_create_course_task(employee, course)).data,
+        "course_taken": CourseTakenSerializer(
+            EmployeeCourse.objects.filter(course=course, employee=employee), many=True
+        ).data,
+        "items": CourseItemProgressSerializer(course_items, many=True).data,
+        "last_started_course_item": last_started.course_item_id if last_started else None,
+        "last_completed_course_item": last_completed.course_item_id if last_completed else None,
+        "current_score": sum(1 for item in course_items if item.is_correct),
+    }
+
+
+class CourseItemAnswerSerializer(serializers.Serializer):
+    course_item = serializers.IntegerField()
+    # A boolean or the id of an option, like `item_complete`'s answer.
+    answer = serializers.JSONField(required=False, allow_null=True, default=None)
+    # When answered offline, else the time of the request.
+    started_at = serializers.DateTimeField(required=False)
+    completed_at = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        now = timezone.now()
+        started_at = data.get("started_at", now)
+        completed_at = data.get("completed_at", now)
+        if not started_at <= completed_at <= now:
+            raise serializers.ValidationError(
+                "started_at and completed_at must be in the past, started_at first"
+            )
+        return data
+
+
+class CourseAnswersSerializer(serializers.Serializer):
+    """
+    Completes several items of `context["course"]` at once, e.g. a whole exam
+    answered offline. Items the employee didn't start yet are started too.
+    Answers are checked against the answer key of the course.
+
+    Submissions of an employee are serialized by locking the employee, and the
+    items started concurrently (e.g. by `start`) are kept, so retries don't
+    duplicate anything.
+    """
+
+    answers = CourseItemAnswerSerializer(many=True, allow_empty=False)
+
+    def validate_answers(self, answers):
+        course = self.context["course"]
+        item_ids = set(course.items.values_list("pk", flat=True))
+        seen = set()
+        for answer in answers:
+            if answer["course_item"] not in item_ids:
+                raise serializers.ValidationError(
+                    "Course item {} isn't in this course".format(answer["course_item"])
+                )
+            if answer["course_item"] in seen:
+                raise serializers.ValidationError(
+                    "Course item {} is answered twice".format(answer["course_item"])
+                )
+            seen.add(answer["course_item"])
+        return answers
+
+    def create(self, validated_data):
+        course = self.context["course"]
+        employee = self.context["request"].user.employee
+        now = timezone.now()
+        answers = {answer["course_item"]: answer for answer in validated_data["answers"]}
+
+        with transaction.atomic():
+            Employee.objects.select_for_update().filter(pk=employee.pk).exists()
+            # Start the items not started yet, then complete them all.
+            EmployeeCourseItem.objects.bulk_create(
+                [
+                    EmployeeCourseItem(
+                        employee=employee,
+                        course_item_id=course_item_id,
+                        started_at=answer.get("started_at", now),
+                    )
+                    for course_item_id, answer in answers.items()
+                ],
+                ignore_conflicts=True,
+            )
+            employee_course_items = list(
+                EmployeeCourseItem.objects.select_for_update().filter(
+                    employee=employee, course_item__in=answers
+                )
+            )
+            for employee_course_item in employee_course_items:
+                answer = answers[employee_course_item.course_item_id]
+                employee_course_item.is_correct = check_answer(
+                    course, employee_course_item.course_item_id, answer["answer"]
+                )
+                employee_course_item.completed_at = answer.get("completed_at", now)
+                employee_course_item.modified = now
+            EmployeeCourseItem.objects.bulk_update(
+                employee_course_items, ["is_correct", "completed_at", "modified"]
+            )
+
+            if not EmployeeCourse.objects.filter(course=course, employee=employee).exists():
+                started_at = min(answer.get("started_at", now) for answer in answers.values())
+                EmployeeCourse.objects.create(
+                    course=course, employee=employee, start_date=started_at.date()
+                )
+
+        return employee_course_items
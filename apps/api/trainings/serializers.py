@@ -1,6 +1,8 @@
 import logging
 
 from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from dateutil.parser import parse as parse_date
@@ -8,6 +10,7 @@ from expander import ExpanderSerializerMixin
 from rest_framework import serializers
 from rest_framework.serializers import FileField, ModelSerializer
 
+from apps.api.compiled import CompiledField
 from apps.api.fields import TimedeltaField, USPhoneNumberField, USSocialSecurityNumberField
 from apps.api.trainings.course_serializers import CourseSerializer, CourseSimpleSerializer
 from apps.api.users.serializers import UserSerializer
@@ -85,13 +88,31 @@ class PositionSerializer(serializers.ModelSerializer):
         return super().create(PositionSerializer, self).create(validated_data)
 
 
+def get_education_credits(task_type):
+    """
+    Returns the education credits of `task_type`, a task type or an `OuterRef`
+    to the task types. The prefetched credits of a task type are used.
+    """
+    if isinstance(task_type, TaskType):
+        return task_type.education_credits.all()
+    return TaskTypeEducationCredit.objects.filter(tasktype=task_type)
+
+
 class TaskTypeBaseSerializer(serializers.ModelSerializer):
     required_within = TimedeltaField()
     validity_period = TimedeltaField()
     is_continuing_education = serializers.SerializerMethodField()
 
+    compiled_fields = {
+        "is_continuing_education": CompiledField(
+            annotation=lambda prefix, context: Exists(
+                get_education_credits(OuterRef(prefix + "pk"))
+            ),
+        ),
+    }
+
     def get_is_continuing_education(self, task_type):
-        return task_type.is_continuing_education()
+        return get_education_credits(task_type).exists()
 
 
 class TaskTypeSimpleSerializer(ExpanderSerializerMixin, TaskTypeBaseSerializer):
@@ -234,13 +255,24 @@ class CustomTaskTypeReadSerializer(serializers.ModelSerializer):
         ]
 
 
+def format_full_name(first_name, last_name):
+    return "{} {}".format(first_name, last_name)
+
+
 class EmployeeBaseSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     phone_number = USPhoneNumberField(required=False, allow_blank=True)
     ssn = USSocialSecurityNumberField(required=False, allow_blank=True)
 
+    compiled_fields = {
+        "full_name": CompiledField(
+            lambda context, *names: format_full_name(*names),
+            lookups=("first_name", "last_name"),
+        ),
+    }
+
     def get_full_name(self, employee):
-        return "{} {}".format(employee.first_name, employee.last_name)
+        return format_full_name(employee.first_name, employee.last_name)
 
 
 class EmployeeSimpleSerializer(EmployeeBaseSerializer):
@@ -448,6 +480,10 @@ class EmployeeReadExpandableSerializer(ExpanderSerializerMixin, serializers.Mode
         }
 
 
+def get_certificate_pages(certificate):
+    return TaskHistoryCertificatePage.objects.filter(certificate=certificate)
+
+
 class TaskHistoryCertificateSerializer(serializers.ModelSerializer):
     certificate1 = FileField(write_only=True)
     certificate2 = FileField(required=False, write_only=True)
@@ -455,6 +491,20 @@ class TaskHistoryCertificateSerializer(serializers.ModelSerializer):
     num_pages = serializers.SerializerMethodField()
     uploaded_at = serializers.DateTimeField(read_only=True)
 
+    compiled_fields = {
+        "num_pages": CompiledField(
+            annotation=lambda prefix, context: Coalesce(
+                Subquery(
+                    get_certificate_pages(OuterRef(prefix + "pk"))
+                    .values("certificate")
+                    .annotate(count=Count("pk"))
+                    .values("count")
+                ),
+                0,
+            ),
+        ),
+    }
+
     class Meta:
         model = TaskHistoryCertificate
         fields = (
@@ -466,7 +516,7 @@ class TaskHistoryCertificateSerializer(serializers.ModelSerializer):
         )
 
     def get_num_pages(self, obj):
-        return obj.pages.count()
+        return get_certificate_pages(obj).count()
 
     def create(self, validated_data):
         validated_data["task_history"] = self.context["task_history"]
@@ -605,10 +655,28 @@ class ScheduledEventSerializer(serializers.ModelSerializer):
             "facility",
         )
 
+    compiled_fields = {
+        "date": CompiledField(lookups=("start_time",)),
+    }
+
     def get_date(self, obj):
         return obj.start_time
 
 
+def get_scheduled_events(task):
+    return TrainingEvent.objects.filter(employee_tasks=task).order_by("start_time", "pk")
+
+
+def is_online_course(context, user_id, course_published):
+    """
+    Returns whether the task of the user `user_id`, whose course is published
+    or not (None without a course), is an online course of the user of the
+    request.
+    """
+    user = getattr(context.get("request"), "user", None)
+    return user_id is not None and getattr(user, "pk", None) == user_id and bool(course_published)
+
+
 class TaskReadSerializer(serializers.ModelSerializer):
     employee = EmployeeSimpleSerializer()
     type = TaskTypeSimpleSerializer()
@@ -620,22 +688,30 @@ class TaskReadSerializer(serializers.ModelSerializer):
         model = Task
         fields = "__all__"
 
+    compiled_fields = {
+        "scheduled_event": CompiledField(
+            serializer=ScheduledEventSerializer,
+            annotation=lambda prefix, context: Subquery(
+                get_scheduled_events(OuterRef(prefix + "pk")).values("pk")[:1]
+            ),
+        ),
+        "online_course": CompiledField(
+            is_online_course, lookups=("employee__user", "type__course__published")
+        ),
+    }
+
     def get_scheduled_event(self, obj):
-        scheduled_event = obj.scheduled_event
+        scheduled_event = get_scheduled_events(obj).first()
         if scheduled_event:
             return ScheduledEventSerializer(scheduled_event).data
         return None
 
     def get_online_course(self, obj):
-        request = self.context.get("request", None)
         employee = getattr(obj, "employee", None)
-        task_type = getattr(obj, "type", None)
-        if request and employee:
-            if request.user and request.user == getattr(employee, "user", None):
-                course = getattr(task_type, "course", None)
-                if course and course.published:
-                    return True
-        return False
+        course = getattr(getattr(obj, "type", None), "course", None)
+        return is_online_course(
+            self.context, getattr(employee, "user_id", None), getattr(course, "published", None)
+        )
 
 
 class TaskHistoryReadSerializer(serializers.ModelSerializer):
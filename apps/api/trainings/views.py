@@ -1,12 +1,18 @@
+import hashlib
+import json
 import logging
 import re
-from datetime import date
+from datetime import date, datetime, timedelta
 from mimetypes import guess_type
 from tempfile import NamedTemporaryFile
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import File
-from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
 
@@ -14,6 +20,7 @@ from actstream import action
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status, views
 from rest_framework.decorators import action as action_decorator
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet, ReadOnlyModelViewSet, mixins
@@ -29,11 +36,14 @@ from apps.api.filters import (
 )
 from apps.api.permissions import FacilityHasStaffSubscriptionIfRequired, IsSameFacilityForEditing
 from apps.api.trainings.course_serializers import (
+    CourseAnswersSerializer,
+    CourseBundleSerializer,
     CourseItemBooleanSerializer,
     CourseItemCreateSerializer,
     CourseItemLetterSizeImageSerializer,
     CourseItemMultiChoiceCreateSerializer,
     CourseItemMultiChoiceSerializer,
+    CourseItemProgressSerializer,
     CourseItemSerializer,
     CourseItemTextSerializer,
     CourseItemVideoSerializer,
@@ -42,6 +52,7 @@ from apps.api.trainings.course_serializers import (
     EmployeeCourseItemSerializer,
     EmployeeCourseSerializer,
     MultiChoiceOptionSerializer,
+    get_course_progress_data,
 )
 from apps.api.views import generate_pdf
 from apps.facilities.models import FacilityUser
@@ -72,8 +83,15 @@ from apps.trainings.models import (
     TaskHistoryStatus,
     TaskType,
     TaskTypeEducationCredit,
+    Tombstone,
     TrainingEvent,
 )
+from apps.trainings.reports import (
+    load_employee_rows,
+    load_task_history_rows,
+    load_task_rows,
+    order_by_ids,
+)
 from apps.trainings.tasks import reapply_employee_responsibilities
 from apps.trainings.utils import send_certificate_to_admins, send_custom_task_type_mail
 from apps.utils.mixins import MultiSerializerMixin
@@ -81,6 +99,7 @@ from apps.utils.viewsets import ChildViewSetMixin
 
 from ..facilities.permissions import NotManagerOrCanAccessStaff
 from ..facilities.serializers import FacilitySerializer
+from ..mixins import CompiledListMixin, ConditionalGetMixin
 from ..permissions import IsExternalClient, IsRole, NonEmployeeUserEditing
 from ..users.serializers import UserSerializer
 from ..views import PdfParametersView, PdfView
@@ -119,6 +138,8 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
+SYNC_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 def get_response_format(params, data):
     responseFormat = params.get("object")
@@ -128,6 +149,42 @@ def get_response_format(params, data):
     return Response(data)
 
 
+def format_list_response(params, response):
+    """
+    Like `get_response_format`, but wraps the data of `response` in place,
+    keeping its headers (the validators of `ConditionalGetMixin`). Responses
+    other than a 200, like a 304, are returned unchanged.
+    """
+    if response.status_code == 200 and params.get("object") == "true":
+        response.data = {"count": len(response.data), "results": response.data}
+    return response
+
+
+def check_user_employee(user):
+    if not hasattr(user, "employee"):
+        raise ValidationError(
+            {
+                "User": "Your user doesn't appear to be linked with an Employee. Please reach out to an administrator"
+            }
+        )
+
+
+def get_course_progress(user):
+    """
+    Returns the state of the courses progress of `user`, which the course
+    serializers show, for the ETags of `ConditionalGetMixin`.
+    """
+    employee = getattr(user, "employee", None)
+    if employee is None:
+        return None
+    return [
+        EmployeeCourse.objects.filter(employee=employee).aggregate(Count("pk"), Max("modified")),
+        EmployeeCourseItem.objects.filter(employee=employee).aggregate(
+            Count("pk"), Max("modified")
+        ),
+    ]
+
+
 def _generate_course_certificate_page(template_name, context, certificate):
     with NamedTemporaryFile(suffix=".pdf") as file:
         generate_pdf(template_name, file, context)
@@ -228,6 +285,7 @@ class EmployeeViewSet(MultiSerializerMixin, ModelViewSet):
 
 
 class CloudCareEmployeeViewSet(
+    CompiledListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -240,7 +298,7 @@ class CloudCareEmployeeViewSet(
     permission_classes = [IsExternalClient]
 
 
-class CloudCarePositionViewSet(mixins.ListModelMixin, GenericViewSet):
+class CloudCarePositionViewSet(CompiledListMixin, mixins.ListModelMixin, GenericViewSet):
 
     queryset = Position.objects.all()
     serializer_class = PositionCloudCareSerializer
@@ -253,10 +311,8 @@ class EmployeesListPdfView(PdfView):
     filename = "Employee List.pdf"
 
     def get_employees(self):
-        employees = self.get_queryset()
-        employee_ids = self.get_employee_ids()
-        employees = sorted(employees, key=lambda r: employee_ids.index(r.pk))
-        return employees
+        rows = load_employee_rows(self.get_queryset())
+        return order_by_ids(rows, self.get_employee_ids(), key=lambda row: row.employee.pk)
 
     def get_queryset(self):
         queryset = super(EmployeesListPdfView, self).get_queryset()
@@ -289,18 +345,18 @@ class EmployeesDetailPdfView(PdfView):
         employee = self.get_object()
         context = super(EmployeesDetailPdfView, self).get_context_data(**kwargs)
         context["employee"] = employee
-        context["outstanding_tasks"] = employee.trainings_task_set.filter(
-            type__is_training=False
-        ).outstanding()
-        context["outstanding_trainings"] = employee.trainings_task_set.filter(
-            type__is_training=True
-        ).outstanding()
+        context["outstanding_tasks"] = load_task_rows(
+            employee.trainings_task_set.filter(type__is_training=False).outstanding()
+        )
+        context["outstanding_trainings"] = load_task_rows(
+            employee.trainings_task_set.filter(type__is_training=True).outstanding()
+        )
         context["completed_tasks"] = employee.trainings_taskhistory_set.filter(
             type__is_training=False, status=TaskHistoryStatus.completed
-        )
+        ).select_related("type")
         context["completed_trainings"] = employee.trainings_taskhistory_set.filter(
             type__is_training=True, status=TaskHistoryStatus.completed
-        )
+        ).select_related("type")
         return context
 
     def get_filename(self):
@@ -320,11 +376,15 @@ class EmployeesCertificatesPdfView(PdfView):
         employee = self.get_object()
         context = super(EmployeesCertificatesPdfView, self).get_context_data(**kwargs)
         context["employee"] = employee
-        context["completed_tasks"] = employee.trainings_taskhistory_set.filter(
-            type__is_training=False, status=TaskHistoryStatus.completed
+        context["completed_tasks"] = load_task_history_rows(
+            employee.trainings_taskhistory_set.filter(
+                type__is_training=False, status=TaskHistoryStatus.completed
+            )
         )
-        context["completed_trainings"] = employee.trainings_taskhistory_set.filter(
-            type__is_training=True, status=TaskHistoryStatus.completed
+        context["completed_trainings"] = load_task_history_rows(
+            employee.trainings_taskhistory_set.filter(
+                type__is_training=True, status=TaskHistoryStatus.completed
+            )
         )
         return context
 
@@ -337,10 +397,8 @@ class UpcomingTasksPdfView(PdfParametersView):
     template_name = "trainings/upcoming-tasks.pdf.html"
 
     def get_tasks(self, params):
-        tasks = self.get_queryset(params)
-        task_ids = self.get_task_ids(params)
-        tasks = sorted(tasks, key=lambda r: task_ids.index(r.pk))
-        return tasks
+        rows = load_task_rows(self.get_queryset(params))
+        return order_by_ids(rows, self.get_task_ids(params), key=lambda row: row.task.pk)
 
     def get_queryset(self, params):
         queryset = super(UpcomingTasksPdfView, self).get_queryset()
@@ -368,8 +426,9 @@ class UpcomingTasksPdfView(PdfParametersView):
         return "Upcoming {}s.pdf".format(self.get_type(parameters))
 
 
-class ResponsibilityViewSet(ModelViewSet):
+class ResponsibilityViewSet(ConditionalGetMixin, CompiledListMixin, ModelViewSet):
     queryset = Responsibility.objects.all()
+    conditional_get_related = ("position",)
     serializer_class = ResponsibilityReadWriteSerializer
     permission_classes = IsAuthenticated, IsSameFacilityForEditing
 
@@ -412,13 +471,14 @@ class ResponsibilityEducationRequirementViewSet(MultiSerializerMixin, ModelViewS
     permission_classes = (IsAuthenticated,)
 
 
-class PositionViewSet(MultiSerializerMixin, ModelViewSet):
+class PositionViewSet(ConditionalGetMixin, CompiledListMixin, MultiSerializerMixin, ModelViewSet):
     serializers = {
         "POST": DefaultPositionSerializer,
         "PUT": DefaultPositionSerializer,
         "PATCH": DefaultPositionSerializer,
     }
     queryset = Position.objects.prefetch_related("responsibilities")
+    conditional_get_related = ("responsibilities",)
     permission_classes = (
         IsAuthenticated,
         IsSameFacilityForEditing,
@@ -427,7 +487,7 @@ class PositionViewSet(MultiSerializerMixin, ModelViewSet):
     serializer_class = PositionSerializer
 
 
-class TaskTypeViewSet(MultiSerializerMixin, ModelViewSet):
+class TaskTypeViewSet(ConditionalGetMixin, MultiSerializerMixin, ModelViewSet):
     serializers = {
         "POST": TaskTypeWriteSerializer,
         "PUT": TaskTypeWriteSerializer,
@@ -441,12 +501,23 @@ class TaskTypeViewSet(MultiSerializerMixin, ModelViewSet):
     )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TaskTypeFilter
+    conditional_get_related = (
+        "required_for",
+        "prerequisites",
+        "education_credits",
+        "responsibilityeducationrequirement",
+        "course",
+        "course__items",
+    )
 
     def get_queryset(self):
         facility = self.request.facility
         queryset = super(TaskTypeViewSet, self).get_queryset()
         return queryset.filter(Q(facility=facility) | Q(facility=None))
 
+    def get_conditional_get_extra(self, queryset):
+        return get_course_progress(self.request.user)
+
 
 class CustomTaskTypeViewSet(
     MultiSerializerMixin,
@@ -495,7 +566,7 @@ class CustomTaskTypeViewSet(
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class TaskViewSet(MultiSerializerMixin, ModelViewSet):
+class TaskViewSet(CompiledListMixin, MultiSerializerMixin, ModelViewSet):
     serializers = {
         "POST": TaskWriteSerializer,
         "PUT": TaskWriteSerializer,
@@ -549,7 +620,7 @@ class TaskViewSet(MultiSerializerMixin, ModelViewSet):
         return get_response_format(request.query_params, serializers.data)
 
 
-class TaskHistoryViewSet(MultiSerializerMixin, ModelViewSet):
+class TaskHistoryViewSet(CompiledListMixin, MultiSerializerMixin, ModelViewSet):
     serializers = {
         "POST": TaskHistoryCreateSerializer,
         "PUT": TaskHistoryCreateSerializer,
@@ -714,6 +785,110 @@ class CurrentUserView(views.APIView):
         )
 
 
+class SyncView(views.APIView):
+    """
+    Delta sync of the mobile app: the employee, tasks, task histories and
+    courses of the user (as `/employees/me`, `/tasks/me`, `/task_histories/me`
+    and `/courses/`) created or modified since the `cursor` parameter, and the
+    ids of the ones deleted since (from the tombstones). A deleted course item
+    bumps its course (see `apps.trainings.scoring`), which is sent again.
+
+    Without a cursor, or with a cursor older than the tombstones, everything
+    is sent with `reset`, and the client must drop what it has. The response
+    `cursor` is for the next sync; it overlaps with this one by
+    `SYNC_CURSOR_OVERLAP` not to miss the changes of the transactions still
+    running, so a record can be sent twice. The cursor is opaque to the client
+    (a number of microseconds since the epoch).
+
+    Only the `modified` of the records is compared: a change to a related
+    object (e.g. the task type of a task) isn't synced until the record is
+    saved.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        employee = get_object_or_404(Employee, user=request.user)
+        now = timezone.now()
+        since = self.get_since(now)
+        context = {"request": request, "view": self, "format": format}
+
+        tasks = Task.objects.filter(employee=employee)
+        task_histories = TaskHistory.objects.filter(employee=employee)
+        courses = Course.objects.all()
+        if request.user.facility_users.role == FacilityUser.Role.trainings_user:
+            courses = courses.filter(published=True)
+
+        deleted = {"tasks": [], "task_histories": [], "employee_courses": [], "courses": []}
+        if since is not None:
+            tasks = tasks.filter(modified__gt=since)
+            task_histories = task_histories.filter(modified__gt=since)
+            changed_courses = Course.objects.filter(
+                Q(modified__gt=since)
+                | Q(items__modified__gt=since)
+                | Q(employee_courses__employee=employee, employee_courses__modified__gt=since)
+                | Q(
+                    items__employee_course_items__employee=employee,
+                    items__employee_course_items__modified__gt=since,
+                )
+            ).values("pk")
+            # Unpublished courses disappear from the list.
+            deleted["courses"] = list(
+                Course.objects.filter(modified__gt=since)
+                .exclude(pk__in=courses.values("pk"))
+                .values_list("pk", flat=True)
+            )
+            deleted["courses"] += Tombstone.objects.filter(
+                kind=Tombstone.Kind.course, deleted__gt=since
+            ).values_list("object_id", flat=True)
+            courses = courses.filter(pk__in=changed_courses)
+
+            keys = {
+                Tombstone.Kind.task: "tasks",
+                Tombstone.Kind.task_history: "task_histories",
+                Tombstone.Kind.employee_course: "employee_courses",
+            }
+            tombstones = Tombstone.objects.filter(employee=employee, deleted__gt=since)
+            for kind, object_id in tombstones.values_list("kind", "object_id"):
+                deleted[keys[kind]].append(object_id)
+
+        employee_data = None
+        if since is None or employee.modified > since:
+            employee_data = EmployeeReadExpandableSerializer(employee, context=context).data
+
+        return Response(
+            {
+                "cursor": self.get_cursor(now - settings.SYNC_CURSOR_OVERLAP),
+                "reset": since is None,
+                "employee": employee_data,
+                "tasks": TaskReadExpandSerializer(tasks, many=True, context=context).data,
+                "task_histories": TaskHistoryExpandedSerializer(
+                    task_histories, many=True, context=context
+                ).data,
+                "courses": CourseSerializer(courses, many=True, context=context).data,
+                "deleted": deleted,
+            }
+        )
+
+    def get_cursor(self, since):
+        return str((since - SYNC_EPOCH) // timedelta(microseconds=1))
+
+    def get_since(self, now):
+        """
+        Returns the date of the `cursor` parameter, or None for a full sync.
+        """
+        cursor = self.request.query_params.get("cursor")
+        if not cursor:
+            return None
+        try:
+            since = SYNC_EPOCH + timedelta(microseconds=int(cursor))
+        except (ValueError, OverflowError):
+            raise ValidationError({"cursor": "Invalid cursor."})
+        if since < now - settings.SYNC_TOMBSTONE_RETENTION:
+            return None
+        return since
+
+
 class TrainingEventPdfView(PdfView):
     template_name = "trainings/training-event.pdf.html"
     queryset = TrainingEvent.objects.all()
@@ -743,7 +918,11 @@ class AllowedTaskTypesViewSet(ChildViewSetMixin, ReadOnlyModelViewSet):
     )
 
     def get_queryset(self):
-        return self.parent_object.get_tasktypes_allowed_by_prerequisites()
+        return self.parent_object.get_tasktypes_allowed_by_prerequisites(
+            TaskType.objects.select_related("course").prefetch_related(
+                "required_for", "education_credits"
+            )
+        )
 
 
 class ContinuingEducationSummaryForFacilityView(views.APIView):
@@ -773,13 +952,15 @@ class ContinuingEducationSummaryForEmployeeView(views.APIView):
         return Response({"employee_summary": summary, "pk": employee_id})
 
 
-class PositionGroupViewSet(MultiSerializerMixin, ModelViewSet):
+class PositionGroupViewSet(CompiledListMixin, MultiSerializerMixin, ModelViewSet):
     queryset = PositionGroup.objects.all()
     serializer_class = PositionGroupReadSerializer
     permission_classes = (IsAuthenticated, FacilityHasStaffSubscriptionIfRequired)
 
 
 class CourseViewSet(
+    ConditionalGetMixin,
+    CompiledListMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     mixins.CreateModelMixin,
@@ -792,6 +973,15 @@ class CourseViewSet(
     permission_classes = (IsAuthenticated, NonEmployeeUserEditing)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CourseFilter
+    conditional_get_related = (
+        "items",
+        "items__texts",
+        "items__videos",
+        "items__letter_size_image",
+        "items__boolean",
+        "items__choices",
+        "items__choices__options",
+    )
 
     def get_queryset(self):
         queryset = super(CourseViewSet, self).get_queryset()
@@ -805,6 +995,19 @@ class CourseViewSet(
 
         return queryset
 
+    def get_conditional_get_extra(self, queryset):
+        progress = get_course_progress(self.request.user)
+        if self.action == "bundle" and progress is not None:
+            # The bundle also shows the course's task, created on the first open.
+            progress.append(
+                list(
+                    Task.objects.filter(
+                        employee=self.request.user.employee, type__course__in=queryset
+                    ).values_list("pk", flat=True)
+                )
+            )
+        return progress
+
     @action_decorator(
         methods=["get"],
         serializer_class=CourseOpenSerializer,
@@ -817,9 +1020,80 @@ class CourseViewSet(
         serializer = self.get_serializer(instance=course, context={"request": request})
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
+    @action_decorator(
+        methods=["get"],
+        serializer_class=CourseBundleSerializer,
+        authentication_classes=(TrainingsTimedAuthTokenAuthentication,),
+        permission_classes=(IsAuthenticated,),
+        detail=True,
+    )
+    def bundle(self, request, pk):
+        """
+        Everything the app needs to run a course, in one response and a fixed
+        number of queries: the course with all its items (`content`) and the
+        employee's progress in it (`progress`).
+
+        The content is the same for every employee, so it is cached until the
+        course or its items change. Conditional requests are answered with a
+        304 like the list and retrieve ones.
+        """
+        check_user_employee(request.user)
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk=pk)
+        return self.conditional_get(queryset, self.get_bundle, request, pk)
+
+    def get_bundle(self, request, pk):
+        course = self.get_object()
+        # The content is versioned by the state of the course and its
+        # relations, so an edit is never served from the cache.
+        state = self.get_conditional_get_state(Course.objects.filter(pk=course.pk))
+        payload = json.dumps(sorted(state.items()), cls=DjangoJSONEncoder)
+        key = "course-bundle:{}:{}:{}".format(
+            course.pk, hashlib.sha1(payload.encode()).hexdigest(), request.build_absolute_uri("/")
+        )
+        content = cache.get(key)
+        if content is None:
+            CourseBundleSerializer.prefetch([course])
+            content = self.get_serializer(instance=course).data
+            cache.set(key, content, settings.COURSE_BUNDLE_CACHE_TIMEOUT)
+
+        data = {
+            "content": content,
+            "progress": get_course_progress_data(request.user.employee, course),
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    @action_decorator(
+        methods=["post"],
+        serializer_class=CourseAnswersSerializer,
+        authentication_classes=(TrainingsTimedAuthTokenAuthentication,),
+        permission_classes=(IsAuthenticated,),
+        detail=True,
+    )
+    def answers(self, request, pk):
+        """
+        Completes the items of `answers` at once, instead of one
+        `course-items/{id}/item_complete` per item, and returns them with the
+        score.
+        """
+        check_user_employee(request.user)
+        course = self.get_object()
+        serializer = CourseAnswersSerializer(
+            data=request.data, context={"request": request, "course": course}
+        )
+        serializer.is_valid(raise_exception=True)
+        employee_course_items = serializer.save()
+        data = {
+            "items": CourseItemProgressSerializer(employee_course_items, many=True).data,
+            "total": course.scorable_items,
+            "score": EmployeeCourseItem.objects.filter(
+                course_item__course=course, employee=request.user.employee, is_correct=True
+            ).count(),
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
     def list(self, request, *args, **kwargs):
-        response = super(CourseViewSet, self).list(request, args, kwargs)
-        return get_response_format(request.query_params, response.data)
+        response = super(CourseViewSet, self).list(request, *args, **kwargs)
+        return format_list_response(request.query_params, response)
 
     @action_decorator(methods=["get", "post"], serializer_class=CourseItemSerializer, detail=True)
     def items(self, request, pk):
@@ -906,6 +1180,7 @@ class CourseViewSet(
 
 
 class CourseItemViewSet(
+    ConditionalGetMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     mixins.CreateModelMixin,
@@ -916,6 +1191,14 @@ class CourseItemViewSet(
     serializer_class = CourseItemSerializer
     queryset = CourseItem.objects.all()
     permission_classes = (IsAuthenticated, NonEmployeeUserEditing)
+    conditional_get_related = (
+        "texts",
+        "videos",
+        "letter_size_image",
+        "boolean",
+        "choices",
+        "choices__options",
+    )
 
     def get_queryset(self):
         queryset = CourseItem.objects.all()
@@ -937,6 +1220,9 @@ class CourseItemViewSet(
 
         return queryset
 
+    def get_conditional_get_extra(self, queryset):
+        return get_course_progress(self.request.user)
+
     @action_decorator(methods=["get", "post"], detail=True)
     def texts(self, request, pk):
         item = self.get_object()
@@ -1028,9 +1314,7 @@ class CourseItemViewSet(
         serializer.is_valid(raise_exception=True)
         serializer.save()
         extra_data = {
-            "total": course_item.course.items.filter(
-                Q(boolean__isnull=False) | Q(choices__isnull=False)
-            ).count(),
+            "total": course_item.course.scorable_items,
             "score": EmployeeCourseItem.objects.filter(
                 course_item__course=course_item.course,
                 employee=request.user.employee,
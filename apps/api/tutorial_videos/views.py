@@ -2,9 +2,10 @@ from rest_framework import mixins, viewsets
 
 from apps.tutorials.models import TutorialVideo
 
+from ..mixins import ConditionalGetMixin
 from .serializers import TutorialVideoSerializer
 
 
-class TutorialVideosViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class TutorialVideosViewSet(ConditionalGetMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = TutorialVideo.objects.all()
     serializer_class = TutorialVideoSerializer
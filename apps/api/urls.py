@@ -47,6 +47,7 @@ from .trainings.views import (
     PositionViewSet,
     ResponsibilityEducationRequirementViewSet,
     ResponsibilityViewSet,
+    SyncView,
     TaskHistoryViewSet,
     TaskTypeEducationCreditViewSet,
     TaskTypeViewSet,
@@ -149,6 +150,7 @@ extra_patterns = [
     ),
     re_path(r"^compliance/$", ComplianceView.as_view(), name="compliance"),
     re_path(r"^currentuser/$", CurrentUserView.as_view(), name="currentuser"),
+    re_path(r"^sync/$", SyncView.as_view(), name="sync"),
     re_path(
         r"^training_events/(?P<pk>\d+).pdf/$",
         TrainingEventPdfView.as_view(),
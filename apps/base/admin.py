@@ -0,0 +1,52 @@
+import json
+
+from django.contrib import admin
+from django.utils.html import format_html
+
+from .models import RequestProfile
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "created",
+        "method",
+        "path",
+        "status_code",
+        "duration",
+        "queries",
+        "query_time",
+        "duplicated_queries_count",
+        "serializer_time",
+    )
+    list_filter = ("method", "status_code")
+    search_fields = ("path",)
+    readonly_fields = [
+        field.name
+        for field in RequestProfile._meta.fields
+        if field.name not in ("duplicated_queries", "profile")
+    ] + ["duplicated_queries_display", "profile_display"]
+    exclude = ("duplicated_queries", "profile")
+
+    def duplicated_queries_count(self, obj):
+        return len(obj.duplicated_queries)
+
+    duplicated_queries_count.short_description = "Duplicated queries"
+
+    def duplicated_queries_display(self, obj):
+        return format_html("<pre>{}</pre>", json.dumps(obj.duplicated_queries, indent=2))
+
+    duplicated_queries_display.short_description = "Duplicated queries"
+
+    def profile_display(self, obj):
+        return format_html("<pre>{}</pre>", obj.profile)
+
+    profile_display.short_description = "Profile"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
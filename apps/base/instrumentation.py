@@ -0,0 +1,90 @@
+"""
+Per task metrics of the celery workers.
+
+The `task_prerun` and `task_postrun` handlers below measure every task run by
+a worker: wall time, CPU time, and the number, duration and rows (returned or
+affected) of its database queries. The totals are kept per task name in
+`TaskMetrics`, exposed to Prometheus by `apps.base.views.task_metrics` and
+summarized by the `task_metrics` management command.
+
+Tasks run eagerly (development, tests, `CELERY_TASK_ALWAYS_EAGER`) are not
+measured: they run inside the request that called them.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from celery.signals import task_postrun, task_prerun
+
+
+class TaskProbe(object):
+    """
+    Measures a task run. Installed as an execute wrapper of the connection to
+    measure its queries.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.queries = 0
+        self.query_time = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.monotonic() - started
+            self.queries += 1
+            self.rows += max(context["cursor"].rowcount, 0)
+
+    def stop(self):
+        self.wall_time = time.monotonic() - self.started
+        self.cpu_time = time.process_time() - self.cpu_started
+
+
+_probes = {}
+
+
+@task_prerun.connect
+def start_task_probe(task_id=None, task=None, **kwargs):
+    if not settings.TASK_METRICS_ENABLED or task.request.is_eager:
+        return
+
+    probe = TaskProbe()
+    _probes[task_id] = probe
+    connection.execute_wrappers.append(probe)
+
+
+@task_postrun.connect
+def stop_task_probe(task_id=None, task=None, state=None, **kwargs):
+    probe = _probes.pop(task_id, None)
+    if probe is None:
+        return
+
+    probe.stop()
+    if probe in connection.execute_wrappers:
+        connection.execute_wrappers.remove(probe)
+    record(task.name, probe, failed=state != "SUCCESS")
+
+
+def record(task_name, probe, failed=False):
+    from .models import TaskMetrics
+
+    TaskMetrics.objects.get_or_create(task=task_name)
+    TaskMetrics.objects.filter(task=task_name).update(
+        runs=F("runs") + 1,
+        failures=F("failures") + int(failed),
+        wall_time=F("wall_time") + probe.wall_time,
+        max_wall_time=Greatest("max_wall_time", Value(probe.wall_time)),
+        cpu_time=F("cpu_time") + probe.cpu_time,
+        queries=F("queries") + probe.queries,
+        query_time=F("query_time") + probe.query_time,
+        rows=F("rows") + probe.rows,
+        last_run=timezone.now(),
+    )
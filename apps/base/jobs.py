@@ -0,0 +1,118 @@
+"""
+Beat jobs fanned out to the workers.
+
+A beat job used to run as a single task looping over every facility, so adding
+workers didn't shorten it, and nothing prevented two runs from overlapping (a
+run overrunning until the next one, or two beat processes). A `FanOutJob`
+splits its work in keys (facility ids, ...), and `start_run`:
+
+- takes a database advisory lock on the job, and skips the run if another run
+  of the job is still in progress;
+- records the run in the `JobRun` ledger;
+- splits the keys in at most `JOB_FANOUT_CONCURRENCY` parts, processed by
+  `run_job_part` tasks spread over the workers.
+
+Each part updates the ledger as it finishes, the last one marks the run
+finished. A part that crashes marks the run finished and failed, instead of
+leaving it in progress until it is stale.
+"""
+import abc
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import JobRun
+from .outbox import enqueue
+from .tasks import run_job_part
+
+logger = logging.getLogger(__name__)
+
+
+def lock_id(name):
+    """Maps `name` to a (signed 64 bits) postgres advisory lock id."""
+    return int(hashlib.sha1(name.encode()).hexdigest()[:15], 16)
+
+
+def try_advisory_lock(name):
+    """
+    Tries to take the advisory lock `name` until the end of the current
+    transaction. Returns whether it was taken.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [lock_id(name)])
+        return cursor.fetchone()[0]
+
+
+def split(keys, count):
+    """Splits `keys` in at most `count` parts of (about) the same size."""
+    parts = [keys[index::count] for index in range(count)]
+    return [part for part in parts if part]
+
+
+def start_run(name, keys, concurrency=None):
+    """
+    Processes the `keys` of the job `name`, the dotted path of its class, in
+    parts run by the workers. Returns the `JobRun`, or None when a run of the
+    job is still in progress.
+    """
+    concurrency = concurrency or settings.JOB_FANOUT_CONCURRENCY
+    keys = list(keys)
+
+    with transaction.atomic():
+        if not try_advisory_lock(name):
+            logger.warning("%s is already starting, skipping", name)
+            return None
+
+        stale = timezone.now() - settings.JOB_RUN_STALE_AFTER
+        if JobRun.objects.filter(name=name, finished__isnull=True, started__gt=stale).exists():
+            logger.warning("%s is still running, skipping", name)
+            return None
+
+        parts = split(keys, concurrency)
+        run = JobRun.objects.create(name=name, parts=len(parts), keys=len(keys))
+        if not parts:
+            run.finished = run.started
+            run.save(update_fields=["finished"])
+
+        for part in parts:
+            enqueue(run_job_part, run.pk, name, part)
+
+    logger.info("%s: %s keys in %s parts", name, len(keys), len(parts))
+    return run
+
+
+class FanOutJob(abc.ABC):
+    """
+    A beat job whose work is split in keys processed independently.
+
+    Subclasses implement `get_keys` and `do_key`. `do` runs the whole job in
+    the current process, `fan_out` spreads it over the workers.
+    """
+
+    def should_run(self):
+        return True
+
+    @abc.abstractmethod
+    def get_keys(self):
+        pass
+
+    @abc.abstractmethod
+    def do_key(self, key):
+        pass
+
+    def do(self):
+        if not self.should_run():
+            return
+
+        for key in self.get_keys():
+            self.do_key(key)
+
+    def fan_out(self):
+        if not self.should_run():
+            return None
+
+        cls = type(self)
+        return start_run("{}.{}".format(cls.__module__, cls.__qualname__), self.get_keys())
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ...profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Prints a token profiling the requests sent with it in the X-Profile header"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cprofile", action="store_true", help="Include a cProfile dump in the profiles"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token(cprofile=options["cprofile"]))
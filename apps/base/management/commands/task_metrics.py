@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from ...models import TaskMetrics
+
+
+class Command(BaseCommand):
+    help = "Summarizes the metrics of the celery tasks, slowest first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Number of tasks to show")
+        parser.add_argument(
+            "--reset", action="store_true", help="Clear the metrics after showing them"
+        )
+
+    def handle(self, *args, **options):
+        metrics = TaskMetrics.objects.order_by("-wall_time")[: options["limit"]]
+        header = "{:<60} {:>8} {:>6} {:>10} {:>10} {:>10} {:>10} {:>12}"
+        row = "{:<60} {:>8} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.1f} {:>12.1f}"
+        self.stdout.write(
+            header.format(
+                "task", "runs", "failed", "avg wall", "max wall", "avg cpu", "avg qs", "avg rows"
+            )
+        )
+        for metric in metrics:
+            runs = metric.runs or 1
+            self.stdout.write(
+                row.format(
+                    metric.task[-60:],
+                    metric.runs,
+                    metric.failures,
+                    metric.wall_time / runs,
+                    metric.max_wall_time,
+                    metric.cpu_time / runs,
+                    metric.queries / runs,
+                    metric.rows / runs,
+                )
+            )
+
+        if options["reset"]:
+            TaskMetrics.objects.all().delete()
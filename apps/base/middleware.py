@@ -1,10 +1,118 @@
 from django.conf import settings
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
 
 import pytz
 
+from . import profiling
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing, the others (PDFs, images...) already are.
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def get_accepted_encodings(request):
+    """
+    Returns the encodings of the `Accept-Encoding` header of `request`, without
+    the ones refused with `q=0`.
+    """
+    encodings = set()
+    for item in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        encoding, *params = [part.strip() for part in item.split(";")]
+        quality = 1
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    pass
+        if encoding and quality > 0:
+            encodings.add(encoding.lower())
+    return encodings
+
 
 class TimezoneMiddleware(MiddlewareMixin):
     def process_request(self, request):
         timezone.activate(pytz.timezone(settings.DISPLAY_TIME_ZONE))
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles the requests asking for it, see `apps.base.profiling`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = profiling.get_options(request)
+        if options is None:
+            return self.get_response(request)
+
+        with profiling.RequestProfiler(cprofile=options.get("cprofile")) as profiler:
+            response = self.get_response(request)
+        profiler.save(request, response)
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses the responses of `COMPRESSION_MIN_SIZE` bytes or more with
+    brotli, or gzip, as the client accepts. Like Django's `GZipMiddleware`,
+    it sets `Vary: Accept-Encoding` and weakens strong ETags. Streaming
+    responses are only compressed with gzip.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        accepted = get_accepted_encodings(request)
+        if response.streaming:
+            if "gzip" not in accepted:
+                return response
+            # The compressed size isn't known until the content is streamed.
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers["Content-Length"]
+            encoding = "gzip"
+        else:
+            if brotli is not None and "br" in accepted:
+                encoding = "br"
+                content = brotli.compress(
+                    response.content, quality=settings.COMPRESSION_BROTLI_QUALITY
+                )
+            elif "gzip" in accepted:
+                encoding = "gzip"
+                content = compress_string(response.content)
+            else:
+                return response
+            # Only send the compressed content when it's actually shorter.
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # A strong ETag is for the exact bytes, see `GZipMiddleware`.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
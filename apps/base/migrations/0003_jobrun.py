@@ -0,0 +1,35 @@
+# Generated by Django 3.2.19 on 2026-10-19 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0002_outboxjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobRun",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name", models.CharField(db_index=True, max_length=255)),
+                ("started", models.DateTimeField(auto_now_add=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                ("parts", models.PositiveIntegerField(default=0)),
+                ("parts_done", models.PositiveIntegerField(default=0)),
+                ("keys", models.PositiveIntegerField(default=0)),
+                ("keys_done", models.PositiveIntegerField(default=0)),
+                ("keys_failed", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "get_latest_by": "started",
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0003_jobrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskMetrics",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("task", models.CharField(max_length=255, unique=True)),
+                ("runs", models.PositiveIntegerField(default=0)),
+                ("failures", models.PositiveIntegerField(default=0)),
+                ("wall_time", models.FloatField(default=0)),
+                ("max_wall_time", models.FloatField(default=0)),
+                ("cpu_time", models.FloatField(default=0)),
+                ("queries", models.PositiveBigIntegerField(default=0)),
+                ("query_time", models.FloatField(default=0)),
+                ("rows", models.PositiveBigIntegerField(default=0)),
+                ("last_run", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "task metrics",
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0004_taskmetrics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.TextField()),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("user_id", models.IntegerField(blank=True, null=True)),
+                ("duration", models.FloatField()),
+                ("queries", models.PositiveIntegerField()),
+                ("query_time", models.FloatField()),
+                ("duplicated_queries", models.JSONField(default=list)),
+                ("serializer_time", models.FloatField(default=0)),
+                ("profile", models.TextField(blank=True)),
+            ],
+            options={
+                "ordering": ["-id"],
+            },
+        ),
+    ]
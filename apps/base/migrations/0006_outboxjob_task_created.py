@@ -0,0 +1,17 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0005_requestprofile"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="outboxjob",
+            index=models.Index(fields=["task", "created"], name="base_outbox_task_22ff99_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0006_outboxjob_task_created"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobrun",
+            name="failed",
+            field=models.BooleanField(default=False),
+        ),
+    ]
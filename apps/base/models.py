@@ -66,3 +66,96 @@ class PdfParameters(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     parameters = models.TextField()  # will be a json dump of the post data
+
+
+class OutboxJob(models.Model):
+    """
+    A celery task waiting to be published, written in the same transaction as
+    the changes that triggered it. See `apps.base.outbox`.
+    """
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # Identical jobs (same task and arguments) share a key and are published once.
+    key = models.CharField(max_length=40, db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The latest pending job of a task, see `enqueue`.
+        indexes = [models.Index(fields=["task", "created"])]
+
+    def __str__(self):
+        return "{}{}".format(self.task, tuple(self.args))
+
+
+class JobRun(models.Model):
+    """
+    The ledger of a run of a beat job fanned out to the workers. See
+    `apps.base.jobs`.
+    """
+
+    name = models.CharField(max_length=255, db_index=True)
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    parts = models.PositiveIntegerField(default=0)
+    parts_done = models.PositiveIntegerField(default=0)
+    keys = models.PositiveIntegerField(default=0)
+    keys_done = models.PositiveIntegerField(default=0)
+    keys_failed = models.PositiveIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+
+    class Meta:
+        get_latest_by = "started"
+
+    def __str__(self):
+        return "{} ({})".format(self.name, self.started)
+
+
+class TaskMetrics(models.Model):
+    """
+    Totals of the runs of a celery task, recorded by `apps.base.instrumentation`.
+    """
+
+    task = models.CharField(max_length=255, unique=True)
+    runs = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    wall_time = models.FloatField(default=0)
+    max_wall_time = models.FloatField(default=0)
+    cpu_time = models.FloatField(default=0)
+    queries = models.PositiveBigIntegerField(default=0)
+    query_time = models.FloatField(default=0)
+    rows = models.PositiveBigIntegerField(default=0)
+    last_run = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "task metrics"
+
+    def __str__(self):
+        return self.task
+
+
+class RequestProfile(models.Model):
+    """
+    The measures of a profiled request, see `apps.base.profiling`. Only the
+    last `PROFILING_BUFFER_SIZE` profiles are kept.
+    """
+
+    created = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status_code = models.PositiveSmallIntegerField()
+    user_id = models.IntegerField(null=True, blank=True)
+    duration = models.FloatField()
+    queries = models.PositiveIntegerField()
+    query_time = models.FloatField()
+    # Queries run more than once, the signature of N+1 query patterns.
+    duplicated_queries = models.JSONField(default=list)
+    serializer_time = models.FloatField(default=0)
+    profile = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self):
+        return "{} {}".format(self.method, self.path)
@@ -0,0 +1,80 @@
+"""
+Transactional outbox for the celery tasks triggered by model signals.
+
+Calling `.delay()` from a signal publishes the task right away: the worker may
+pick it up before the transaction that triggered it commits (and see stale
+data, or data that is rolled back), and a burst of changes publishes the same
+task over and over. `enqueue` writes the task to the `OutboxJob` table instead,
+in the same transaction. Once the transaction commits, the outbox is drained
+by the `dispatch_outbox` task, which publishes identical jobs only once.
+
+Jobs are only merged with the latest pending job of the same task, so the
+order of the jobs of a task is kept: add, remove, add is published as is,
+add, add, remove as add, remove.
+
+With `CELERY_TASK_ALWAYS_EAGER` (development and tests) tasks are still run right
+away, as `.delay()` would.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import OutboxJob
+from .tasks import dispatch_outbox
+
+
+def job_key(task_name, args, kwargs):
+    payload = json.dumps([task_name, args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def enqueue(task, *args, **kwargs):
+    """
+    Publishes `task` with `args` and `kwargs`, which must be JSON serializable,
+    after the current transaction commits. The job is merged into the latest
+    pending job of `task` when they are identical.
+    """
+    if task.app.conf.task_always_eager:
+        return task.delay(*args, **kwargs)
+
+    args = list(args)
+    key = job_key(task.name, args, kwargs)
+    with transaction.atomic():
+        latest = OutboxJob.objects.filter(task=task.name).order_by("-created", "-id").first()
+        # A job locked by the dispatcher is being published, so it could run
+        # before this transaction commits: only merge into a job still waiting.
+        merged = (
+            latest is not None
+            and latest.key == key
+            and OutboxJob.objects.select_for_update(skip_locked=True).filter(pk=latest.pk).exists()
+        )
+        if not merged:
+            OutboxJob.objects.create(task=task.name, args=args, kwargs=kwargs, key=key)
+
+    if not connection.in_atomic_block:
+        # Committed already, `on_commit` dispatches right away.
+        transaction.on_commit(schedule_dispatch)
+        return
+
+    # Once per transaction. Django has no rollback hook, so the flag is the id
+    # of the transaction that scheduled the dispatch rather than a boolean.
+    transaction_id = get_transaction_id()
+    if getattr(connection, "outbox_dispatch_transaction", None) != transaction_id:
+        connection.outbox_dispatch_transaction = transaction_id
+        transaction.on_commit(schedule_dispatch)
+
+
+def get_transaction_id():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_current()")
+        return cursor.fetchone()[0]
+
+
+def schedule_dispatch():
+    """
+    Drains the outbox after `OUTBOX_COALESCE_SECONDS`, so the jobs enqueued by
+    the transactions committed in the meantime are merged too.
+    """
+    dispatch_outbox.apply_async(countdown=settings.OUTBOX_COALESCE_SECONDS)
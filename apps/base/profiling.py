@@ -0,0 +1,147 @@
+"""
+Opt-in profiling of the requests, to diagnose slow endpoints in production.
+
+`ProfilingMiddleware` profiles a request when it carries a valid `X-Profile`
+header (see the `profiling_token` command) or is sampled (`PROFILING_SAMPLE_RATE`).
+A profile holds the total time, the number and time of the SQL queries, the
+queries run more than once (N+1 patterns), the time spent in the serializers
+and, if the token asks for it, a cProfile dump. Profiles are stored in the
+`RequestProfile` ring buffer, browsable in the admin.
+"""
+import cProfile
+import io
+import pstats
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+
+SALT = "apps.base.profiling"
+
+_local = threading.local()
+
+
+def make_token(cprofile=False):
+    return signing.dumps({"cprofile": cprofile}, salt=SALT)
+
+
+def get_options(request):
+    """
+    Returns the profiling options of the request, or None when it isn't
+    profiled.
+    """
+    token = request.META.get("HTTP_X_PROFILE")
+    if token:
+        try:
+            return signing.loads(token, salt=SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+        except signing.BadSignature:
+            return None
+    if random.random() < settings.PROFILING_SAMPLE_RATE:
+        return {"cprofile": False}
+    return None
+
+
+def fingerprint(sql):
+    """Normalizes `sql` so the same query with other values has the same fingerprint."""
+    sql = re.sub(r"IN \((?:%s, )*%s\)", "IN (...)", sql)
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    return re.sub(r"\b\d+\b", "?", sql)
+
+
+class RequestProfiler(object):
+    def __init__(self, cprofile=False):
+        self.queries = 0
+        self.query_time = 0
+        self.fingerprints = defaultdict(lambda: {"count": 0, "time": 0})
+        self.serializer_time = 0
+        self.serializing = False
+        self.cprofile = cProfile.Profile() if cprofile else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.monotonic() - started
+            self.queries += 1
+            self.query_time += elapsed
+            query = self.fingerprints[fingerprint(sql)]
+            query["count"] += 1
+            query["time"] += elapsed
+
+    def __enter__(self):
+        _local.profiler = self
+        self.started = time.monotonic()
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        if self.cprofile:
+            self.cprofile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.cprofile:
+            self.cprofile.disable()
+        self.wrapper.__exit__(*exc_info)
+        self.duration = time.monotonic() - self.started
+        _local.profiler = None
+
+    def get_duplicated_queries(self):
+        duplicated = [
+            {"sql": sql[:1000], "count": query["count"], "time": round(query["time"], 6)}
+            for sql, query in self.fingerprints.items()
+            if query["count"] > 1
+        ]
+        return sorted(duplicated, key=lambda query: query["count"], reverse=True)[:20]
+
+    def get_profile(self):
+        if not self.cprofile:
+            return ""
+        stream = io.StringIO()
+        pstats.Stats(self.cprofile, stream=stream).sort_stats("cumulative").print_stats(50)
+        return stream.getvalue()
+
+    def save(self, request, response):
+        from .models import RequestProfile
+
+        user = getattr(request, "user", None)
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path(),
+            status_code=response.status_code,
+            user_id=user.pk if user is not None and user.is_authenticated else None,
+            duration=self.duration,
+            queries=self.queries,
+            query_time=self.query_time,
+            duplicated_queries=self.get_duplicated_queries(),
+            serializer_time=self.serializer_time,
+            profile=self.get_profile(),
+        )
+        RequestProfile.objects.filter(pk__lte=profile.pk - settings.PROFILING_BUFFER_SIZE).delete()
+        return profile
+
+
+def timed_serialization(fget):
+    """
+    Wraps the getter of a serializer `data` property to add its time to the
+    profile of the current request. Nested calls are only counted once.
+    """
+
+    def data(serializer):
+        profiler = getattr(_local, "profiler", None)
+        if profiler is None or profiler.serializing:
+            return fget(serializer)
+
+        profiler.serializing = True
+        started = time.monotonic()
+        try:
+            return fget(serializer)
+        finally:
+            profiler.serializer_time += time.monotonic() - started
+            profiler.serializing = False
+
+    return data
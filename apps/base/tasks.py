@@ -0,0 +1,121 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from celery import Task, current_app, shared_task
+from django_celery_results.models import TaskResult
+
+from .models import JobRun, OutboxJob
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchOutbox(object):
+    """
+    Publishes the jobs of the outbox, in order.
+
+    Consecutive identical jobs of a task (same arguments) are published once;
+    identical jobs separated by another job of the task aren't, so the order
+    of the jobs of a task is kept. Jobs locked by a concurrent run, or by a
+    transaction merging a new job into them, are skipped; they'll be published
+    by that run or by the next one.
+    """
+
+    batch_size = 500
+
+    def do(self):
+        while self.dispatch_batch():
+            pass
+
+    def dispatch_batch(self):
+        with transaction.atomic():
+            jobs = list(
+                OutboxJob.objects.select_for_update(skip_locked=True).order_by("created", "id")[
+                    : self.batch_size
+                ]
+            )
+            if not jobs:
+                return 0
+
+            published = 0
+            last_keys = {}
+            for job in jobs:
+                if last_keys.get(job.task) != job.key:
+                    current_app.send_task(job.task, args=job.args, kwargs=job.kwargs)
+                    published += 1
+                last_keys[job.task] = job.key
+
+            OutboxJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+
+        logger.info("published %s outbox jobs (%s enqueued)", published, len(jobs))
+        return len(jobs)
+
+
+@shared_task
+def dispatch_outbox():
+    DispatchOutbox().do()
+
+
+class JobPartTask(Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # The part won't record itself, the run would stay in progress (and
+        # block the next ones) until it is stale.
+        run_id = args[0] if args else kwargs["run_id"]
+        JobRun.objects.filter(pk=run_id, finished__isnull=True).update(
+            finished=timezone.now(), failed=True
+        )
+
+
+@shared_task(base=JobPartTask)
+def run_job_part(run_id, job_path, keys):
+    """
+    Runs a part of a fanned out job (see `apps.base.jobs`) and records it in the
+    run's ledger. A failing key is logged and doesn't stop the others, a crash
+    of the part fails the run.
+    """
+    job = import_string(job_path)()
+    failed = 0
+    for key in keys:
+        try:
+            job.do_key(key)
+        except Exception:
+            logger.exception("%s failed for %s", job_path, key)
+            failed += 1
+
+    runs = JobRun.objects.filter(pk=run_id)
+    runs.update(
+        parts_done=F("parts_done") + 1,
+        keys_done=F("keys_done") + len(keys) - failed,
+        keys_failed=F("keys_failed") + failed,
+    )
+    runs.filter(parts_done=F("parts"), finished__isnull=True).update(finished=timezone.now())
+
+
+class PruneTaskResults(object):
+    """
+    Deletes the stored task results older than `TASK_RESULT_RETENTION`, in
+    batches so the table isn't locked for long.
+    """
+
+    batch_size = 5000
+
+    def do(self):
+        expired = timezone.now() - settings.TASK_RESULT_RETENTION
+        while True:
+            pks = list(
+                TaskResult.objects.filter(date_done__lt=expired).values_list("pk", flat=True)[
+                    : self.batch_size
+                ]
+            )
+            if not pks:
+                break
+            TaskResult.objects.filter(pk__in=pks).delete()
+
+
+@shared_task
+def prune_task_results():
+    PruneTaskResults().do()
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .models import TaskMetrics
+
+TASK_METRICS = (
+    ("runs", "counter", "Runs of the task."),
+    ("failures", "counter", "Failed runs of the task."),
+    ("wall_time", "counter", "Wall time spent running the task, in seconds."),
+    ("max_wall_time", "gauge", "Longest run of the task, in seconds."),
+    ("cpu_time", "counter", "CPU time spent running the task, in seconds."),
+    ("queries", "counter", "Database queries run by the task."),
+    ("query_time", "counter", "Time spent in database queries by the task, in seconds."),
+    ("rows", "counter", "Database rows returned or affected by the queries of the task."),
+)
+
+
+def task_metrics(request):
+    """
+    Exposes `TaskMetrics` in the Prometheus text format. Scrapers authenticate
+    with the `METRICS_TOKEN` bearer token, staff members with their session.
+    """
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    token = settings.METRICS_TOKEN
+    if not (token and constant_time_compare(authorization, "Bearer {}".format(token))):
+        return staff_member_required(render_task_metrics)(request)
+    return render_task_metrics(request)
+
+
+def render_task_metrics(request):
+    metrics = list(TaskMetrics.objects.order_by("task"))
+    lines = []
+    for field, kind, description in TASK_METRICS:
+        name = "celery_task_{}".format(field)
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} {}".format(name, kind))
+        for metric in metrics:
+            lines.append('{}{{task="{}"}} {}'.format(name, metric.task, getattr(metric, field)))
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
@@ -3,11 +3,29 @@ import re
 from django.conf import settings
 
 from celery import Celery
+from celery.signals import celeryd_init
+
+# Connects the handlers measuring the tasks.
+from apps.base import instrumentation  # noqa: F401
 
 app = Celery("apps")
-app.config_from_object("django.conf:settings")
+app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # re.sub to remove the `.apps.XConfig` from app entries.
 app.autodiscover_tasks(
     lambda: [re.sub(r"\.apps\.\w+Config", "", app) for app in settings.INSTALLED_APPS]
 )
+
+
+@celeryd_init.connect
+def configure_worker_queues(conf=None, options=None, **kwargs):
+    """
+    Applies the `QUEUE_WORKER_SETTINGS` of the queues the worker consumes.
+    """
+    queues = (options or {}).get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+
+    for queue in queues:
+        for key, value in settings.QUEUE_WORKER_SETTINGS.get(queue.strip(), {}).items():
+            setattr(conf, key, value)
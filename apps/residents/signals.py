@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from apps.base.outbox import enqueue
 from apps.residents.models import Resident, ResidentBedHold
 from apps.residents.tasks import send_ltc_status_notification
 
@@ -19,9 +20,9 @@ def on_save_resident(sender, instance, created, **kwargs):
         amends.append("discharge")
 
     if amends:
-        send_ltc_status_notification.delay(instance.id, amends)
+        enqueue(send_ltc_status_notification, instance.id, amends)
 
 
 @receiver(post_save, sender=ResidentBedHold)
 def on_save_resident_bed_hold(sender, instance, created, **kwargs):
-    send_ltc_status_notification.delay(instance.id, ["bed_hold"])
+    enqueue(send_ltc_status_notification, instance.id, ["bed_hold"])
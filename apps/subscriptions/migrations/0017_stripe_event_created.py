@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0016_sponsor_state_migration"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="stripe_event_created",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="subscription",
+            name="stripe_event_created",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
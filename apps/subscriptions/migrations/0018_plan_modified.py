@@ -0,0 +1,30 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:18
+
+import django.utils.timezone
+from django.db import migrations
+
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0017_stripe_event_created"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="billinginterval",
+            name="modified",
+            field=model_utils.fields.AutoLastModifiedField(
+                default=django.utils.timezone.now, editable=False, verbose_name="modified"
+            ),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="modified",
+            field=model_utils.fields.AutoLastModifiedField(
+                default=django.utils.timezone.now, editable=False, verbose_name="modified"
+            ),
+        ),
+    ]
@@ -7,7 +7,6 @@ from django.contrib.gis.db.models import Case, F, IntegerField, Value, When
 from django.contrib.gis.db.models.functions import Distance
 from django.db import models
 from django.db.models import Count, ExpressionWrapper
-from django.dispatch import receiver
 from django.template.defaultfilters import pluralize
 from django.utils.translation import gettext_lazy as _
 
@@ -15,12 +14,13 @@ import stripe
 from django_fsm import FSMField, transition
 from localflavor.us.models import USZipCodeField
 from model_utils import Choices
+from model_utils.fields import AutoLastModifiedField
 from model_utils.models import TimeStampedModel
 
 from apps.base.geocoder import get_geolocation_point
 from apps.base.models import random_name_in
 from apps.trainings.models import Facility
-from djstripeevents.signals import event_received
+from djstripeevents.models import EventType
 
 from .managers import SubscriptionManager
 
@@ -39,6 +39,7 @@ class Plan(models.Model):
 
     # Resident module fields
     capacity_limit = models.PositiveIntegerField(blank=True, null=True, help_text=_("Inclusive"))
+    modified = AutoLastModifiedField(_("modified"))
 
     def __str__(self):
         return self.name
@@ -62,6 +63,7 @@ class BillingInterval(models.Model):
     interval_count = models.PositiveIntegerField(
         help_text=_("The number of intervals between each subscription billing.")
     )
+    modified = AutoLastModifiedField(_("modified"))
 
     class Meta:
         ordering = ["amount"]
@@ -121,6 +123,9 @@ class Subscription(TimeStampedModel):
     trial_start = models.DateTimeField(blank=True, null=True)
     trial_end = models.DateTimeField(blank=True, null=True)
 
+    # `created` of the last stripe event applied, used to discard out of order webhooks.
+    stripe_event_created = models.DateTimeField(blank=True, null=True)
+
     objects = SubscriptionManager()
 
     def __str__(self):
@@ -189,6 +194,7 @@ class Invoice(models.Model):
     stripe_charge_id = models.CharField(max_length=255, blank=True)
     stripe_subscription_id = models.CharField(max_length=255)
     stripe_customer_id = models.CharField(max_length=255)
+    stripe_event_created = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return "${:,.2f}".format(self.total)
@@ -301,14 +307,20 @@ class Sponsor(TimeStampedModel):
         return qs
 
 
-@receiver(event_received)
-def handle_stripe_event_received(sender, event, **kwargs):
-    if event.type == event.Type.customer__subscription__deleted:
-        handle_subscription_deleted(event)
-    elif event.type == event.Type.customer__subscription__updated:
-        handle_subscription_updated(event)
-    elif event.type in (event.Type.invoice__created, event.Type.invoice__updated):
-        handle_invoice_created_or_updated(event)
+def is_stale_stripe_event(instance, stripe_event):
+    """
+    Stripe does not guarantee delivery order, an event older than the last one
+    applied to `instance` must not overwrite it.
+    """
+    if instance.stripe_event_created and stripe_event.created < instance.stripe_event_created:
+        logger.info(
+            "discarding stale webhook %s (%s) for %r",
+            stripe_event.stripe_id,
+            stripe_event.type,
+            instance,
+        )
+        return True
+    return False
 
 
 def handle_subscription_deleted(stripe_event):
@@ -323,8 +335,11 @@ def handle_subscription_deleted(stripe_event):
             stripe_id,
         )
     else:
+        if is_stale_stripe_event(subscription, stripe_event):
+            return
         subscription.cancel_by_stripe()
-        subscription.save()
+        subscription.stripe_event_created = stripe_event.created
+        subscription.save(update_fields=["status", "stripe_event_created", "modified"])
 
 
 def handle_subscription_updated(stripe_event):
@@ -339,6 +354,8 @@ def handle_subscription_updated(stripe_event):
             stripe_id,
         )
     else:
+        if is_stale_stripe_event(subscription, stripe_event):
+            return
         stripe_subscription = stripe_event.data["object"]
         if stripe_subscription["status"] == Subscription.Status.active:
             # We use an additional status `pending_cancel` where stripe uses a boolean.
@@ -355,7 +372,16 @@ def handle_subscription_updated(stripe_event):
         subscription.current_period_end = datetime.datetime.utcfromtimestamp(
             stripe_subscription["current_period_end"]
         )
-        subscription.save()
+        subscription.stripe_event_created = stripe_event.created
+        subscription.save(
+            update_fields=[
+                "status",
+                "current_period_start",
+                "current_period_end",
+                "stripe_event_created",
+                "modified",
+            ]
+        )
 
 
 def handle_invoice_created_or_updated(stripe_event):
@@ -376,6 +402,9 @@ def handle_invoice_created_or_updated(stripe_event):
                 stripe_invoice["subscription"],
             )
             return
+    else:
+        if is_stale_stripe_event(invoice, stripe_event):
+            return
 
     invoice.stripe_charge_id = stripe_invoice["charge"] or ""
     invoice.stripe_subscription_id = stripe_invoice["subscription"]
@@ -397,19 +426,44 @@ def handle_invoice_created_or_updated(stripe_event):
         if stripe_invoice["date"]
         else None
     )
+    invoice.stripe_event_created = stripe_event.created
     invoice.save()
 
-    for line in stripe_invoice["lines"]["data"]:
-        try:
-            invoice_item = InvoiceItem.objects.get(stripe_id=line["id"])
-        except InvoiceItem.DoesNotExist:
-            invoice_item = InvoiceItem(stripe_id=line["id"])
-            invoice_item.invoice = invoice
+    upsert_invoice_items(invoice, stripe_invoice["lines"]["data"])
+
+
+def upsert_invoice_items(invoice, lines):
+    """Creates or updates the invoice items of `lines` with a fixed number of queries."""
+    lines_by_stripe_id = {line["id"]: line for line in lines}
+    existing_items = {
+        invoice_item.stripe_id: invoice_item
+        for invoice_item in InvoiceItem.objects.filter(stripe_id__in=lines_by_stripe_id)
+    }
+
+    new_items = []
+    updated_items = []
+    for stripe_id, line in lines_by_stripe_id.items():
+        invoice_item = existing_items.get(stripe_id)
+        if invoice_item is None:
+            invoice_item = InvoiceItem(stripe_id=stripe_id, invoice=invoice)
+            new_items.append(invoice_item)
+        else:
+            updated_items.append(invoice_item)
 
         invoice_item.currency = line["currency"]
         invoice_item.amount = Decimal(line["amount"] / 100)
         invoice_item.description = line["description"] or ""
-        invoice_item.save()
+
+    InvoiceItem.objects.bulk_create(new_items)
+    InvoiceItem.objects.bulk_update(updated_items, ["currency", "amount", "description"])
+
+
+STRIPE_EVENT_HANDLERS = {
+    EventType.customer__subscription__deleted: handle_subscription_deleted,
+    EventType.customer__subscription__updated: handle_subscription_updated,
+    EventType.invoice__created: handle_invoice_created_or_updated,
+    EventType.invoice__updated: handle_invoice_created_or_updated,
+}
 
 
 class OptedInFacility(Facility):
@@ -1,10 +1,21 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from apps.base.outbox import enqueue
 from apps.subscriptions.models import Sponsor
+from djstripeevents.signals import event_received
+
+from .tasks import process_stripe_events
 
 
 @receiver(post_save, sender=Sponsor)
 def create_default_instance_for_facility(sender, instance, **kwargs):
     if instance.point is None:
         instance.geolocation
+
+
+@receiver(event_received)
+def handle_stripe_event_received(sender, event, **kwargs):
+    # Webhooks are applied by a queue consumer so stripe retries and bursts
+    # don't hold the webhook response. Published once the event is committed.
+    enqueue(process_stripe_events)
@@ -1,10 +1,16 @@
 import logging
+import traceback
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
 from celery import shared_task
 
-from .models import Subscription
+from djstripeevents.models import Event
+
+from .models import STRIPE_EVENT_HANDLERS, Subscription
 
 logger = logging.getLogger(__name__)
 
@@ -16,3 +22,87 @@ def mark_trials_as_past_due():
     ).exclude(current_period_end__gt=timezone.now()).update(
         status=Subscription.Status.trial_expired
     )
+
+
+class ProcessStripeEvents(object):
+    """
+    Drains the stripe events that haven't been processed yet.
+
+    Events are collapsed per stripe object so a burst of updates for the same
+    invoice or subscription is applied once, using the newest event. Events
+    locked by a concurrent run are skipped, they belong to that run.
+
+    Each event is applied in its own savepoint: an event that fails is logged
+    and its error kept on the event, which is left unprocessed. It is skipped
+    for the rest of the run, so it doesn't block the following events, and
+    retried by the next runs (and by the retries of stripe, which the webhook
+    ignores once the event is processed) until it fails
+    `STRIPE_EVENT_MAX_ATTEMPTS` times, when it is given up.
+    """
+
+    batch_size = 500
+
+    def __init__(self):
+        self.failed_pks = set()
+
+    def do(self):
+        while self.process_batch():
+            pass
+
+    def process_batch(self):
+        with transaction.atomic():
+            events = list(
+                Event.objects.select_for_update(skip_locked=True)
+                .filter(processed__isnull=True)
+                .exclude(pk__in=self.failed_pks)
+                .order_by("created", "id")[: self.batch_size]
+            )
+            if not events:
+                return 0
+
+            latest_events = {}
+            for event in events:
+                if event.type in STRIPE_EVENT_HANDLERS:
+                    latest_events[event.object_key] = event
+
+            failed = {}
+            for event in latest_events.values():
+                try:
+                    with transaction.atomic():
+                        STRIPE_EVENT_HANDLERS[event.type](event)
+                except Exception:
+                    logger.exception("stripe event %s failed", event.stripe_id)
+                    failed[event.pk] = traceback.format_exc()
+                    if event.attempts + 1 < settings.STRIPE_EVENT_MAX_ATTEMPTS:
+                        self.failed_pks.add(event.pk)
+                    else:
+                        logger.error(
+                            "stripe event %s failed %s times, giving up",
+                            event.stripe_id,
+                            event.attempts + 1,
+                        )
+
+            processed = timezone.now()
+            Event.objects.filter(pk__in=[event.pk for event in events]).exclude(
+                pk__in=self.failed_pks
+            ).update(processed=processed)
+            Event.objects.filter(pk__in=[event.pk for event in latest_events.values()]).update(
+                attempts=F("attempts") + 1
+            )
+            for pk, error in failed.items():
+                Event.objects.filter(pk=pk).update(error=error)
+
+        max_latency = max(processed - event.received for event in events)
+        logger.info(
+            "processed %s stripe events (%s applied, %s failed), max latency %ss",
+            len(events),
+            len(latest_events),
+            len(failed),
+            max_latency.total_seconds(),
+        )
+        return len(events)
+
+
+@shared_task
+def process_stripe_events():
+    ProcessStripeEvents().do()
@@ -0,0 +1,121 @@
+"""
+Set-based application of antirequisites.
+
+An antirequisite gives its task type to employees hired after its valid date
+that haven't completed the task type it is an antirequisite of. Applying it
+used to take a handful of queries per employee; `apply_antirequisites` works on
+any number of `(employee, antirequisite)` pairs in a fixed number of queries.
+"""
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Antirequisite, Employee, Task, TaskHistory, TaskHistoryStatus
+
+
+def get_antirequisite_employees(antirequisite):
+    """Returns the employees that have to take the task type of `antirequisite`."""
+    completed_employee_ids = (
+        TaskHistory.objects.filter(
+            status=TaskHistoryStatus.completed, type=antirequisite.antirequisite_of
+        )
+        .values_list("employee_id", flat=True)
+        .distinct()
+    )
+
+    return (
+        Employee.objects.filter(date_of_hire__gte=antirequisite.valid_after_hire_date)
+        .filter(trainings_task_set__type=antirequisite.antirequisite_of)
+        .exclude(pk__in=completed_employee_ids)
+    )
+
+
+def get_employee_antirequisites(employees):
+    """
+    Returns the `(employee, antirequisite)` pairs of the antirequisites that
+    apply to each of `employees`.
+    """
+    employees = list(employees)
+    if not employees:
+        return []
+
+    completed = set(
+        TaskHistory.objects.filter(
+            employee__in=employees, status=TaskHistoryStatus.completed
+        ).values_list("employee_id", "type_id")
+    )
+    antirequisites = list(Antirequisite.objects.order_by("pk"))
+    return [
+        (employee, antirequisite)
+        for employee in employees
+        for antirequisite in antirequisites
+        if antirequisite.valid_after_hire_date <= employee.date_of_hire
+        and (employee.pk, antirequisite.antirequisite_of_id) not in completed
+    ]
+
+
+def apply_antirequisites(pairs):
+    """
+    Creates or updates the task of every `(employee, antirequisite)` pair,
+    unless the employee already completed the one off task type of the
+    antirequisite after its valid date.
+    """
+    pairs = sorted(pairs, key=lambda pair: pair[1].pk)
+    if not pairs:
+        return
+
+    employee_ids = {employee.pk for employee, _ in pairs}
+    antirequisite_ids = {antirequisite.pk for _, antirequisite in pairs}
+    type_ids = {antirequisite.task_type_id for _, antirequisite in pairs}
+
+    one_offs = {
+        (employee_id, type_id): completion_date
+        for employee_id, type_id, completion_date in TaskHistory.objects.filter(
+            employee_id__in=employee_ids,
+            type_id__in=type_ids,
+            type__is_one_off=True,
+            status=TaskHistoryStatus.completed,
+        )
+        .values("employee_id", "type_id")
+        .annotate(completion_date=Max("completion_date"))
+        .values_list("employee_id", "type_id", "completion_date")
+    }
+
+    tasks_by_type, tasks_by_antirequisite = {}, {}
+    for task in Task.objects.filter(employee_id__in=employee_ids).filter(
+        Q(type_id__in=type_ids) | Q(antirequisite_id__in=antirequisite_ids)
+    ):
+        tasks_by_type[(task.employee_id, task.type_id)] = task
+        if task.antirequisite_id:
+            tasks_by_antirequisite[(task.employee_id, task.antirequisite_id)] = task
+
+    to_create, to_update = [], {}
+    for employee, antirequisite in pairs:
+        key = (employee.pk, antirequisite.task_type_id)
+        one_off_date = one_offs.get(key)
+        if one_off_date and one_off_date >= antirequisite.valid_after_hire_date:
+            continue
+
+        task = tasks_by_type.get(key)
+        if not task:
+            # The task type of the antirequisite changed.
+            task = tasks_by_antirequisite.get((employee.pk, antirequisite.pk))
+            if task:
+                tasks_by_type.pop((task.employee_id, task.type_id), None)
+                task.type_id = antirequisite.task_type_id
+                tasks_by_type[key] = task
+        if not task:
+            task = Task(
+                employee=employee, type_id=antirequisite.task_type_id, antirequisite=antirequisite
+            )
+            tasks_by_type[key] = task
+            to_create.append(task)
+
+        task.due_date = antirequisite.due_date or employee.date_of_hire
+        if task.pk:
+            to_update[task.pk] = task
+
+    now = timezone.now()
+    for task in to_update.values():
+        task.modified = now
+    Task.objects.bulk_update(to_update.values(), ["type", "due_date", "modified"])
+    Task.objects.bulk_create_missing(to_create)
@@ -0,0 +1,154 @@
+"""
+Batched versions of `Task.complete` and `Task.incomplete`.
+
+Finishing a training event completes the task of every attendee at once. Going
+through `Task.complete` for each of them runs a dozen queries per attendee;
+the functions here look up the facts of the task type once, create the
+histories in bulk and update the affected tasks in bulk.
+"""
+from datetime import datetime
+
+from django.utils import timezone
+
+from .due_dates import recompute_due_dates
+from .graph import get_task_type_graph
+from .models import Antirequisite, Task, TaskHistory, TaskHistoryStatus, TaskStatus, TaskType
+
+
+def as_date(value):
+    """Converts `value` to a date the way a `DateField` saving it would."""
+    return TaskHistory._meta.get_field("completion_date").to_python(value)
+
+
+def complete_tasks(task_type, tasks, completion_date, credit_hours=0):
+    """
+    Completes the `tasks` of `task_type` like `Task.complete` does for each of
+    them. Returns the created histories, in the order of the tasks.
+    """
+    tasks = list(tasks.select_related("employee"))
+    if not tasks:
+        return []
+
+    task_type = TaskType.objects.get(pk=task_type.pk)
+    if credit_hours and not task_type.is_continuing_education():
+        credit_hours = 0
+
+    histories = TaskHistory.objects.bulk_create(
+        TaskHistory(
+            employee=task.employee,
+            type=task_type,
+            status=TaskHistoryStatus.completed,
+            completion_date=completion_date,
+            expiration_date=completion_date + task_type.validity_period,
+            credit_hours=credit_hours,
+        )
+        for task in tasks
+    )
+
+    # Completing the task type before the hire date moves the task of its antirequisite.
+    compare_date = (
+        completion_date.date() if isinstance(completion_date, datetime) else completion_date
+    )
+    antirequisites = []
+    if any(compare_date < task.employee.date_of_hire for task in tasks):
+        antirequisites = list(
+            Antirequisite.objects.filter(antirequisite_of=task_type).order_by("pk")
+        )
+    employee_antirequisites = {}
+    for task in tasks:
+        if compare_date < task.employee.date_of_hire:
+            employee_antirequisites[task.employee_id] = next(
+                (
+                    antirequisite
+                    for antirequisite in antirequisites
+                    if antirequisite.valid_after_hire_date <= task.employee.date_of_hire
+                ),
+                None,
+            )
+
+    graph = get_task_type_graph()
+    employee_ids = [task.employee_id for task in tasks]
+    related_type_ids = set(graph.supersedes[task_type.pk]) | {
+        antirequisite.task_type_id for antirequisite in antirequisites
+    }
+    related_tasks = {}
+    for task in Task.objects.filter(employee_id__in=employee_ids, type_id__in=related_type_ids):
+        related_tasks[(task.employee_id, task.type_id)] = task
+
+    def get_related_tasks(task):
+        superseded = [
+            related_tasks[(task.employee_id, type_id)]
+            for type_id in graph.supersedes[task_type.pk]
+            if (task.employee_id, type_id) in related_tasks
+        ]
+        antirequisite = employee_antirequisites.get(task.employee_id)
+        antirequisite_task = antirequisite and related_tasks.get(
+            (task.employee_id, antirequisite.task_type_id)
+        )
+        return superseded, antirequisite_task
+
+    to_delete, to_update = set(), {}
+    if task_type.is_one_off:
+        for task in tasks:
+            superseded, antirequisite_task = get_related_tasks(task)
+            to_delete.add(task.pk)
+            to_delete.update(superseded_task.pk for superseded_task in superseded)
+            if antirequisite_task:
+                to_delete.add(antirequisite_task.pk)
+    else:
+        due_date = as_date(completion_date + task_type.validity_period)
+        for task in tasks:
+            superseded, antirequisite_task = get_related_tasks(task)
+            for superseded_task in superseded:
+                # If the task due date is greater than the parent due date
+                # then we shouldn't update because it will still be valid
+                # after the parent task expires.
+                if not superseded_task.due_date or superseded_task.due_date < due_date:
+                    superseded_task.due_date = due_date
+                superseded_task.status = TaskStatus.open
+                to_update[superseded_task.pk] = superseded_task
+
+            task.due_date = due_date
+            task.status = TaskStatus.open
+            to_update[task.pk] = task
+
+            if antirequisite_task:
+                antirequisite_task.due_date = due_date
+                to_update[antirequisite_task.pk] = antirequisite_task
+
+    now = timezone.now()
+    for task in to_update.values():
+        task.modified = now
+    Task.objects.bulk_update(to_update.values(), ["due_date", "status", "modified"])
+    Task.objects.filter(pk__in=to_delete).delete()
+
+    recompute_due_dates(
+        Task.objects.filter(
+            employee_id__in=employee_ids, type_id__in=graph.required_after_self[task_type.pk]
+        )
+    )
+    return histories
+
+
+def incomplete_tasks(task_type, tasks, completion_date):
+    """
+    Marks the `tasks` of `task_type` incomplete like `Task.incomplete` does for
+    each of them. Returns the created histories, in the order of the tasks.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return []
+
+    histories = TaskHistory.objects.bulk_create(
+        TaskHistory(
+            employee_id=task.employee_id,
+            type=task_type,
+            status=TaskHistoryStatus.incomplete,
+            completion_date=completion_date,
+        )
+        for task in tasks
+    )
+    Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+        status=TaskStatus.open, modified=timezone.now()
+    )
+    return histories
@@ -0,0 +1,180 @@
+"""
+Set-based versions of `Task.recompute_due_date`.
+
+`Task.recompute_due_date` runs a handful of queries per task, which adds up
+when thousands of tasks are touched at once (capacity changes, new task types,
+training events...). The functions here load everything the recomputation
+needs for a batch of tasks up front and write the results back in bulk.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.utils import timezone
+
+from .graph import get_task_type_graph
+from .models import Employee, GlobalRequirement, Task, TaskHistory, TaskType
+
+
+def get_required_pairs(employees, task_types):
+    """
+    Returns the `(employee_id, task_type_id)` pairs of `task_types` required by
+    `employees`, following the rules of `Employee.get_required_tasktypes`.
+    """
+    employees = list(employees)
+    task_types = list(task_types)
+    if not employees or not task_types:
+        return set()
+
+    responsibilities = defaultdict(set)
+    for employee_id, responsibility_id in Employee.other_responsibilities.through.objects.filter(
+        employee__in=employees
+    ).values_list("employee_id", "responsibility_id"):
+        responsibilities[employee_id].add(responsibility_id)
+
+    required_for = defaultdict(set)
+    for task_type_id, responsibility_id in TaskType.required_for.through.objects.filter(
+        tasktype__in=task_types
+    ).values_list("tasktype_id", "responsibility_id"):
+        required_for[task_type_id].add(responsibility_id)
+
+    global_type_ids = set(
+        GlobalRequirement.objects.filter(task_type__in=task_types).values_list(
+            "task_type_id", flat=True
+        )
+    )
+
+    pairs = set()
+    for employee in employees:
+        for task_type in task_types:
+            if task_type.facility_id not in (None, employee.facility_id):
+                continue
+            if task_type.pk in global_type_ids or (
+                required_for[task_type.pk] & responsibilities[employee.pk]
+            ):
+                pairs.add((employee.pk, task_type.pk))
+    return pairs
+
+
+def latest_history(histories):
+    """
+    Returns the history `Task.recompute_due_date` would pick, that is the first
+    one ordered by `-type__is_one_off, -expiration_date` (nulls first).
+    """
+    if not histories:
+        return None
+    return max(
+        histories,
+        key=lambda history: (
+            history.type.is_one_off,
+            history.expiration_date is None,
+            history.expiration_date or date.min,
+        ),
+    )
+
+
+def recompute_due_dates(tasks):
+    """
+    Recomputes the due date of every task in the `tasks` queryset like
+    `Task.recompute_due_date` does, in a fixed number of queries.
+
+    Tasks that are no longer required, out of the facility's capacity or
+    completed for good (one off) are deleted. Returns the updated tasks.
+    """
+    tasks = list(tasks.select_related("employee__facility", "type__required_after_task_type"))
+    if not tasks:
+        return []
+
+    employees = {task.employee_id: task.employee for task in tasks}
+    task_types = {task.type_id: task.type for task in tasks}
+    required = get_required_pairs(employees.values(), task_types.values())
+
+    to_delete, to_update = [], []
+    for task in tasks:
+        if (task.employee_id, task.type_id) not in required or not task.type.check_capacity(
+            task.employee
+        ):
+            to_delete.append(task.pk)
+        else:
+            to_update.append(task)
+
+    # Migrate task histories in case the rules changed.
+    employee_ids_by_type = defaultdict(set)
+    for task in to_update:
+        employee_ids_by_type[task.type_id].add(task.employee_id)
+    for type_id, employee_ids in employee_ids_by_type.items():
+        task_type = task_types[type_id]
+        TaskHistory.objects.filter(employee_id__in=employee_ids, type__name=task_type.name).exclude(
+            type=task_type
+        ).update(type=task_type, modified=timezone.now())
+
+    superseded_by = get_task_type_graph().superseded_by
+    history_type_ids = set(task_types)
+    for type_id in task_types:
+        history_type_ids.update(superseded_by[type_id])
+    history_type_ids |= {
+        task_type.required_after_task_type_id
+        for task_type in task_types.values()
+        if task_type.required_after_task_type_id
+    }
+
+    histories = defaultdict(list)
+    for history in TaskHistory.objects.filter(
+        employee_id__in={task.employee_id for task in to_update}, type_id__in=history_type_ids
+    ).select_related("type"):
+        histories[(history.employee_id, history.type_id)].append(history)
+
+    now = timezone.now()
+    updated = []
+    for task in to_update:
+        task_type = task.type
+        type_ids = superseded_by[task.type_id] + (task.type_id,)
+        latest = latest_history(
+            [h for type_id in type_ids for h in histories[(task.employee_id, type_id)]]
+        )
+
+        if latest and latest.type.is_one_off:
+            to_delete.append(task.pk)
+            continue
+
+        if latest:
+            task.due_date = latest.completion_date + latest.type.validity_period
+        elif task_type.required_after_task_type_id:
+            required_after_latest = latest_history(
+                histories[(task.employee_id, task_type.required_after_task_type_id)]
+            )
+            if required_after_latest:
+                task.due_date = required_after_latest.completion_date + task_type.required_within
+            else:
+                task.due_date = None
+        else:
+            task.due_date = task.employee.date_of_hire + task_type.required_within
+        task.modified = now
+        updated.append(task)
+
+    if to_delete:
+        Task.objects.filter(pk__in=to_delete).delete()
+    Task.objects.bulk_update(updated, ["due_date", "modified"])
+    return updated
+
+
+def create_tasks(pairs):
+    """
+    Creates the tasks of the `(employee_id, task_type_id)` pairs that don't
+    exist yet and returns them, with those another transaction created
+    meanwhile. Their due dates still have to be computed.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return []
+
+    employee_ids = {employee_id for employee_id, _ in pairs}
+    type_ids = {type_id for _, type_id in pairs}
+    existing = set(
+        Task.objects.filter(employee_id__in=employee_ids, type_id__in=type_ids).values_list(
+            "employee_id", "type_id"
+        )
+    )
+    return Task.objects.bulk_create_missing(
+        Task(employee_id=employee_id, type_id=type_id)
+        for employee_id, type_id in sorted(pairs - existing)
+    )
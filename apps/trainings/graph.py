@@ -0,0 +1,133 @@
+"""
+In-memory graph of the relations between task types.
+
+Prerequisites, supersedes and required after relations are read on many hot
+paths (completing a task, recomputing due dates, listing the task types an
+employee is allowed to take...). Instead of querying them every time, they are
+loaded once per process into an immutable `TaskTypeGraph`, keyed by task type
+id.
+
+The graph is rebuilt when its version changes. The version is a random token
+in the single row of `TaskTypeGraphVersion`, replaced by the task type signals
+of every process (web and worker). It is read at most once per request or
+task (see `recheck_task_type_graph`), and again after a change made by this
+thread.
+"""
+import threading
+import uuid
+from types import MappingProxyType
+
+from .models import TaskType, TaskTypeGraphVersion
+
+_graph = None
+# Whether the current request or task of the thread has read the version.
+_local = threading.local()
+
+
+def _freeze(adjacency):
+    return MappingProxyType({pk: tuple(sorted(ids)) for pk, ids in adjacency.items()})
+
+
+class TaskTypeGraph(object):
+    def __init__(self, version, task_types, prerequisites, supersedes):
+        """
+        `task_types` are `(id, required_after_task_type_id, is_one_off)` tuples,
+        `prerequisites` and `supersedes` `(from_id, to_id)` pairs.
+        """
+        task_types = list(task_types)
+        self.version = version
+        self.ids = tuple(sorted(pk for pk, _, _ in task_types))
+        self.one_off_ids = frozenset(pk for pk, _, is_one_off in task_types if is_one_off)
+        self.required_after = MappingProxyType(
+            {pk: required_after_id for pk, required_after_id, _ in task_types}
+        )
+
+        adjacency = {
+            name: {pk: set() for pk in self.ids}
+            for name in ("prerequisites", "supersedes", "superseded_by", "required_after_self")
+        }
+        for from_id, to_id in prerequisites:
+            adjacency["prerequisites"][from_id].add(to_id)
+        for from_id, to_id in supersedes:
+            adjacency["supersedes"][from_id].add(to_id)
+            adjacency["superseded_by"][to_id].add(from_id)
+        for pk, required_after_id in self.required_after.items():
+            if required_after_id:
+                adjacency["required_after_self"][required_after_id].add(pk)
+
+        self.prerequisites = _freeze(adjacency["prerequisites"])
+        self.supersedes = _freeze(adjacency["supersedes"])
+        self.superseded_by = _freeze(adjacency["superseded_by"])
+        self.required_after_self = _freeze(adjacency["required_after_self"])
+
+    def allowed_by_prerequisites(self, completed_ids):
+        """Returns the ids of the task types whose prerequisites are all in `completed_ids`."""
+        completed_ids = set(completed_ids)
+        return [
+            pk
+            for pk in self.ids
+            if all(
+                prerequisite in completed_ids or prerequisite == pk
+                for prerequisite in self.prerequisites[pk]
+            )
+        ]
+
+    def with_prerequisites(self, pk):
+        """
+        Returns the id of the task type and of all its prerequisites, direct or
+        not. Circular prerequisites are visited once.
+        """
+        visited, pending = set(), [pk]
+        while pending:
+            current = pending.pop()
+            if current not in visited:
+                visited.add(current)
+                pending.extend(self.prerequisites.get(current, ()))
+        return visited
+
+
+def get_version():
+    return TaskTypeGraphVersion.objects.values_list("version", flat=True).first()
+
+
+def build_task_type_graph(version=None):
+    return TaskTypeGraph(
+        version=version,
+        task_types=TaskType.objects.values_list("pk", "required_after_task_type_id", "is_one_off"),
+        prerequisites=TaskType.prerequisites.through.objects.values_list(
+            "from_tasktype_id", "to_tasktype_id"
+        ),
+        supersedes=TaskType.supersedes.through.objects.values_list(
+            "from_tasktype_id", "to_tasktype_id"
+        ),
+    )
+
+
+def get_task_type_graph():
+    """Returns the graph of the task types, rebuilding it if it is out of date."""
+    global _graph
+
+    graph = _graph
+    if graph is None or not getattr(_local, "checked", False):
+        version = get_version()
+        _local.checked = True
+        if graph is None or graph.version != version:
+            graph = _graph = build_task_type_graph(version)
+    return graph
+
+
+def recheck_task_type_graph():
+    """Makes the next access to the graph read its version again."""
+    _local.checked = False
+
+
+def invalidate_task_type_graph():
+    """
+    Marks the graph as out of date, in every process. Call it after changing
+    task types or their relations without sending signals (`update()`,
+    `bulk_create()`...).
+    """
+    version = uuid.uuid4()
+    if not TaskTypeGraphVersion.objects.update(version=version):
+        TaskTypeGraphVersion.objects.create(version=version)
+    recheck_task_type_graph()
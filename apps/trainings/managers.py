@@ -11,7 +11,7 @@ class EmployeeManager(models.Manager):
 
 class EmployeeQuerySet(models.QuerySet):
     def delete(self):
-        self.update(is_active=False)
+        self.update(is_active=False, modified=timezone.now())
 
 
 class TaskManager(models.Manager):
@@ -21,6 +21,32 @@ class TaskManager(models.Manager):
     def bulk_create(*args, **kwargs):
         raise RuntimeError("Bulk creation is not allowed.")
 
+    def bulk_create_missing(self, tasks):
+        """
+        Creates the tasks whose employee doesn't have a task of their type yet
+        and returns the tasks of all the `tasks` employees and types, fetched
+        again with their ids.
+
+        `bulk_create()` is forbidden because it skips the merge of the
+        duplicates of the `pre_save` signal (`task_no_duplicates_created`).
+        Here the duplicates are skipped by the database instead, thanks to the
+        unique employee and type, even when another transaction creates the
+        same task concurrently; the existing tasks are left unchanged.
+        """
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        self.get_queryset().bulk_create(tasks, batch_size=500, ignore_conflicts=True)
+        pairs = {(task.employee_id, task.type_id) for task in tasks}
+        return [
+            task
+            for task in self.get_queryset().filter(
+                employee_id__in={employee_id for employee_id, _ in pairs},
+                type_id__in={type_id for _, type_id in pairs},
+            )
+            if (task.employee_id, task.type_id) in pairs
+        ]
+
 
 class TaskQuerySet(models.QuerySet):
     def outstanding(self):
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.19 on 2026-10-19 18:35
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are built without locking the tables against writes, which
+    # can't be done in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("trainings", "0164_auto_20230206_1259"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="employee",
+            index=models.Index(
+                fields=["facility", "is_active"], name="trainings_emp_facility_active"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("is_optional", False)),
+                fields=["due_date"],
+                name="trainings_task_required_due",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="taskhistory",
+            index=models.Index(
+                fields=["employee", "status", "type", "completion_date"],
+                name="trainings_th_emp_status_type",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="taskhistory",
+            index=models.Index(
+                fields=["employee", "type", "-expiration_date"],
+                name="trainings_th_emp_type_expires",
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trainings", "0165_task_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("task", "Task"),
+                            ("task_history", "Task history"),
+                            ("employee_course", "Employee course"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("deleted", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="trainings.employee",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["employee", "deleted"], name="trainings_t_employe_8dbb1a_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:28
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def compute_scoring(apps, schema_editor):
+    # Same as `apps.trainings.scoring.compute_course_scoring`, for all the courses.
+    Course = apps.get_model("trainings", "Course")
+    CourseItemBoolean = apps.get_model("trainings", "CourseItemBoolean")
+    CourseItemMultiChoice = apps.get_model("trainings", "CourseItemMultiChoice")
+
+    max_points = Counter()
+    answer_keys = {}
+    for course_id, item_id, answer in (
+        CourseItemBoolean.objects.filter(item__isnull=False)
+        .order_by("item", "order", "pk")
+        .values_list("item__course", "item", "answer")
+    ):
+        max_points[course_id] += 1
+        answer_keys.setdefault(course_id, {}).setdefault(str(item_id), answer)
+
+    choices = {}
+    for course_id, item_id, choice_id in (
+        CourseItemMultiChoice.objects.filter(item__isnull=False)
+        .order_by("item", "order", "pk")
+        .values_list("item__course", "item", "pk")
+    ):
+        max_points[course_id] += 1
+        if str(item_id) not in answer_keys.get(course_id, {}):
+            choices.setdefault((course_id, str(item_id)), choice_id)
+
+    answers = {}
+    for choice_id, option_id in (
+        CourseItemMultiChoice.answers.through.objects.filter(
+            courseitemmultichoice__in=choices.values()
+        )
+        .order_by("courseitemmultichoice", "multichoiceoption")
+        .values_list("courseitemmultichoice", "multichoiceoption")
+    ):
+        answers.setdefault(choice_id, option_id)
+    for (course_id, item_id), choice_id in choices.items():
+        answer_keys.setdefault(course_id, {})[item_id] = answers.get(choice_id)
+
+    for course_id, answer_key in answer_keys.items():
+        Course.objects.filter(pk=course_id).update(
+            max_points=max_points[course_id],
+            scorable_items=len(answer_key),
+            answer_key=answer_key,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trainings", "0166_tombstone"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="answer_key",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="max_points",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="scorable_items",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_scoring, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trainings", "0167_course_scoring"),
+    ]
+
+    operations = [
+        # The duplicates are progress of the employees: keep the most complete
+        # row of each employee and item, the latest completed one, else the
+        # latest modified one. Deleted rows can't be restored.
+        migrations.RunSQL(
+            """
+            DELETE FROM trainings_employeecourseitem
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT
+                        id,
+                        row_number() OVER (
+                            PARTITION BY employee_id, course_item_id
+                            ORDER BY completed_at DESC NULLS LAST, modified DESC, id DESC
+                        ) AS rank
+                    FROM trainings_employeecourseitem
+                ) ranked
+                WHERE rank > 1
+            )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name="employeecourseitem",
+            unique_together={("employee", "course_item")},
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TRIGGERS = [
+    ("trainings_task", "trainings_record_tombstones", "task"),
+    ("trainings_taskhistory", "trainings_record_tombstones", "task_history"),
+    ("trainings_employeecourse", "trainings_record_tombstones", "employee_course"),
+    ("trainings_course", "trainings_record_course_tombstones", "course"),
+]
+
+# Statement-level triggers: one insert per DELETE, whatever the number of rows.
+CREATE_FUNCTIONS = """
+CREATE FUNCTION trainings_record_tombstones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO trainings_tombstone (kind, object_id, employee_id, deleted)
+    SELECT TG_ARGV[0], id, employee_id, clock_timestamp() FROM deleted_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION trainings_record_course_tombstones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO trainings_tombstone (kind, object_id, employee_id, deleted)
+    SELECT TG_ARGV[0], id, NULL, clock_timestamp() FROM deleted_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTIONS = """
+DROP FUNCTION trainings_record_tombstones();
+DROP FUNCTION trainings_record_course_tombstones();
+"""
+
+CREATE_TRIGGER = """
+CREATE TRIGGER {table}_tombstones AFTER DELETE ON {table}
+REFERENCING OLD TABLE AS deleted_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE {function}('{kind}');
+"""
+
+DROP_TRIGGER = "DROP TRIGGER {table}_tombstones ON {table};"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trainings", "0168_employeecourseitem_unique"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tombstone",
+            name="employee",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="trainings.employee",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tombstone",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("task", "Task"),
+                    ("task_history", "Task history"),
+                    ("employee_course", "Employee course"),
+                    ("course", "Course"),
+                ],
+                max_length=32,
+            ),
+        ),
+        migrations.RunSQL(CREATE_FUNCTIONS, DROP_FUNCTIONS),
+    ] + [
+        migrations.RunSQL(
+            CREATE_TRIGGER.format(table=table, function=function, kind=kind),
+            DROP_TRIGGER.format(table=table),
+        )
+        for table, function, kind in TRIGGERS
+    ]
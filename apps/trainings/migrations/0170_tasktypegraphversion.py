@@ -0,0 +1,27 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:47
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trainings", "0169_tombstone_triggers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskTypeGraphVersion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("version", models.UUIDField(default=uuid.uuid4)),
+            ],
+        ),
+    ]
@@ -8,7 +8,7 @@ from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
 from django.template.defaultfilters import slugify
-from django.utils.timezone import localtime
+from django.utils.timezone import localtime, now
 
 from autoslug import AutoSlugField
 from localflavor.us.models import USSocialSecurityNumberField, USStateField, USZipCodeField
@@ -252,6 +252,13 @@ class Employee(TimeStampedModel):
 
     objects = EmployeeManager()
 
+    class Meta:
+        indexes = [
+            # The compliance jobs and the employee lists only look at the
+            # active staff of one facility.
+            models.Index(fields=["facility", "is_active"], name="trainings_emp_facility_active"),
+        ]
+
     def __init__(self, *args, **kwargs):
         super(Employee, self).__init__(*args, **kwargs)
         self._orig_date_of_hire = self.date_of_hire
@@ -283,30 +290,19 @@ class Employee(TimeStampedModel):
         uid = uuid.uuid4()
         self.invite_code = uid.hex[:6].upper()
 
-    def get_tasktypes_allowed_by_prerequisites(self):
-        # put the ids of completed tasks in a map
-        completed_tasks_map = {}
-        completed_task_queryset = TaskHistory.objects.filter(
+    def get_tasktypes_allowed_by_prerequisites(self, queryset=None):
+        from .graph import get_task_type_graph
+
+        completed_ids = TaskHistory.objects.filter(
             employee_id=self.id, status=TaskHistoryStatus.completed
-        )
-        for completed_task in completed_task_queryset:
-            completed_tasks_map[completed_task.type.id] = True
-
-        # define function to filter a task list and a training list
-
-        def check_prerequisites(tasktype):
-            # if a task is not found in the completed task map then it fails
-            # the prerequisite check
-            for prereq in tasktype.prerequisites.all():
-                if prereq.id == tasktype.id:
-                    continue
-                if not completed_tasks_map.get(prereq.id):
-                    return False
-            return True
+        ).values_list("type_id", flat=True)
+        allowed_ids = get_task_type_graph().allowed_by_prerequisites(completed_ids)
 
         # users that are selecting a task to complete only see a filtered list
         # of tasks or trainings
-        return list(filter(check_prerequisites, TaskType.objects.all()))
+        if queryset is None:
+            queryset = TaskType.objects.all()
+        return list(queryset.filter(pk__in=allowed_ids))
 
     def get_required_tasktypes(self):
         return TaskType.objects.filter(
@@ -382,19 +378,21 @@ class TaskType(TimeStampedModel):
     external_training_required = models.BooleanField(default=False)
     external_training_url = models.URLField(blank=True)
 
-    def __init__(self, *args, **kwargs):
-        super(TaskType, self).__init__(*args, **kwargs)
-        self.initial_min_capacity = self.min_capacity
-        self.initial_max_capacity = self.max_capacity
+    # Fields the due dates (and existence) of the tasks of this type depend on.
+    tracker = FieldTracker(
+        fields=[
+            "validity_period",
+            "required_within",
+            "required_after_task_type",
+            "min_capacity",
+            "max_capacity",
+            "is_one_off",
+        ]
+    )
 
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        super(TaskType, self).save(*args, **kwargs)
-        for task in self.task_set.all():
-            task.save()
-
     def is_global_requirement(self):
         return hasattr(self, "globalrequirement")
 
@@ -403,10 +401,13 @@ class TaskType(TimeStampedModel):
 
     def check_capacity(self, employee):
         """Returns whether the task type should apply to the employee based on capacity"""
+        return self.check_facility_capacity(employee.facility.capacity)
+
+    def check_facility_capacity(self, capacity):
+        """Returns whether the task type should apply to a facility of the given capacity"""
         if self.min_capacity == 0 and self.max_capacity == 0:
             return True
 
-        capacity = employee.facility.capacity
         if capacity == 0:
             return False
 
@@ -487,28 +488,49 @@ class TaskHistory(TaskBase):
     status = models.SmallIntegerField(choices=TaskHistoryStatus)
     credit_hours = models.FloatField(blank=True, default=0)
 
+    class Meta:
+        indexes = [
+            # Completed trainings of an employee, optionally per type and by date.
+            models.Index(
+                fields=["employee", "status", "type", "completion_date"],
+                name="trainings_th_emp_status_type",
+            ),
+            # Latest history of a type, used by `Task.recompute_due_date`.
+            models.Index(
+                fields=["employee", "type", "-expiration_date"],
+                name="trainings_th_emp_type_expires",
+            ),
+        ]
+
     def delete(self, *args, **kwargs):
+        from .graph import get_task_type_graph
+
         super(TaskHistory, self).delete(*args, **kwargs)
 
         related_task, _ = Task.objects.get_or_create(employee=self.employee, type=self.type)
         related_task.recompute_due_date()
 
-        superseded_types = self.type.supersedes.all()
-        superseded_one_off_types = superseded_types.filter(is_one_off=True)
-        superseded_repeat_types = superseded_types.filter(is_one_off=False)
+        graph = get_task_type_graph()
+        superseded_type_ids = graph.supersedes[self.type_id]
+        superseded_one_off_type_ids = [
+            type_id for type_id in superseded_type_ids if type_id in graph.one_off_ids
+        ]
+        superseded_repeat_type_ids = [
+            type_id for type_id in superseded_type_ids if type_id not in graph.one_off_ids
+        ]
 
         superseded_tasks = Task.objects.filter(
-            employee=self.employee, type__in=superseded_repeat_types
+            employee=self.employee, type_id__in=superseded_repeat_type_ids
         )
         for task in superseded_tasks:
             task.recompute_due_date()
 
-        for type in superseded_one_off_types:
-            task = Task.objects.create(employee=self.employee, type=type)
+        for type_id in superseded_one_off_type_ids:
+            task = Task.objects.create(employee=self.employee, type_id=type_id)
             task.recompute_due_date()
 
         required_after_self_tasks = Task.objects.filter(
-            employee=self.employee, type__in=self.type.required_after_self.all()
+            employee=self.employee, type_id__in=graph.required_after_self[self.type_id]
         )
         for task in required_after_self_tasks:
             task.recompute_due_date()
@@ -550,6 +572,14 @@ class Task(TaskBase):
 
     class Meta:
         unique_together = (("employee", "type"),)
+        indexes = [
+            # Overdue / expiring required tasks, see the compliance emails.
+            models.Index(
+                fields=["due_date"],
+                condition=Q(is_optional=False),
+                name="trainings_task_required_due",
+            ),
+        ]
 
     def __str__(self):
         return self.type.name
@@ -567,6 +597,8 @@ class Task(TaskBase):
             return None
 
     def complete(self, completion_date, credit_hours=0):
+        from .graph import get_task_type_graph
+
         if credit_hours and not self.type.is_continuing_education():
             credit_hours = 0
         self.type.refresh_from_db()
@@ -579,8 +611,9 @@ class Task(TaskBase):
             credit_hours=credit_hours,
         )
 
+        graph = get_task_type_graph()
         supersedes = Task.objects.filter(
-            employee=self.employee, type__in=self.type.supersedes.all()
+            employee=self.employee, type_id__in=graph.supersedes[self.type_id]
         )
 
         compare_date = (
@@ -630,7 +663,7 @@ class Task(TaskBase):
                     t.save()
 
         for task in Task.objects.filter(
-            employee=self.employee, type__in=self.type.required_after_self.all()
+            employee=self.employee, type_id__in=graph.required_after_self[self.type_id]
         ):
             task.recompute_due_date()
 
@@ -650,6 +683,8 @@ class Task(TaskBase):
         return th
 
     def recompute_due_date(self):
+        from .graph import get_task_type_graph
+
         if not self.employee.get_required_tasktypes().filter(id=self.type.id).exists():
             self.delete()
             return
@@ -660,11 +695,11 @@ class Task(TaskBase):
         else:
             # Migrate task histories in case the rules changed
             TaskHistory.objects.filter(employee=self.employee, type__name=self.type.name).update(
-                type=self.type
+                type=self.type, modified=now()
             )
 
-        type_ids = list(self.type.superseded_by.values_list("id", flat=True))
-        type_ids.append(self.type)
+        type_ids = list(get_task_type_graph().superseded_by[self.type_id])
+        type_ids.append(self.type_id)
         latest_history = (
             TaskHistory.objects.filter(employee=self.employee, type__in=type_ids)
             .order_by("-type__is_one_off", "-expiration_date")
@@ -723,17 +758,23 @@ class TrainingEvent(TimeStampedModel):
 
     def finish(self, incomplete_attendee_ids=[], credit_hours=0):
         """Complete the task for the attendees."""
+        from .completion import complete_tasks, incomplete_tasks
+
         completion_date = self.end_time
 
-        for task in Task.objects.filter(type=self.training_for, employee__in=self.attendees.all()):
-            if task.employee_id in incomplete_attendee_ids:
-                task.incomplete(completion_date)
-            else:
-                if self.training_for.is_continuing_education():
-                    if not credit_hours:
-                        duration = self.end_time - self.start_time
-                        credit_hours = duration.total_seconds() / 60 / 60
-                task.complete(completion_date, credit_hours)
+        tasks = Task.objects.filter(type=self.training_for, employee__in=self.attendees.all())
+        incomplete_tasks(
+            self.training_for,
+            tasks.filter(employee_id__in=incomplete_attendee_ids),
+            completion_date,
+        )
+
+        completed_tasks = tasks.exclude(employee_id__in=incomplete_attendee_ids)
+        if not credit_hours and self.training_for.is_continuing_education():
+            duration = self.end_time - self.start_time
+            credit_hours = duration.total_seconds() / 60 / 60
+        complete_tasks(self.training_for, completed_tasks, completion_date, credit_hours)
+
         self.completed = True
         self.save()
 
@@ -770,6 +811,10 @@ class Course(TimeStampedModel):
     language = models.SmallIntegerField(choices=Languages, default=Languages.english)
     statement_required = models.BooleanField(default=False)
     trainer = models.ForeignKey("Trainer", blank=True, null=True, on_delete=models.CASCADE)
+    # Maintained by the signals of the items, see `apps.trainings.scoring`.
+    max_points = models.PositiveIntegerField(default=0, editable=False)
+    scorable_items = models.PositiveIntegerField(default=0, editable=False)
+    answer_key = models.JSONField(default=dict, editable=False)
 
     def __str__(self):
         return self.name
@@ -848,10 +893,50 @@ class EmployeeCourseItem(TimeStampedModel):
     completed_at = models.DateTimeField(null=True)
     is_correct = models.BooleanField(default=False)
 
+    class Meta:
+        unique_together = (("employee", "course_item"),)
+
     def __str__(self):
         return self.course_item.title
 
 
+class Tombstone(models.Model):
+    """
+    A deleted task, task history, employee course or course, for the delta sync
+    of the mobile app. Kept `SYNC_TOMBSTONE_RETENTION`.
+
+    The tombstones are inserted by database triggers (see migration
+    `0169_tombstone_triggers`), once per `DELETE` statement, so that the
+    queryset deletes and the cascades stay set-based.
+    """
+
+    Kind = Choices(
+        ("task", "Task"),
+        ("task_history", "Task history"),
+        ("employee_course", "Employee course"),
+        ("course", "Course"),
+    )
+
+    kind = models.CharField(max_length=32, choices=Kind)
+    object_id = models.PositiveIntegerField()
+    # No constraint: the tombstones of a deleted employee are created while
+    # the employee is deleted. Null for the courses, deleted for everyone.
+    employee = models.ForeignKey(
+        Employee,
+        related_name="+",
+        db_constraint=False,
+        null=True,
+        on_delete=models.DO_NOTHING,
+    )
+    deleted = models.DateTimeField(default=now, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["employee", "deleted"])]
+
+    def __str__(self):
+        return "{} {}".format(self.kind, self.object_id)
+
+
 class CourseItemText(TimeStampedModel):
     item = models.ForeignKey(CourseItem, null=True, related_name="texts", on_delete=models.CASCADE)
     question = models.TextField()
@@ -1063,3 +1148,15 @@ class FacilityQuestionState(TimeStampedModel):
 class SponsorState(TimeStampedModel):
     state = models.ForeignKey("alfdirectory.State", on_delete=models.CASCADE)
     sponsor = models.ForeignKey("subscriptions.Sponsor", on_delete=models.CASCADE)
+
+
+class TaskTypeGraphVersion(models.Model):
+    """
+    The version of the graph of the task types (see `apps.trainings.graph`),
+    a single row.
+    """
+
+    version = models.UUIDField(default=uuid.uuid4)
+
+    def __str__(self):
+        return str(self.version)
@@ -0,0 +1,84 @@
+"""
+Loaders for the trainings pdf reports.
+
+Each loader fetches everything its template needs in bulk and returns plain
+rows, so rendering a report runs a fixed number of queries no matter how many
+employees or tasks it lists.
+"""
+from collections import namedtuple
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import TaskHistoryCertificatePage, TaskStatus, TrainingEvent
+
+EmployeeRow = namedtuple("EmployeeRow", "employee positions")
+TaskRow = namedtuple("TaskRow", "task scheduled_event status_name")
+TaskHistoryRow = namedtuple("TaskHistoryRow", "history certificate first_page")
+
+
+def order_by_ids(objects, ids, key=lambda obj: obj.pk):
+    """Sorts `objects` in the order their primary keys appear in `ids`."""
+    positions = {pk: position for position, pk in enumerate(ids)}
+    return sorted(objects, key=lambda obj: positions[key(obj)])
+
+
+def task_status_name(task, scheduled_event):
+    if task.status == TaskStatus.open:
+        if task.type.is_training:
+            return "Awaiting Certificate"
+        return "Awaiting Documentation"
+    elif task.status == TaskStatus.scheduled:
+        if scheduled_event:
+            if (scheduled_event.start_time - timezone.now()).days < 0:
+                if task.type.is_training:
+                    return "Awaiting Certificate"
+                return "Awaiting Documentation"
+    return task.get_status_display()
+
+
+def load_employee_rows(employees):
+    employees = employees.prefetch_related("positions")
+    return [
+        EmployeeRow(employee=employee, positions=", ".join(map(str, employee.positions.all())))
+        for employee in employees
+    ]
+
+
+def load_task_rows(tasks):
+    tasks = tasks.select_related("employee", "type").prefetch_related(
+        Prefetch(
+            "training_events",
+            queryset=TrainingEvent.objects.order_by("start_time"),
+            to_attr="scheduled_events",
+        )
+    )
+    rows = []
+    for task in tasks:
+        scheduled_event = task.scheduled_events[0] if task.scheduled_events else None
+        rows.append(
+            TaskRow(
+                task=task,
+                scheduled_event=scheduled_event,
+                status_name=task_status_name(task, scheduled_event),
+            )
+        )
+    return rows
+
+
+def load_task_history_rows(histories):
+    histories = histories.select_related("type", "certificate").prefetch_related(
+        Prefetch(
+            "certificate__pages",
+            queryset=TaskHistoryCertificatePage.objects.order_by("pk"),
+            to_attr="ordered_pages",
+        )
+    )
+    rows = []
+    for history in histories:
+        certificate = getattr(history, "certificate", None)
+        first_page = None
+        if certificate and certificate.ordered_pages:
+            first_page = certificate.ordered_pages[0]
+        rows.append(TaskHistoryRow(history=history, certificate=certificate, first_page=first_page))
+    return rows
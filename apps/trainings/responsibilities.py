@@ -0,0 +1,141 @@
+"""
+Set-based versions of `employee.other_responsibilities.add/remove`.
+
+Adding or removing a responsibility one employee at a time fires the whole
+`employee_other_responsibilities_changed` cascade for every call. The functions
+here take `(employee_id, responsibility_id)` pairs, write the through table in
+bulk and reconcile the tasks of all the affected employees at once.
+"""
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .antirequisites import apply_antirequisites, get_employee_antirequisites
+from .due_dates import create_tasks, get_required_pairs, recompute_due_dates
+from .models import Antirequisite, Employee, GlobalRequirement, Task, TaskType
+
+EmployeeResponsibility = Employee.other_responsibilities.through
+
+
+def _existing_pairs(pairs):
+    employee_ids = {employee_id for employee_id, _ in pairs}
+    responsibility_ids = {responsibility_id for _, responsibility_id in pairs}
+    return {
+        (employee_id, responsibility_id): pk
+        for pk, employee_id, responsibility_id in EmployeeResponsibility.objects.filter(
+            employee_id__in=employee_ids, responsibility_id__in=responsibility_ids
+        ).values_list("pk", "employee_id", "responsibility_id")
+        if (employee_id, responsibility_id) in pairs
+    }
+
+
+def _types_required_for(responsibility_ids):
+    types = defaultdict(set)
+    for type_id, responsibility_id in TaskType.required_for.through.objects.filter(
+        responsibility_id__in=responsibility_ids
+    ).values_list("tasktype_id", "responsibility_id"):
+        types[responsibility_id].add(type_id)
+    return types
+
+
+def add_responsibilities(pairs):
+    """
+    Adds the responsibilities of the `(employee_id, responsibility_id)` pairs
+    the employees don't have yet, then creates and recomputes the tasks those
+    responsibilities require.
+    """
+    pairs = set(pairs) - set(_existing_pairs(set(pairs)))
+    if not pairs:
+        return
+
+    EmployeeResponsibility.objects.bulk_create(
+        EmployeeResponsibility(employee_id=employee_id, responsibility_id=responsibility_id)
+        for employee_id, responsibility_id in sorted(pairs)
+    )
+
+    employees = Employee.objects.in_bulk({employee_id for employee_id, _ in pairs})
+    antirequisite_type_ids = set(Antirequisite.objects.values_list("task_type_id", flat=True))
+    task_types = TaskType.objects.in_bulk(
+        TaskType.required_for.through.objects.filter(
+            responsibility_id__in={responsibility_id for _, responsibility_id in pairs}
+        )
+        .exclude(tasktype_id__in=antirequisite_type_ids)
+        .values_list("tasktype_id", flat=True)
+    )
+    types_required_for = _types_required_for({responsibility_id for _, responsibility_id in pairs})
+
+    task_pairs = set()
+    for employee_id, responsibility_id in pairs:
+        for type_id in types_required_for[responsibility_id]:
+            task_type = task_types.get(type_id)
+            if task_type and task_type.facility_id in (None, employees[employee_id].facility_id):
+                task_pairs.add((employee_id, type_id))
+    if task_pairs:
+        tasks = Task.objects.filter(
+            employee_id__in={employee_id for employee_id, _ in task_pairs},
+            type_id__in={type_id for _, type_id in task_pairs},
+        )
+        task_ids = [
+            pk
+            for pk, employee_id, type_id in tasks.values_list("pk", "employee_id", "type_id")
+            if (employee_id, type_id) in task_pairs
+        ]
+        Task.objects.filter(pk__in=task_ids, is_optional=True).update(
+            is_optional=False, modified=timezone.now()
+        )
+        task_ids += [task.pk for task in create_tasks(task_pairs)]
+        recompute_due_dates(Task.objects.filter(pk__in=task_ids))
+
+    apply_antirequisites(get_employee_antirequisites(employees.values()))
+
+
+def remove_responsibilities(pairs):
+    """
+    Removes the responsibilities of the `(employee_id, responsibility_id)`
+    pairs, then deletes the tasks of the employees no longer required by their
+    remaining responsibilities.
+    """
+    removed = _existing_pairs(set(pairs))
+    if not removed:
+        return
+
+    EmployeeResponsibility.objects.filter(pk__in=removed.values()).delete()
+
+    employees = Employee.objects.in_bulk({employee_id for employee_id, _ in removed})
+    task_types = list(
+        TaskType.objects.filter(
+            required_for__in={responsibility_id for _, responsibility_id in removed}
+        )
+        .exclude(pk__in=GlobalRequirement.objects.values("task_type"))
+        .distinct()
+    )
+    types_required_for = _types_required_for(
+        {responsibility_id for _, responsibility_id in removed}
+    )
+
+    required = get_required_pairs(employees.values(), task_types)
+    candidate_type_ids = {task_type.pk for task_type in task_types}
+    antirequisite_types = {
+        (employee.pk, antirequisite.task_type_id)
+        for employee, antirequisite in get_employee_antirequisites(employees.values())
+    }
+    non_required = set()
+    for employee_id, responsibility_id in removed:
+        for type_id in types_required_for[responsibility_id] & candidate_type_ids:
+            if (employee_id, type_id) in required or (employee_id, type_id) in antirequisite_types:
+                continue
+            non_required.add((employee_id, type_id))
+    if not non_required:
+        return
+
+    tasks = Task.objects.filter(
+        employee_id__in={employee_id for employee_id, _ in non_required},
+        type_id__in={type_id for _, type_id in non_required},
+    )
+    Task.objects.filter(
+        pk__in=[
+            pk
+            for pk, employee_id, type_id in tasks.values_list("pk", "employee_id", "type_id")
+            if (employee_id, type_id) in non_required
+        ]
+    ).delete()
@@ -0,0 +1,84 @@
+"""
+Scoring of the courses.
+
+An item with true/false or multiple choice questions is worth a point,
+scored on its first question (first in `order`). Instead of querying the
+questions on every answer and every score shown, each course keeps its scoring
+precomputed: `Course.max_points`, the number of questions,
+`Course.scorable_items`, the number of items worth a point, and
+`Course.answer_key`, the correct answer of each of them by item id (a boolean,
+or the id of the first answer option of the choice, or null for a choice
+without answers).
+
+Both are recomputed by the signals of the items, questions and answers (see
+`apps.trainings.signals`). Bulk changes (`update()`, `bulk_create()`...) don't
+send signals, call `update_course_scoring` after them.
+"""
+from django.utils import timezone
+
+from .models import Course, CourseItemBoolean, CourseItemMultiChoice
+
+
+def compute_course_scoring(course_id):
+    """
+    Returns the `max_points`, `scorable_items` and `answer_key` of the course
+    `course_id`, in three queries.
+    """
+    max_points = 0
+    answer_key = {}
+    for item_id, answer in (
+        CourseItemBoolean.objects.filter(item__course=course_id)
+        .order_by("item", "order", "pk")
+        .values_list("item", "answer")
+    ):
+        max_points += 1
+        answer_key.setdefault(str(item_id), answer)
+
+    choices = {}
+    for item_id, choice_id in (
+        CourseItemMultiChoice.objects.filter(item__course=course_id)
+        .order_by("item", "order", "pk")
+        .values_list("item", "pk")
+    ):
+        max_points += 1
+        choices.setdefault(str(item_id), choice_id)
+
+    # The true/false question comes first, like the answers are checked.
+    choices = {
+        choice_id: item_id for item_id, choice_id in choices.items() if item_id not in answer_key
+    }
+    answers = {}
+    for choice_id, option_id in (
+        CourseItemMultiChoice.answers.through.objects.filter(courseitemmultichoice__in=choices)
+        .order_by("courseitemmultichoice", "multichoiceoption")
+        .values_list("courseitemmultichoice", "multichoiceoption")
+    ):
+        answers.setdefault(choice_id, option_id)
+    for choice_id, item_id in choices.items():
+        answer_key[item_id] = answers.get(choice_id)
+
+    return max_points, len(answer_key), answer_key
+
+
+def update_course_scoring(course_ids):
+    for course_id in set(course_ids):
+        if course_id is None:
+            continue
+        max_points, scorable_items, answer_key = compute_course_scoring(course_id)
+        Course.objects.filter(pk=course_id).update(
+            max_points=max_points,
+            scorable_items=scorable_items,
+            answer_key=answer_key,
+            modified=timezone.now(),
+        )
+
+
+def check_answer(course, course_item_id, answer):
+    """
+    Returns whether `answer` is the correct answer of the item `course_item_id`
+    of `course`. Items without questions are never answered correctly.
+    """
+    expected = course.answer_key.get(str(course_item_id))
+    if isinstance(expected, bool):
+        return expected is answer
+    return expected is not None and expected == answer
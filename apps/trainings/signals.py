@@ -1,32 +1,47 @@
 from datetime import date
 
+from django.core.signals import request_started
 from django.db.models import Q
-from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
+from celery.signals import task_prerun
+
+from apps.base.outbox import enqueue
+
+from .antirequisites import apply_antirequisites, get_employee_antirequisites
+from .graph import invalidate_task_type_graph, recheck_task_type_graph
 from .models import (
     Antirequisite,
+    CourseItem,
+    CourseItemBoolean,
+    CourseItemMultiChoice,
     Employee,
     Facility,
     FacilityDefault,
-    FacilityQuestion,
     FacilityQuestionRule,
     GlobalRequirement,
+    MultiChoiceOption,
     Position,
     Responsibility,
     Task,
-    TaskHistory,
-    TaskHistoryStatus,
     TaskStatus,
     TaskType,
     TrainingEvent,
 )
+from .scoring import update_course_scoring
 from .tasks import (
+    apply_antirequisite,
+    apply_facility_capacity,
+    apply_facility_question_rule,
+    apply_facility_questions,
     apply_global_requirement,
     apply_type_responsibility,
     reapply_employee_positions,
     reapply_employee_responsibilities,
     reapply_position,
+    recompute_task_type,
 )
 
 
@@ -42,17 +57,9 @@ def create_default_instance_for_facility(sender, instance, **kwargs):
 def facility_questions_changed(sender, instance, action, pk_set, **kwargs):
     facility = instance
 
-    if action == "post_add":
-        for question in FacilityQuestion.objects.filter(pk__in=pk_set):
-            for rule in question.rules.all():
-                for employee in Employee.objects.filter(facility=facility, positions=rule.position):
-                    employee.other_responsibilities.add(rule.responsibility)
-
-    elif action == "post_remove":
-        for question in FacilityQuestion.objects.filter(pk__in=pk_set):
-            for rule in question.rules.all():
-                for employee in Employee.objects.filter(facility=facility, positions=rule.position):
-                    employee.other_responsibilities.remove(rule.responsibility)
+    if action in ("post_add", "post_remove"):
+        # running on background to prevent timeout
+        enqueue(apply_facility_questions, facility.pk, sorted(pk_set))
 
 
 @receiver(pre_save, sender=Task)
@@ -78,11 +85,7 @@ def update_employee_responsibilities(sender, instance, created, **kwargs):
     """
     Updates employee responsibilities whenever a rule is create or modified
     """
-    facilities = instance.facility_question.facility_set.all()
-    for facility in facilities:
-        employees = facility.employee_set.filter(positions=instance.position)
-        for employee in employees:
-            employee.other_responsibilities.add(instance.responsibility)
+    enqueue(apply_facility_question_rule, instance.pk)
 
 
 def create_task_for_responsibility(employee, responsibility):
@@ -162,15 +165,13 @@ def employee_other_responsibilities_changed(sender, instance, pk_set, action, **
         for responsibility in Responsibility.objects.filter(pk__in=pk_set):
             create_task_for_responsibility(employee, responsibility)
 
-        antirequisites = get_employee_antirequisites(employee)
-        for antirequisite in antirequisites:
-            add_antirequisite_task(employee, antirequisite)
+        apply_antirequisites(get_employee_antirequisites([employee]))
     elif action == "post_remove":
-        antirequisites = get_employee_antirequisites(employee)
+        antirequisites = get_employee_antirequisites([employee])
         non_required_task_types = (
             TaskType.objects.filter(required_for__pk__in=pk_set)
             .exclude(required_for__in=employee.other_responsibilities.all())
-            .exclude(pk__in=antirequisites.values_list("task_type_id", flat=True))
+            .exclude(pk__in=[antirequisite.task_type_id for _, antirequisite in antirequisites])
             .exclude(globalrequirement__isnull=False)
             .distinct()
         )
@@ -182,7 +183,7 @@ def task_type_responsibility_added(sender, instance, pk_set, action, **kwargs):
     task_type = instance
     if action == "post_add":
         # running on background to prevent timeout
-        apply_type_responsibility.delay(list(pk_set), task_type.id)
+        enqueue(apply_type_responsibility, sorted(pk_set), task_type.id)
 
 
 @receiver(m2m_changed, sender=TrainingEvent.attendees.through)
@@ -193,7 +194,7 @@ def training_event_attendees_changed(sender, instance, pk_set, action, **kwargs)
             type=instance.training_for,
             employee__id__in=pk_set,
         )
-        tasks.update(status=TaskStatus.scheduled)
+        tasks.update(status=TaskStatus.scheduled, modified=timezone.now())
         instance.employee_tasks.add(*tasks)
 
     if action == "post_remove":
@@ -202,101 +203,47 @@ def training_event_attendees_changed(sender, instance, pk_set, action, **kwargs)
             type=instance.training_for,
             employee__id__in=pk_set,
         )
-        tasks.update(status=TaskStatus.open)
+        tasks.update(status=TaskStatus.open, modified=timezone.now())
         instance.employee_tasks.remove(*tasks)
 
     if action == "post_clear":
-        instance.employee_tasks.update(status=TaskStatus.open)
+        instance.employee_tasks.update(status=TaskStatus.open, modified=timezone.now())
         instance.employee_tasks.clear()
 
 
-def get_antirequisite_employees(antirequisite):
-    """ """
-    completed_employee_ids = (
-        TaskHistory.objects.filter(
-            status=TaskHistoryStatus.completed, type=antirequisite.antirequisite_of
-        )
-        .values_list("employee_id", flat=True)
-        .distinct()
-    )
-
-    return (
-        Employee.objects.filter(date_of_hire__gte=antirequisite.valid_after_hire_date)
-        .filter(trainings_task_set__type=antirequisite.antirequisite_of)
-        .exclude(pk__in=completed_employee_ids)
-    )
-
-
-def get_employee_antirequisites(employee):
-    completed_task_type_ids = (
-        employee.trainings_taskhistory_set.filter(status=TaskHistoryStatus.completed)
-        .values_list("type_id", flat=True)
-        .distinct()
-    )
-
-    return Antirequisite.objects.filter(valid_after_hire_date__lte=employee.date_of_hire).exclude(
-        antirequisite_of_id__in=completed_task_type_ids
-    )
-
-
 @receiver(post_save, sender=Antirequisite)
 def create_or_update_antirequisite_task(sender, instance, **kwargs):
-    employees = get_antirequisite_employees(instance)
-    for employee in employees:
-        add_antirequisite_task(employee, instance)
+    # running on background to prevent timeout
+    enqueue(apply_antirequisite, instance.pk)
 
 
-def add_antirequisite_task(employee, antirequisite):
-    one_off = TaskHistory.objects.filter(
-        employee=employee,
-        type=antirequisite.task_type,
-        type__is_one_off=True,
-        status=TaskHistoryStatus.completed,
-        completion_date__gte=antirequisite.valid_after_hire_date,
-    ).first()
+@receiver(post_save, sender=TaskType)
+@receiver(post_delete, sender=TaskType)
+def task_type_graph_changed(sender, instance, **kwargs):
+    invalidate_task_type_graph()
 
-    if one_off:
-        return
 
-    due_date = antirequisite.due_date or employee.date_of_hire
-
-    responsibility_added_task = Task.objects.filter(
-        employee=employee, type=antirequisite.task_type, antirequisite=None
-    ).first()
-
-    if responsibility_added_task:
-        responsibility_added_task.due_date = due_date
-        responsibility_added_task.save()
-
-    task, created = Task.objects.get_or_create(
-        antirequisite=antirequisite,
-        employee=employee,
-        defaults={
-            "type": antirequisite.task_type,
-            "employee": employee,
-            "antirequisite": antirequisite,
-            "due_date": due_date,
-        },
-    )
+@receiver(m2m_changed, sender=TaskType.prerequisites.through)
+@receiver(m2m_changed, sender=TaskType.supersedes.through)
+def task_type_relations_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_task_type_graph()
+
 
-    if not created:
-        task.due_date = due_date
-        task.type = antirequisite.task_type
-        task.save()
+@receiver(request_started)
+@receiver(task_prerun)
+def task_type_graph_recheck(**kwargs):
+    recheck_task_type_graph()
 
 
 @receiver(post_save, sender=TaskType)
-def check_task_type_capacity(sender, instance, **kwargs):
+def check_task_type_changes(sender, instance, created, **kwargs):
     task_type = instance
 
-    if (
-        task_type.initial_min_capacity == task_type.min_capacity
-        and task_type.initial_max_capacity == task_type.max_capacity
-    ):
+    if created or not task_type.tracker.changed():
         return
 
-    for task in Task.objects.filter(type=task_type):
-        task.recompute_due_date()
+    enqueue(recompute_task_type, task_type.pk)
 
 
 @receiver(post_save, sender=Facility)
@@ -306,11 +253,7 @@ def check_facility_capacity(sender, instance, **kwargs):
     if facility.initial_capacity == facility.capacity:
         return
 
-    task_types = TaskType.objects.filter(Q(facility=facility) | Q(facility__isnull=True))
-    for task_type in task_types:
-        for employee in Employee.objects.filter(facility=facility):
-            task = Task.objects.create(employee=employee, type=task_type)
-            task.recompute_due_date()
+    enqueue(apply_facility_capacity, facility.pk)
 
 
 @receiver(pre_save, sender=Employee)
@@ -337,8 +280,8 @@ def on_post_save_employee(sender, instance, created, **kwargs):
             task.recompute_due_date()
     else:
         if instance.tracker.has_changed("date_of_hire"):
-            reapply_employee_positions.delay(instance.id)
-            reapply_employee_responsibilities.delay(instance.id)
+            enqueue(reapply_employee_positions, instance.id)
+            enqueue(reapply_employee_responsibilities, instance.id)
 
 
 @receiver(post_save, sender=GlobalRequirement)
@@ -346,7 +289,7 @@ def create_global_requirement(sender, instance, created, **kwargs):
     global_requirement = instance
 
     if created:
-        apply_global_requirement.delay(global_requirement.pk)
+        enqueue(apply_global_requirement, global_requirement.pk)
 
 
 @receiver(post_delete, sender=GlobalRequirement)
@@ -358,8 +301,64 @@ def delete_global_requirement(sender, instance, **kwargs):
 def position_responsibilities_changed(sender, instance, pk_set, action, reverse, **kwargs):
     if not reverse:
         position = instance
-        reapply_position.delay(position.pk)
+        enqueue(reapply_position, position.pk)
     else:
         responsibility = instance
         for position in Position.objects.filter(responsibilities=responsibility):
-            reapply_position.delay(position.pk)
+            enqueue(reapply_position, position.pk)
+
+
+def get_item_courses(item_ids):
+    return CourseItem.objects.filter(pk__in=item_ids).values_list("course", flat=True)
+
+
+def get_answer_courses(option):
+    return CourseItemMultiChoice.objects.filter(answers=option).values_list(
+        "item__course", flat=True
+    )
+
+
+@receiver(post_save, sender=CourseItem)
+@receiver(post_delete, sender=CourseItem)
+def course_item_changed(sender, instance, **kwargs):
+    update_course_scoring([instance.course_id])
+
+
+@receiver(post_save, sender=CourseItemBoolean)
+@receiver(post_delete, sender=CourseItemBoolean)
+@receiver(post_save, sender=CourseItemMultiChoice)
+@receiver(post_delete, sender=CourseItemMultiChoice)
+def course_question_changed(sender, instance, **kwargs):
+    update_course_scoring(get_item_courses([instance.item_id]))
+
+
+@receiver(m2m_changed, sender=CourseItemMultiChoice.answers.through)
+def course_answers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            update_course_scoring(get_item_courses([instance.item_id]))
+        return
+
+    # `instance` is an option and `pk_set` the choices it is added to or
+    # removed from. The choices it is cleared from are only known before.
+    if action == "pre_clear":
+        instance._scoring_courses = list(get_answer_courses(instance))
+    elif action == "post_clear":
+        update_course_scoring(getattr(instance, "_scoring_courses", []))
+    elif action in ("post_add", "post_remove"):
+        update_course_scoring(
+            CourseItemMultiChoice.objects.filter(pk__in=pk_set).values_list(
+                "item__course", flat=True
+            )
+        )
+
+
+@receiver(pre_delete, sender=MultiChoiceOption)
+def answer_option_deleting(sender, instance, **kwargs):
+    # The option is removed from the answers without `m2m_changed`.
+    instance._scoring_courses = list(get_answer_courses(instance))
+
+
+@receiver(post_delete, sender=MultiChoiceOption)
+def answer_option_deleted(sender, instance, **kwargs):
+    update_course_scoring(getattr(instance, "_scoring_courses", []))
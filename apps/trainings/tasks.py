@@ -1,3 +1,4 @@
+import abc
 import datetime
 import logging
 
@@ -11,6 +12,7 @@ from django.utils import timezone
 import pytz
 from celery import shared_task
 
+from apps.base.jobs import FanOutJob
 from apps.facilities.models import FacilityUser
 from apps.sms import (
     send_in_person_reminder_sms,
@@ -18,17 +20,24 @@ from apps.sms import (
     send_upcoming_reminder_sms,
 )
 
+from .antirequisites import apply_antirequisites, get_antirequisite_employees
+from .due_dates import create_tasks, get_required_pairs, recompute_due_dates
+from .graph import get_task_type_graph
 from .models import (
+    Antirequisite,
     Employee,
     Facility,
+    FacilityQuestionRule,
     GlobalRequirement,
     Position,
     ResponsibilityEducationRequirement,
     Task,
     TaskHistoryStatus,
     TaskType,
+    Tombstone,
     TrainingEvent,
 )
+from .responsibilities import add_responsibilities, remove_responsibilities
 
 logger = logging.getLogger(__name__)
 
@@ -122,27 +131,56 @@ def is_today_email_day():
     return weekday in (0, 2)
 
 
-class EmailEmployeeEvents(object):
+class FacilityJob(FanOutJob):
+    """
+    A beat job run facility by facility. Subclasses implement `do_facility`.
+    """
+
+    def get_keys(self):
+        return Facility.objects.order_by("pk").values_list("pk", flat=True)
+
     def do(self):
-        tomorrow_start = timezone.now().replace(hour=0, minute=0, second=0) + datetime.timedelta(
-            days=1
-        )
-        tomorrow_end = tomorrow_start + datetime.timedelta(days=1)
-        three_days_start = timezone.now().replace(hour=0, minute=0, second=0) + datetime.timedelta(
-            days=3
-        )
-        three_days_end = three_days_start + datetime.timedelta(days=1)
+        if not self.should_run():
+            return
+
+        for facility in Facility.objects.order_by("pk"):
+            self.do_facility(facility)
+
+    def do_key(self, key):
+        facility = Facility.objects.filter(pk=key).first()
+        if facility:
+            self.do_facility(facility)
 
-        for employee in Employee.objects.filter(receives_emails=True).exclude(email=""):
+    @abc.abstractmethod
+    def do_facility(self, facility):
+        pass
+
+
+class EmailEmployeeEvents(FacilityJob):
+    def __init__(self):
+        self.tomorrow_start = timezone.now().replace(
+            hour=0, minute=0, second=0
+        ) + datetime.timedelta(days=1)
+        self.tomorrow_end = self.tomorrow_start + datetime.timedelta(days=1)
+        self.three_days_start = timezone.now().replace(
+            hour=0, minute=0, second=0
+        ) + datetime.timedelta(days=3)
+        self.three_days_end = self.three_days_start + datetime.timedelta(days=1)
+
+    def do_facility(self, facility):
+        employees = Employee.objects.filter(facility=facility, receives_emails=True).exclude(
+            email=""
+        )
+        for employee in employees:
             training_events_tomorrow = TrainingEvent.objects.filter(
                 attendees=employee,
-                start_time__gte=tomorrow_start,
-                start_time__lt=tomorrow_end,
+                start_time__gte=self.tomorrow_start,
+                start_time__lt=self.tomorrow_end,
             ).order_by("start_time")
             training_events_three_days = TrainingEvent.objects.filter(
                 attendees=employee,
-                start_time__gte=three_days_start,
-                start_time__lt=three_days_end,
+                start_time__gte=self.three_days_start,
+                start_time__lt=self.three_days_end,
             ).order_by("start_time")
 
             for events in [training_events_tomorrow, training_events_three_days]:
@@ -168,23 +206,23 @@ class EmailEmployeeEvents(object):
                     )
 
 
-class EmailScheduledTrainingsToday(object):
-    def do(self):
-        today_start = timezone.now().replace(hour=0, minute=0, second=0)
-        tomorrow_start = today_start + datetime.timedelta(days=1)
+class EmailScheduledTrainingsToday(FacilityJob):
+    def __init__(self):
+        self.today_start = timezone.now().replace(hour=0, minute=0, second=0)
+        self.tomorrow_start = self.today_start + datetime.timedelta(days=1)
 
-        for facility in Facility.objects.all():
-            roles = [FacilityUser.Role.account_admin, FacilityUser.Role.manager]
-            admin_emails = get_emails(facility, facility_user_roles=roles)
+    def do_facility(self, facility):
+        roles = [FacilityUser.Role.account_admin, FacilityUser.Role.manager]
+        admin_emails = get_emails(facility, facility_user_roles=roles)
 
-            if admin_emails:
-                training_events = TrainingEvent.objects.filter(
-                    start_time__gte=today_start,
-                    start_time__lt=tomorrow_start,
-                    facility=facility,
-                ).order_by("start_time")
+        if admin_emails:
+            training_events = TrainingEvent.objects.filter(
+                start_time__gte=self.today_start,
+                start_time__lt=self.tomorrow_start,
+                facility=facility,
+            ).order_by("start_time")
 
-                self.mail_trainings(training_events, admin_emails)
+            self.mail_trainings(training_events, admin_emails)
 
     def mail_trainings(self, training_events, admin_emails):
         count = training_events.count()
@@ -210,44 +248,43 @@ class EmailScheduledTrainingsToday(object):
             send_mail(subject, message, from_email=None, recipient_list=admin_emails)
 
 
-class EmailOverdueTasksThisWeek(object):
+class EmailOverdueTasksThisWeek(FacilityJob):
     def __init__(self):
         self.now = datetime.datetime.now(pytz.timezone(settings.TIME_ZONE))
 
-    def do(self):
-        if not is_today_email_day():
-            return
-
-        for facility in Facility.objects.all():
-            roles = [
-                FacilityUser.Role.account_admin,
-                FacilityUser.Role.manager,
-                "Administrator",
-                "Manager",
-            ]
-            admin_emails = get_emails(facility, facility_user_roles=roles)
-
-            if admin_emails:
-                expired_tasks = self.get_expired_tasks(facility)
-                expiring_tasks = self.get_expiring_tasks(facility)
-                status_types = []
+    def should_run(self):
+        return is_today_email_day()
+
+    def do_facility(self, facility):
+        roles = [
+            FacilityUser.Role.account_admin,
+            FacilityUser.Role.manager,
+            "Administrator",
+            "Manager",
+        ]
+        admin_emails = get_emails(facility, facility_user_roles=roles)
+
+        if admin_emails:
+            expired_tasks = self.get_expired_tasks(facility)
+            expiring_tasks = self.get_expiring_tasks(facility)
+            status_types = []
+
+            if expired_tasks.exists():
+                task_types_expired = TaskType.objects.prefetch_related(
+                    Prefetch("task_set", queryset=expired_tasks)
+                )
+                status_types.append(("Expired", task_types_expired))
 
-                if expired_tasks.exists():
-                    task_types_expired = TaskType.objects.prefetch_related(
-                        Prefetch("task_set", queryset=expired_tasks)
+                if expiring_tasks.exists():
+                    task_types_expiring = TaskType.objects.prefetch_related(
+                        Prefetch("task_set", queryset=expiring_tasks)
                     )
-                    status_types.append(("Expired", task_types_expired))
-
-                    if expiring_tasks.exists():
-                        task_types_expiring = TaskType.objects.prefetch_related(
-                            Prefetch("task_set", queryset=expiring_tasks)
-                        )
-                        status_types.append(("Expiring", task_types_expiring))
+                    status_types.append(("Expiring", task_types_expiring))
 
-                    if not admin_emails.filter(email__iexact=facility.contact_email).exists():
-                        admin_emails = list(admin_emails)
-                        admin_emails.append(facility.contact_email.lower())
-                    self.mail_facility_non_compliance(status_types, admin_emails)
+                if not admin_emails.filter(email__iexact=facility.contact_email).exists():
+                    admin_emails = list(admin_emails)
+                    admin_emails.append(facility.contact_email.lower())
+                self.mail_facility_non_compliance(status_types, admin_emails)
 
     def get_expired_tasks(self, facility):
         return Task.objects.select_related("employee").filter(
@@ -276,32 +313,31 @@ class EmailOverdueTasksThisWeek(object):
         send_mail(subject, message, from_email=None, recipient_list=admin_emails)
 
 
-class EmailFacilityCompliant(object):
+class EmailFacilityCompliant(FacilityJob):
     def __init__(self):
         self.now = timezone.localtime(timezone.now())
 
-    def do(self):
-        if not is_today_email_day():
-            return
+    def should_run(self):
+        return is_today_email_day()
 
-        for facility in Facility.objects.all():
-            admin_emails = get_emails(facility)
-            overdue_tasks_exist = self.overdue_tasks_exist(facility)
-
-            if admin_emails and not overdue_tasks_exist:
-                now_date = self.now.date()
-                ninety_days = now_date + datetime.timedelta(days=90)
-                ninety_day_tasks = Task.objects.select_related("employee").filter(
-                    due_date__gte=now_date,
-                    due_date__lt=ninety_days,
-                    employee__is_active=True,
-                    employee__facility=facility,
-                    is_optional=False,
-                )
-                task_types = TaskType.objects.prefetch_related(
-                    Prefetch("task_set", queryset=ninety_day_tasks)
-                )
-                self.mail_facility_compliance(task_types, admin_emails)
+    def do_facility(self, facility):
+        admin_emails = get_emails(facility)
+        overdue_tasks_exist = self.overdue_tasks_exist(facility)
+
+        if admin_emails and not overdue_tasks_exist:
+            now_date = self.now.date()
+            ninety_days = now_date + datetime.timedelta(days=90)
+            ninety_day_tasks = Task.objects.select_related("employee").filter(
+                due_date__gte=now_date,
+                due_date__lt=ninety_days,
+                employee__is_active=True,
+                employee__facility=facility,
+                is_optional=False,
+            )
+            task_types = TaskType.objects.prefetch_related(
+                Prefetch("task_set", queryset=ninety_day_tasks)
+            )
+            self.mail_facility_compliance(task_types, admin_emails)
 
     def mail_facility_compliance(self, task_types, admin_emails):
         subject = "Your facility is compliant"
@@ -325,23 +361,23 @@ class EmailFacilityCompliant(object):
         )
 
 
-class EmailCompletedTrainingsReminderToday(object):
-    def do(self):
-        today_start = timezone.now().replace(hour=0, minute=0, second=0)
-        yesterday_start = today_start - datetime.timedelta(days=1)
+class EmailCompletedTrainingsReminderToday(FacilityJob):
+    def __init__(self):
+        self.today_start = timezone.now().replace(hour=0, minute=0, second=0)
+        self.yesterday_start = self.today_start - datetime.timedelta(days=1)
 
-        for facility in Facility.objects.all():
-            roles = [FacilityUser.Role.account_admin, FacilityUser.Role.manager]
-            admin_emails = get_emails(facility, facility_user_roles=roles)
+    def do_facility(self, facility):
+        roles = [FacilityUser.Role.account_admin, FacilityUser.Role.manager]
+        admin_emails = get_emails(facility, facility_user_roles=roles)
 
-            if admin_emails:
-                training_events = TrainingEvent.objects.filter(
-                    end_time__gte=yesterday_start,
-                    end_time__lt=today_start,
-                    facility=facility,
-                ).select_related("training_for", "facility")
+        if admin_emails:
+            training_events = TrainingEvent.objects.filter(
+                end_time__gte=self.yesterday_start,
+                end_time__lt=self.today_start,
+                facility=facility,
+            ).select_related("training_for", "facility")
 
-                self.mail_trainings(training_events, admin_emails)
+            self.mail_trainings(training_events, admin_emails)
 
     def mail_trainings(self, training_events, admin_emails):
         for training_event in training_events:
@@ -354,7 +390,15 @@ class EmailCompletedTrainingsReminderToday(object):
             send_mail(subject, message, from_email=None, recipient_list=admin_emails)
 
 
-class ResetPrerequisiteTasks(object):
+class EmailMonthlyReminders(FacilityJob):
+    def do_facility(self, facility):
+        admin_emails = get_emails(facility)
+        subject = render_to_string("trainings/emails/monthly-reminder-subject.txt").strip()
+        message = render_to_string("trainings/emails/monthly-reminder-body.txt")
+        send_mail(subject, message, from_email=None, recipient_list=admin_emails)
+
+
+class ResetPrerequisiteTasks(FacilityJob):
     """
         Resets the due dates of interval bases and their prerequisites if the
     employee failed to meet the education requirements
@@ -363,23 +407,22 @@ class ResetPrerequisiteTasks(object):
     def __init__(self):
         self.now_date = timezone.localtime(timezone.now()).date()
 
-    def do(self):
+    def do_facility(self, facility):
         """
-        Executes the cron job
+        Executes the cron job for the employees of the facility
         """
-        for facility in Facility.objects.all():
-            employees = facility.employee_set.all()
-            for employee in employees:
-                requirements = self.get_requirements(employee)
-                for requirement in requirements:
-                    base_task = self.get_base_task(employee, requirement)
-                    if base_task:
-                        end_date = base_task.completion_date + requirement.timeperiod
-                        satisfied = self.has_satisfied_requirement(
-                            employee, requirement, base_task.completion_date, end_date
-                        )
-                        if (self.now_date > end_date) and not satisfied:
-                            self.reset_employee_tasks(employee, requirement, end_date)
+        employees = facility.employee_set.all()
+        for employee in employees:
+            requirements = self.get_requirements(employee)
+            for requirement in requirements:
+                base_task = self.get_base_task(employee, requirement)
+                if base_task:
+                    end_date = base_task.completion_date + requirement.timeperiod
+                    satisfied = self.has_satisfied_requirement(
+                        employee, requirement, base_task.completion_date, end_date
+                    )
+                    if (self.now_date > end_date) and not satisfied:
+                        self.reset_employee_tasks(employee, requirement, end_date)
 
     def get_requirements(self, employee):
         """
@@ -428,51 +471,45 @@ class ResetPrerequisiteTasks(object):
         if base_task:
             self.recurse_reset(base_task, end_date)
 
-    def recurse_reset(self, task, end_date, task_id_set=set()):
+    def recurse_reset(self, task, end_date):
         """
-            Recursively resets a task and its prerequisites. Does not process
-        previously processed tasks to avoid recursion error in case there are
-        circular prerequisites.
+            Resets the due date of a task and of the employee's tasks of its
+        prerequisites, direct or not.
         """
-        if task.id not in task_id_set:
-            task_id_set.add(task.id)
-            if task.due_date > end_date:
-                task.due_date = end_date
-                task.save()
-            prerequisites = task.type.prerequisites.values_list("pk", flat=True)
-            tasks = Task.objects.filter(type_id__in=prerequisites)
-            for task in tasks:
-                self.recurse_reset(task, end_date)
+        type_ids = get_task_type_graph().with_prerequisites(task.type_id)
+        Task.objects.filter(
+            employee_id=task.employee_id, type_id__in=type_ids, due_date__gt=end_date
+        ).update(due_date=end_date, modified=timezone.now())
 
 
 @shared_task
 def email_employee_events():
-    EmailEmployeeEvents().do()
+    EmailEmployeeEvents().fan_out()
 
 
 @shared_task
 def email_scheduled_trainings_today():
-    EmailScheduledTrainingsToday().do()
+    EmailScheduledTrainingsToday().fan_out()
 
 
 @shared_task
 def email_overdue_tasks_this_week():
-    EmailOverdueTasksThisWeek().do()
+    EmailOverdueTasksThisWeek().fan_out()
 
 
 @shared_task
 def email_facility_compliant():
-    EmailFacilityCompliant().do()
+    EmailFacilityCompliant().fan_out()
 
 
 @shared_task
 def email_completed_trainings_reminder_today():
-    EmailCompletedTrainingsReminderToday().do()
+    EmailCompletedTrainingsReminderToday().fan_out()
 
 
 @shared_task
 def reset_prerequisite_tasks():
-    ResetPrerequisiteTasks().do()
+    ResetPrerequisiteTasks().fan_out()
 
 
 @shared_task
@@ -492,11 +529,7 @@ def sms_upcoming_reminders():
 
 @shared_task
 def email_monthly_reminders():
-    for facility in Facility.objects.all():
-        admin_emails = get_emails(facility)
-        subject = render_to_string("trainings/emails/monthly-reminder-subject.txt").strip()
-        message = render_to_string("trainings/emails/monthly-reminder-body.txt")
-        send_mail(subject, message, from_email=None, recipient_list=admin_emails)
+    EmailMonthlyReminders().fan_out()
 
 
 @shared_task
@@ -583,13 +616,114 @@ def apply_type_responsibility(pk_set, task_type_id):
             task.recompute_due_date()
 
 
+@shared_task
+def apply_facility_capacity(facility_id):
+    """
+    Creates and deletes the tasks of the task types that entered or left the
+    scope of the facility after its capacity changed.
+    """
+    facility = Facility.objects.filter(pk=facility_id).first()
+    if not facility:
+        return
+
+    in_scope, out_of_scope = [], []
+    task_types = TaskType.objects.filter(Q(facility=facility) | Q(facility__isnull=True)).exclude(
+        min_capacity=0, max_capacity=0
+    )
+    for task_type in task_types:
+        if task_type.check_facility_capacity(facility.capacity):
+            in_scope.append(task_type)
+        else:
+            out_of_scope.append(task_type)
+
+    with transaction.atomic():
+        Task.objects.filter(employee__facility=facility, type__in=out_of_scope).delete()
+        created = create_tasks(get_required_pairs(facility.employee_set.all(), in_scope))
+        recompute_due_dates(Task.objects.filter(pk__in=[task.pk for task in created]))
+
+
+@shared_task
+def apply_facility_questions(facility_id, question_ids):
+    """
+    Adds the responsibilities the rules of the questions the facility answered
+    give to the employees of the facility holding the rules' positions, and
+    removes those of the questions it doesn't answer anymore.
+
+    The questions are read when the job runs, so jobs running out of order
+    still leave the current answers applied.
+    """
+    answered = set(
+        Facility.questions.through.objects.filter(
+            facility_id=facility_id, facilityquestion_id__in=question_ids
+        ).values_list("facilityquestion_id", flat=True)
+    )
+    pairs = FacilityQuestionRule.objects.filter(
+        facility_question_id__in=question_ids, position__employee__facility_id=facility_id
+    ).values_list("facility_question_id", "position__employee", "responsibility_id")
+    added_pairs, removed_pairs = [], []
+    for question_id, employee_id, responsibility_id in pairs:
+        if question_id in answered:
+            added_pairs.append((employee_id, responsibility_id))
+        else:
+            removed_pairs.append((employee_id, responsibility_id))
+
+    with transaction.atomic():
+        add_responsibilities(added_pairs)
+        # Unless an answered question gives it too.
+        remove_responsibilities(set(removed_pairs) - set(added_pairs))
+
+
+@shared_task
+def apply_facility_question_rule(rule_id):
+    """
+    Adds the responsibility of the rule to the employees holding its position in
+    every facility that answered its question.
+    """
+    rule = FacilityQuestionRule.objects.filter(pk=rule_id).first()
+    if not rule:
+        return
+
+    employee_ids = Employee.objects.filter(
+        facility__questions=rule.facility_question, positions=rule.position
+    ).values_list("pk", flat=True)
+
+    with transaction.atomic():
+        add_responsibilities((employee_id, rule.responsibility_id) for employee_id in employee_ids)
+
+
+@shared_task
+def apply_antirequisite(antirequisite_id):
+    """
+    Creates or updates the antirequisite task of every employee the
+    antirequisite applies to.
+    """
+    antirequisite = Antirequisite.objects.filter(pk=antirequisite_id).first()
+    if not antirequisite:
+        return
+
+    employees = get_antirequisite_employees(antirequisite)
+    with transaction.atomic():
+        apply_antirequisites((employee, antirequisite) for employee in employees)
+
+
+@shared_task
+def recompute_task_type(task_type_id):
+    """
+    Recomputes the tasks of the task type, and of the task types it supersedes,
+    after a field their due dates depend on changed.
+    """
+    tasks = Task.objects.filter(Q(type_id=task_type_id) | Q(type__superseded_by=task_type_id))
+    with transaction.atomic():
+        recompute_due_dates(tasks.distinct())
+
+
 @shared_task
 def deactivate_employees_after_termination_date():
     employees_to_deactivate = Employee.objects.filter(
         is_active=True, deactivation_date__lte=timezone.now(), is_reactivated=False
     )
     if employees_to_deactivate.exists():
-        employees_to_deactivate.update(is_active=False)
+        employees_to_deactivate.update(is_active=False, modified=timezone.now())
 
 
 @shared_task
@@ -616,3 +750,29 @@ def regenerate_task_certificates(facility_pk):
                     logger.error(
                         f"Error when regenerating certificate for {employee} for course {ec}: {e}"
                     )
+
+
+class PruneTombstones(object):
+    """
+    Deletes the tombstones older than `SYNC_TOMBSTONE_RETENTION`; the mobile
+    apps with an older sync cursor are sent everything again.
+    """
+
+    batch_size = 5000
+
+    def do(self):
+        expired = timezone.now() - settings.SYNC_TOMBSTONE_RETENTION
+        while True:
+            pks = list(
+                Tombstone.objects.filter(deleted__lt=expired).values_list("pk", flat=True)[
+                    : self.batch_size
+                ]
+            )
+            if not pks:
+                break
+            Tombstone.objects.filter(pk__in=pks).delete()
+
+
+@shared_task
+def prune_tombstones():
+    PruneTombstones().do()
@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
 from embed_video.fields import EmbedVideoField
+from model_utils.fields import AutoLastModifiedField
 from ordered_model.models import OrderedModel
 
 
@@ -8,6 +10,7 @@ class TutorialVideo(OrderedModel):
     title = models.CharField(max_length=100)
     url = EmbedVideoField()
     description = models.TextField()
+    modified = AutoLastModifiedField(_("modified"))
 
     def __str__(self):
         return 'Tutorial Video "{}"'.format(self.title)
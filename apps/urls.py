@@ -7,6 +7,7 @@ from django.urls import re_path
 from actstream.models import Action, Follow
 from apps.activities.admin import DashboardAdmin
 from apps.activities.models import Activity
+from apps.base.views import task_metrics
 
 admin.autodiscover()
 
@@ -31,6 +32,7 @@ urlpatterns = [
     # Stripe
     re_path(r"^stripe/", include("djstripeevents.urls")),
     re_path(r"^backend/", include("backend_admin.urls")),
+    re_path(r"^metrics/tasks$", task_metrics, name="task-metrics"),
 ]
 
 if settings.DEBUG:
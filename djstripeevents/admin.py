@@ -9,6 +9,10 @@ class EventAdmin(admin.ModelAdmin):
         "stripe_id",
         "type",
         "created",
+        "received",
+        "processed",
+        "latency",
+        "attempts",
     )
     list_filter = (
         "created",
@@ -22,6 +26,10 @@ class EventAdmin(admin.ModelAdmin):
         "data",
         "pending_webhooks",
         "request",
+        "received",
+        "processed",
+        "attempts",
+        "error",
     )
 
 
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.19 on 2026-10-19 18:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djstripeevents", "0002_alter_event_data"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="received",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="processed",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(processed__isnull=True),
+                fields=["created"],
+                name="djstripeevents_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djstripeevents", "0003_event_received_processed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="error",
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 from model_utils import Choices
 
@@ -159,3 +161,29 @@ class Event(models.Model):
     data = models.JSONField()
     pending_webhooks = models.PositiveIntegerField()
     request = models.CharField(max_length=255, blank=True)
+    received = models.DateTimeField(default=timezone.now)
+    processed = models.DateTimeField(blank=True, null=True)
+    # Times the event was applied, and the error of the last failed attempt.
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created"],
+                name="djstripeevents_pending_idx",
+                condition=Q(processed__isnull=True),
+            ),
+        ]
+
+    @property
+    def object_key(self):
+        """Identifies the stripe object the event is about, e.g. ``("invoice", "in_123")``."""
+        stripe_object = self.data.get("object") or {}
+        return stripe_object.get("object"), stripe_object.get("id")
+
+    @property
+    def latency(self):
+        if self.processed is None:
+            return None
+        return self.processed - self.received
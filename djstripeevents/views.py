@@ -1,5 +1,7 @@
 import datetime
 
+from django.utils import timezone
+
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -14,8 +16,15 @@ class StripeWebhookView(APIView):
         except Event.DoesNotExist:
             event = Event()
             event.stripe_id = request.data["id"]
+            event.received = timezone.now()
+        else:
+            if event.processed:
+                # Stripe retried an event we already applied.
+                return Response({})
         event.type = request.data["type"]
-        event.created = datetime.datetime.utcfromtimestamp(request.data["created"])
+        event.created = timezone.make_aware(
+            datetime.datetime.utcfromtimestamp(request.data["created"]), timezone.utc
+        )
         event.data = request.data["data"]
         event.request = request.data["request"] or ""
         event.pending_webhooks = request.data["pending_webhooks"]
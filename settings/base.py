@@ -79,6 +79,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "apps.base.middleware.CompressionMiddleware",
+    "apps.base.middleware.ProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -89,6 +91,19 @@ MIDDLEWARE = [
     "apps.base.middleware.TimezoneMiddleware",
 ]
 
+# Profiling, see `apps.base.profiling`. Part of the requests profiled at random.
+PROFILING_SAMPLE_RATE = env("PROFILING_SAMPLE_RATE", default=0, required=False)
+# Seconds `X-Profile` tokens are valid.
+PROFILING_TOKEN_MAX_AGE = 24 * 60 * 60
+# Number of request profiles kept.
+PROFILING_BUFFER_SIZE = 1000
+
+# Compression, see `apps.base.middleware.CompressionMiddleware`. Smaller responses
+# aren't worth it.
+COMPRESSION_MIN_SIZE = 1024
+# Brotli quality (0-11), low enough for the responses compressed on the fly.
+COMPRESSION_BROTLI_QUALITY = 4
+
 TEMPLATES = [
     {
         "BACKEND": "django_jinja.backend.Jinja2",
@@ -168,6 +183,10 @@ REST_FRAMEWORK = {
         "apps.api.authentication.TimedAuthTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "apps.api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "ORDERING_PARAM": "order_by",
     "TEST_REQUEST_DEFAULT_FORMAT": "json",
 }
@@ -190,9 +209,23 @@ AVATAR_RESIZE_METHOD = Image.LANCZOS
 exchange_default = Exchange("default")
 BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_BROKER_URL = env("CELERY_BROKER_URL")
+# Tasks are routed to a queue by kind of work, and each queue is consumed by its
+# own workers (`celery worker -Q <queue>`), so a long PDF generation or a bulk
+# reconciliation can't hold back the real-time notifications:
+# - interactive: short tasks a user is waiting for (notifications, SMS, outbox).
+# - bulk: reconciliations touching many rows.
+# - cpu_heavy: PDF and file generation.
 CELERY_TASK_QUEUES = (
     Queue("default", exchange_default, routing_key="default"),
     Queue("emails", exchange_default, routing_key="emails"),
+    Queue(
+        "interactive",
+        exchange_default,
+        routing_key="interactive",
+        queue_arguments={"x-max-priority": 10},
+    ),
+    Queue("bulk", exchange_default, routing_key="bulk", queue_arguments={"x-max-priority": 10}),
+    Queue("cpu_heavy", exchange_default, routing_key="cpu_heavy"),
 )
 CELERY_TASK_DEFAULT_QUEUE = "default"
 CELERY_TASK_DEFAULT_EXCHANGE_TYPE = "direct"
@@ -200,9 +233,86 @@ CELERY_TASK_DEFAULT_ROUTING_KEY = "default"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_RESULT_EXTENDED = True
-CELERY_ROUTES = {
+interactive_route = {"exchange": "default", "routing_key": "interactive", "priority": 9}
+bulk_route = {"exchange": "default", "routing_key": "bulk", "priority": 3}
+# Reconciliations triggered by an admin change jump ahead of the beat ones.
+bulk_urgent_route = {"exchange": "default", "routing_key": "bulk", "priority": 6}
+cpu_heavy_route = {"exchange": "default", "routing_key": "cpu_heavy"}
+CELERY_TASK_ROUTES = {
     "djmail.tasks.send_messages": {"exchange": "default", "routing_key": "emails"},
     "djmail.tasks.retry_send_messages": {"exchange": "default", "routing_key": "emails"},
+    "apps.base.tasks.dispatch_outbox": interactive_route,
+    "apps.residents.tasks.send_ltc_status_notification": interactive_route,
+    "apps.trainings.tasks.sms_in_person_training_reminders": interactive_route,
+    "apps.trainings.tasks.sms_past_due_reminders": interactive_route,
+    "apps.trainings.tasks.sms_upcoming_reminders": interactive_route,
+    "apps.base.tasks.run_job_part": bulk_route,
+    "apps.trainings.tasks.reapply_employee_positions": bulk_route,
+    "apps.trainings.tasks.reapply_employee_responsibilities": bulk_route,
+    "apps.trainings.tasks.deactivate_employees_after_termination_date": bulk_route,
+    "apps.alfdirectory.tasks.import_ahca_facilities": bulk_route,
+    "apps.trainings.tasks.reapply_position": bulk_urgent_route,
+    "apps.trainings.tasks.apply_global_requirement": bulk_urgent_route,
+    "apps.trainings.tasks.apply_type_responsibility": bulk_urgent_route,
+    "apps.trainings.tasks.apply_facility_capacity": bulk_urgent_route,
+    "apps.trainings.tasks.apply_facility_questions": bulk_urgent_route,
+    "apps.trainings.tasks.apply_facility_question_rule": bulk_urgent_route,
+    "apps.trainings.tasks.apply_antirequisite": bulk_urgent_route,
+    "apps.trainings.tasks.recompute_task_type": bulk_urgent_route,
+    "apps.trainings.tasks.regenerate_task_certificates": cpu_heavy_route,
+    "apps.residents.tasks.send_ltc_providers_email": cpu_heavy_route,
+    "apps.residents.tasks.generate_ils_file": cpu_heavy_route,
+}
+# Results are only stored for the failures and the long tasks whose outcome is
+# worth checking in the admin; the other tasks are fire-and-forget.
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_STORE_ERRORS_EVEN_IF_IGNORED = True
+# Stored results are pruned by `prune_task_results` after `TASK_RESULT_RETENTION`
+# instead of celery's daily cleanup, which deletes them in a single query.
+CELERY_RESULT_EXPIRES = None
+TASK_RESULT_RETENTION = timedelta(days=14)
+# Soft time limits raise `SoftTimeLimitExceeded` in the task, before the worker
+# kills it at the time limit of its queue (see `QUEUE_WORKER_SETTINGS`).
+long_task = {"soft_time_limit": 25 * 60, "ignore_result": False}
+CELERY_TASK_ANNOTATIONS = {
+    "apps.base.tasks.dispatch_outbox": {"soft_time_limit": 50},
+    "apps.residents.tasks.send_ltc_status_notification": {"soft_time_limit": 50},
+    "apps.trainings.tasks.regenerate_task_certificates": long_task,
+    "apps.residents.tasks.send_ltc_providers_email": long_task,
+    "apps.residents.tasks.generate_ils_file": long_task,
+    "apps.alfdirectory.tasks.import_ahca_facilities": {"ignore_result": False},
+    "apps.trainings.tasks.reapply_employee_positions": {
+        "soft_time_limit": 55 * 60,
+        "ignore_result": False,
+    },
+    "apps.trainings.tasks.reapply_employee_responsibilities": {
+        "soft_time_limit": 55 * 60,
+        "ignore_result": False,
+    },
+}
+# Measure the tasks run by the workers, see `apps.base.instrumentation`.
+TASK_METRICS_ENABLED = True
+# Bearer token of the scrapers of the `/metrics/tasks` endpoint.
+METRICS_TOKEN = env("METRICS_TOKEN", required=False)
+# Worker settings applied by `apps.celery` to the workers consuming the queue:
+# short tasks are prefetched and acknowledged early, long ones are fetched one
+# at a time and acknowledged late so they are redelivered if a worker dies.
+QUEUE_WORKER_SETTINGS = {
+    "interactive": {
+        "worker_prefetch_multiplier": 8,
+        "task_acks_late": False,
+        "task_time_limit": 60,
+    },
+    "bulk": {
+        "worker_prefetch_multiplier": 1,
+        "task_acks_late": True,
+        "task_time_limit": 60 * 60,
+    },
+    "cpu_heavy": {
+        "worker_prefetch_multiplier": 1,
+        "task_acks_late": True,
+        "task_time_limit": 30 * 60,
+    },
 }
 CELERY_BEAT_SCHEDULE = {
     "email-employee-events": {
@@ -278,7 +388,44 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.trainings.tasks.sms_upcoming_reminders",
         "schedule": crontab(minute=0, hour=13),
     },
+    "prune-task-results": {
+        "task": "apps.base.tasks.prune_task_results",
+        "schedule": crontab(minute=30, hour=3),
+    },
+    "prune-tombstones": {
+        "task": "apps.trainings.tasks.prune_tombstones",
+        "schedule": crontab(minute=45, hour=3),
+    },
+    # Publishes outbox jobs whose dispatch message got lost.
+    "dispatch-outbox": {
+        "task": "apps.base.tasks.dispatch_outbox",
+        "schedule": timedelta(minutes=1),
+        "options": {"expires": 60},
+    },
+    # Retries the stripe events that failed, the new ones are processed as
+    # they are received.
+    "process-stripe-events": {
+        "task": "apps.subscriptions.tasks.process_stripe_events",
+        "schedule": timedelta(minutes=5),
+        "options": {"expires": 300},
+    },
 }
+# Identical jobs enqueued to the outbox within this window are published once.
+OUTBOX_COALESCE_SECONDS = 5
+# Beat jobs are split in at most this many parts run in parallel by the workers.
+JOB_FANOUT_CONCURRENCY = 8
+# A run of a beat job not finished after this long is considered dead.
+JOB_RUN_STALE_AFTER = timedelta(hours=6)
+
+# Delta sync of the mobile app, see `apps.api.trainings.views.SyncView`.
+# Deletions are kept this long, older cursors get everything again.
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+# Changes committed this long after they were made are still synced.
+SYNC_CURSOR_OVERLAP = timedelta(minutes=5)
+
+# Seconds the content of the course bundles is cached. It is versioned by the
+# changes of the courses, so this only bounds the memory used.
+COURSE_BUNDLE_CACHE_TIMEOUT = 60 * 60 * 24
 
 # DJOSER
 DJOSER = {
@@ -295,6 +442,8 @@ DJOSER = {
 
 # Stripe
 stripe.api_key = env("STRIPE_API_KEY")
+# A stripe event failing this many times is given up and marked processed.
+STRIPE_EVENT_MAX_ATTEMPTS = 5
 
 # Embed Video
 EMBED_VIDEO_BACKENDS = (
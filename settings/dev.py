@@ -15,6 +15,6 @@ STATIC_ROOT = str(BASE_DIR.parent / "static")
 STATIC_URL = "{url}/static/".format(url=URL)
 
 # Celery
-CELERY_ALWAYS_EAGER = True
+CELERY_TASK_ALWAYS_EAGER = True
 
 ENVIRONMENT = "development"
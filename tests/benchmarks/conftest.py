@@ -0,0 +1,26 @@
+import pytest
+
+from .utils import ENABLED, Benchmark, build_tenant, load_baseline, tenant_size, write_results
+
+
+@pytest.fixture(scope="session")
+def benchmark_results():
+    results = []
+    yield results
+    if ENABLED and results:
+        write_results(results)
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline():
+    return load_baseline() if ENABLED else {}
+
+
+@pytest.fixture
+def benchmark(request, benchmark_results, benchmark_baseline):
+    return Benchmark(benchmark_results, request.node.nodeid, benchmark_baseline)
+
+
+@pytest.fixture
+def tenant():
+    return build_tenant(tenant_size())
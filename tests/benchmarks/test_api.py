@@ -0,0 +1,141 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+
+import pytest
+
+from apps.facilities.models import FacilityUser
+from apps.subscriptions.models import Plan, Subscription
+from apps.trainings.models import Task
+
+from .utils import add_employees, requires_benchmark
+
+import tests.factories as f
+import tests.helpers as h
+from tests.fixtures import Client
+
+pytestmark = [pytest.mark.django_db, requires_benchmark]
+
+Endpoint = namedtuple("Endpoint", "name url client")
+
+
+def admin_client(tenant):
+    client = Client()
+    client.force_authenticate(tenant.users[0])
+    return client
+
+
+def employee_client(tenant):
+    client = Client()
+    client.force_authenticate(tenant.employees[0].user)
+    return client
+
+
+def upcoming_tasks_pdf_url(tenant):
+    facility = tenant.facilities[0]
+    task_ids = Task.objects.filter(employee__facility=facility).values_list("pk", flat=True)
+    r = admin_client(tenant).post(
+        reverse("upcoming-tasks-pdf"),
+        {"type": "upcoming", "task_ids": ",".join(map(str, task_ids))},
+        format="json",
+    )
+    return "{}?parameters_id={}".format(reverse("upcoming-tasks-pdf"), r.data["parameters_id"])
+
+
+def employees_pdf_url(tenant):
+    employee_ids = tenant.facilities[0].employee_set.values_list("pk", flat=True)
+    return "{}?employee_ids={}".format(reverse("employees-pdf"), ",".join(map(str, employee_ids)))
+
+
+ENDPOINTS = [
+    Endpoint("tasks", lambda tenant: reverse("task-list"), admin_client),
+    Endpoint("tasks me", lambda tenant: reverse("task-me"), employee_client),
+    Endpoint("task histories me", lambda tenant: reverse("taskhistory-me"), employee_client),
+    Endpoint("employees", lambda tenant: reverse("employee-list"), admin_client),
+    Endpoint("residents", lambda tenant: reverse("residents-list"), admin_client),
+    Endpoint("courses", lambda tenant: reverse("courses-list"), employee_client),
+    Endpoint(
+        "course open",
+        lambda tenant: reverse("courses-open", kwargs={"pk": tenant.training_type.course.pk}),
+        employee_client,
+    ),
+    Endpoint(
+        "continuing education facility",
+        lambda tenant: reverse(
+            "continuing-education-facility", kwargs={"facility_id": tenant.facilities[0].pk}
+        ),
+        admin_client,
+    ),
+    Endpoint(
+        "continuing education employee",
+        lambda tenant: reverse(
+            "continuing-education-employee", kwargs={"employee_id": tenant.employees[0].pk}
+        ),
+        admin_client,
+    ),
+    Endpoint("employees pdf", employees_pdf_url, admin_client),
+    Endpoint("upcoming tasks pdf", upcoming_tasks_pdf_url, admin_client),
+]
+
+
+def seed_facilities(tenant, count):
+    """Adds the residents and courses browsed by the api to the tenant."""
+    for facility in tenant.facilities:
+        f.ResidentFactory.create_batch(count, facility=facility)
+    for task_type in tenant.task_types + [tenant.training_type]:
+        if not hasattr(task_type, "course"):
+            course = f.CourseFactory(task_type=task_type, published=True)
+            f.CourseItemFactory.create_batch(3, course=course)
+
+
+@pytest.fixture
+def api_tenant(tenant):
+    trial_end = timezone.now() + timedelta(days=30)
+    for facility in tenant.facilities:
+        for module in (Plan.Module.staff, Plan.Module.resident):
+            f.SubscriptionFactory(
+                facility=facility,
+                status=Subscription.Status.trialing,
+                billing_interval__plan__module=module,
+                trial_end=trial_end,
+            )
+    employee = tenant.employees[0]
+    f.FacilityUserFactory(
+        user=employee.user, facility=employee.facility, role=FacilityUser.Role.trainings_user
+    )
+    seed_facilities(tenant, tenant.size.employees)
+    return tenant
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS, ids=lambda endpoint: endpoint.name)
+def test_endpoint(api_tenant, benchmark, endpoint):
+    """
+    Requests the endpoint before and after doubling the rows of the tenant. The
+    query count of an endpoint must not depend on the number of rows it returns.
+    """
+    results = []
+    for rows in (1, 2):
+        if rows > 1:
+            add_employees(api_tenant, api_tenant.size.employees)
+            seed_facilities(api_tenant, api_tenant.size.employees)
+
+        url = endpoint.url(api_tenant)
+        client = endpoint.client(api_tenant)
+        with benchmark(endpoint.name, rows=rows) as result:
+            r = client.get(url)
+        h.responseOk(r)
+        result["bytes"] = len(r.content)
+        results.append(result)
+
+        baseline = benchmark.baseline_for(result)
+        if baseline:
+            assert result["queries"] <= baseline["queries"], "{} queries, was {}".format(
+                result["queries"], baseline["queries"]
+            )
+
+    small, large = results
+    assert large["queries"] == small["queries"], "N+1: {} queries for {}x the rows, was {}".format(
+        large["queries"], large["rows"], small["queries"]
+    )
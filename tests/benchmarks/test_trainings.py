@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+import pytest
+from freezegun import freeze_time
+
+from apps.trainings.continuing_education import compute_compliance_for_facility
+from apps.trainings.models import Task
+from apps.trainings.tasks import (
+    EmailCompletedTrainingsReminderToday,
+    EmailEmployeeEvents,
+    EmailFacilityCompliant,
+    EmailOverdueTasksThisWeek,
+    EmailScheduledTrainingsToday,
+    ResetPrerequisiteTasks,
+    apply_global_requirement,
+    reapply_employee_responsibilities,
+)
+
+from .utils import requires_benchmark
+
+import tests.factories as f
+
+pytestmark = [pytest.mark.django_db, requires_benchmark]
+
+
+def test_task_complete(tenant, benchmark):
+    task = Task.objects.filter(employee__in=tenant.employees).first()
+
+    with benchmark("Task.complete"):
+        task.complete(date.today())
+
+
+def test_training_event_finish(tenant, benchmark):
+    facility = tenant.facilities[0]
+    event = f.TrainingEventFactory(
+        training_for=tenant.training_type,
+        facility=facility,
+        attendees=facility.employee_set.all(),
+    )
+
+    with benchmark("TrainingEvent.finish"):
+        event.finish()
+
+
+def test_apply_global_requirement(tenant, benchmark):
+    global_requirement = f.GlobalRequirementFactory()
+
+    with benchmark("apply_global_requirement"):
+        apply_global_requirement(global_requirement.pk)
+
+
+def test_reapply_employee_responsibilities(tenant, benchmark):
+    with benchmark("reapply_employee_responsibilities"):
+        reapply_employee_responsibilities()
+
+
+def test_reset_prerequisite_tasks(tenant, benchmark):
+    with benchmark("ResetPrerequisiteTasks.do"):
+        ResetPrerequisiteTasks().do()
+
+
+def test_compute_compliance_for_facility(tenant, benchmark):
+    with benchmark("compute_compliance_for_facility"):
+        for facility, user in zip(tenant.facilities, tenant.users):
+            compute_compliance_for_facility(facility, date.today(), user)
+
+
+@pytest.mark.parametrize(
+    "job",
+    [
+        EmailEmployeeEvents,
+        EmailScheduledTrainingsToday,
+        EmailOverdueTasksThisWeek,
+        EmailFacilityCompliant,
+        EmailCompletedTrainingsReminderToday,
+    ],
+)
+def test_morning_emails(tenant, benchmark, job):
+    today = date.today()
+    # The compliance emails are only sent on mondays and wednesdays. The
+    # benchmark itself has to keep reading the real clock.
+    monday = today + timedelta(days=7 - today.weekday())
+
+    with freeze_time(monday, ignore=["tests.benchmarks"]), benchmark(job.__name__):
+        job().do()
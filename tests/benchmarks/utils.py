@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from apps.facilities.models import FacilityUser
+
+import tests.factories as f
+
+ENABLED = bool(os.environ.get("BENCHMARK"))
+OUTPUT = os.environ.get("BENCHMARK_OUTPUT", "benchmark.json")
+BASELINE = os.environ.get("BENCHMARK_BASELINE")
+
+requires_benchmark = pytest.mark.skipif(
+    not ENABLED, reason="Benchmarks only run with BENCHMARK=1 set in the environment."
+)
+
+TenantSize = namedtuple("TenantSize", "facilities employees task_types")
+Tenant = namedtuple(
+    "Tenant",
+    "size facilities positions responsibilities users employees task_types training_type",
+)
+
+
+def tenant_size():
+    """The size of the generated tenant, configurable from the environment."""
+    return TenantSize(
+        facilities=int(os.environ.get("BENCHMARK_FACILITIES", 2)),
+        employees=int(os.environ.get("BENCHMARK_EMPLOYEES", 10)),
+        task_types=int(os.environ.get("BENCHMARK_TASK_TYPES", 5)),
+    )
+
+
+def build_tenant(size):
+    """
+    Creates `size.facilities` facilities with `size.employees` employees each,
+    all of them required to take `size.task_types` task types plus a continuing
+    education training.
+
+    The task types form a small dependency graph (the second one supersedes the
+    first, the third one has the second as prerequisite and the last one is an
+    antirequisite of the first) and every employee has a completed history of
+    the first type and of the training, so the recompute paths have work to do.
+    """
+    task_types = [f.TaskTypeFactory(validity_period="365 days") for _ in range(size.task_types)]
+    if len(task_types) > 1:
+        task_types[1].supersedes.set([task_types[0]])
+    if len(task_types) > 2:
+        task_types[2].prerequisites.set([task_types[1]])
+    training_type = f.TaskTypeFactory(is_training=True, validity_period="365 days")
+    f.TaskTypeEducationCreditFactory(tasktype=training_type)
+
+    facilities, positions, responsibilities, users = [], [], [], []
+    for i in range(size.facilities):
+        facility = f.FacilityFactory(name="benchmark facility {}".format(i))
+        responsibility = f.ResponsibilityFactory(facility=facility)
+        f.ResponsibilityEducationRequirementFactory(
+            responsibility=responsibility,
+            interval_base=task_types[0],
+            timeperiod=timedelta(days=30),
+            start_over=True,
+        )
+        facility_user = f.FacilityUserFactory(
+            facility=facility, role=FacilityUser.Role.account_admin
+        )
+        facilities.append(facility)
+        positions.append(f.PositionFactory(responsibilities=[responsibility]))
+        responsibilities.append(responsibility)
+        users.append(facility_user.user)
+
+    for task_type in task_types + [training_type]:
+        task_type.required_for.set(responsibilities)
+
+    tenant = Tenant(
+        size=size,
+        facilities=facilities,
+        positions=positions,
+        responsibilities=responsibilities,
+        users=users,
+        employees=[],
+        task_types=task_types,
+        training_type=training_type,
+    )
+    add_employees(tenant, size.employees)
+
+    if len(task_types) > 1:
+        f.AntirequisiteFactory(
+            task_type=task_types[-1],
+            antirequisite_of=task_types[0],
+            valid_after_hire_date=date(2000, 1, 1),
+        )
+
+    return tenant
+
+
+def add_employees(tenant, count):
+    """Adds `count` employees, with their tasks and histories, to every facility."""
+    today = date.today()
+    for facility, position, responsibility in zip(
+        tenant.facilities, tenant.positions, tenant.responsibilities
+    ):
+        for _ in range(count):
+            employee = f.EmployeeFactory(facility=facility, receives_emails=True)
+            employee.positions.set([position])
+            employee.other_responsibilities.set([responsibility])
+            f.TaskHistoryFactory(
+                employee=employee,
+                type=tenant.task_types[0],
+                completion_date=today - timedelta(days=60),
+                expiration_date=today + timedelta(days=300),
+            )
+            f.TaskHistoryFactory(
+                employee=employee,
+                type=tenant.training_type,
+                completion_date=today - timedelta(days=10),
+                expiration_date=today + timedelta(days=355),
+                credit_hours=2,
+            )
+            tenant.employees.append(employee)
+
+
+class Benchmark(object):
+    """
+    Times blocks of code and counts the queries they run.
+
+    The result of a block is yielded as a dict, which is filled in when the
+    block exits and can be extended by the caller (e.g. with a payload size).
+    """
+
+    def __init__(self, results, name, baseline=None):
+        self.results = results
+        self.name = name
+        self.baseline = baseline or {}
+
+    @contextmanager
+    def __call__(self, operation, **extra):
+        result = {"test": self.name, "operation": operation}
+        result.update(extra)
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            yield result
+            elapsed = time.perf_counter() - start
+        result["seconds"] = round(elapsed, 4)
+        result["queries"] = len(context.captured_queries)
+        self.results.append(result)
+
+    def baseline_for(self, result):
+        """Returns the result of the same operation in the baseline run, if any."""
+        return self.baseline.get(result_key(result))
+
+
+MEASUREMENTS = {"seconds", "queries", "bytes"}
+
+
+def result_key(result):
+    return tuple(sorted((k, str(v)) for k, v in result.items() if k not in MEASUREMENTS))
+
+
+def load_baseline(path=BASELINE):
+    """Loads the results of a previous run, see `BENCHMARK_OUTPUT`."""
+    if not path:
+        return {}
+    with open(path) as baseline:
+        return {result_key(result): result for result in json.load(baseline)["results"]}
+
+
+def write_results(results, path=OUTPUT):
+    with open(path, "w") as output:
+        json.dump({"tenant": tenant_size()._asdict(), "results": results}, output, indent=2)
@@ -0,0 +1,258 @@
+import json
+from datetime import date, timedelta
+
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.api.compiled import compile_serializer
+from apps.api.residents.serializers import ResidentBedHoldSerializer, ResidentCloudCareSerializer
+from apps.api.trainings.course_serializers import CourseSerializer
+from apps.api.trainings.serializers import (
+    EmployeeCloudCareSerializer,
+    EmployeeReadSerializer,
+    PositionGroupReadSerializer,
+    PositionSerializer,
+    ResponsibilityReadWriteSerializer,
+    TaskHistoryReadSerializer,
+    TaskReadSerializer,
+)
+from apps.api.trainings.views import CourseViewSet, ResponsibilityViewSet
+from apps.residents.models import Resident, ResidentBedHold
+from apps.trainings.models import (
+    Course,
+    Employee,
+    Position,
+    PositionGroup,
+    Responsibility,
+    Task,
+    TaskHistory,
+    TaskHistoryCertificatePage,
+    TaskType,
+)
+
+import tests.factories as f
+import tests.helpers as h
+from tests.mixins import ApiMixin
+
+pytestmark = pytest.mark.django_db
+
+
+def assert_parity(serializer_class, queryset, context=None):
+    compiled = compile_serializer(serializer_class)
+    assert compiled is not None
+
+    expected = JSONRenderer().render(
+        serializer_class(queryset, many=True, context=context or {}).data
+    )
+    rendered = JSONRenderer().render(
+        compiled.serialize(compiled.values(queryset, context), context)
+    )
+    # Field by field first, so a failure names the field.
+    expected_rows, rows = json.loads(expected), json.loads(rendered)
+    assert len(rows) == len(expected_rows)
+    for row, expected_row in zip(rows, expected_rows):
+        assert row.keys() == expected_row.keys()
+        for name in expected_row:
+            assert row[name] == expected_row[name], name
+    assert rendered == expected
+
+
+def get_subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from get_subclasses(subclass)
+
+
+def get_reached_compiled_fields(serializer_class):
+    """
+    Returns the (serializer class, name) of the `compiled_fields` reached when
+    serializing with `serializer_class`, nested serializers included.
+    """
+    reached = set()
+    for name, field in serializer_class().fields.items():
+        owner = next(
+            (
+                cls
+                for cls in serializer_class.__mro__
+                if name in vars(cls).get("compiled_fields", {})
+            ),
+            None,
+        )
+        if owner is not None:
+            reached.add((owner, name))
+            nested = owner.compiled_fields[name].serializer
+            if nested is not None:
+                reached |= get_reached_compiled_fields(nested)
+        child = getattr(field, "child", field)
+        if isinstance(child, serializers.ModelSerializer):
+            reached |= get_reached_compiled_fields(type(child))
+    return reached
+
+
+def get_request(user=None, **params):
+    request = Request(APIRequestFactory().get("/", params))
+    if user is not None:
+        request.user = user
+    return request
+
+
+@pytest.fixture
+def employee():
+    return f.EmployeeFactory()
+
+
+@pytest.fixture
+def employees():
+    responsibilities = [f.ResponsibilityFactory(), f.ResponsibilityFactory()]
+    positions = [
+        f.PositionFactory(responsibilities=responsibilities),
+        f.PositionFactory(responsibilities=responsibilities[:1]),
+        f.PositionFactory(),
+    ]
+    employee = f.EmployeeFactory()
+    employee.positions.set(positions[:2])
+    f.EmployeeFactory().positions.set(positions[2:])
+    f.EmployeeFactory()
+
+
+def test_employees_parity(employees):
+    assert_parity(EmployeeCloudCareSerializer, Employee.objects.order_by("pk"))
+
+
+def test_positions_parity(employees):
+    assert_parity(PositionSerializer, Position.objects.order_by("pk"))
+
+
+def test_responsibilities_parity(employees):
+    assert_parity(ResponsibilityReadWriteSerializer, Responsibility.objects.order_by("pk"))
+
+
+def test_position_groups_parity():
+    PositionGroup.objects.create(name="Nurses")
+    assert_parity(PositionGroupReadSerializer, PositionGroup.objects.order_by("pk"))
+
+
+def test_residents_parity():
+    f.ResidentFactory(date_of_birth=date(1940, 5, 1), sex="f")
+    f.ResidentFactory()
+    assert_parity(ResidentCloudCareSerializer, Resident.objects.order_by("pk"))
+
+
+def test_bed_holds_parity():
+    f.ResidentBedHoldFactory()
+    f.ResidentBedHoldFactory(notes="")
+    assert_parity(ResidentBedHoldSerializer, ResidentBedHold.objects.order_by("pk"))
+
+
+def test_empty_list():
+    assert_parity(EmployeeCloudCareSerializer, Employee.objects.none())
+
+
+def test_tasks_parity(employee):
+    course = f.CourseFactory(published=True)
+    task_type = course.task_type
+    task_type.required_for.set([f.ResponsibilityFactory(), f.ResponsibilityFactory()])
+    f.TaskTypeEducationCreditFactory(tasktype=task_type)
+    TaskType.objects.filter(pk=task_type.pk).update(image="tasktype/image.png")
+    task = f.TaskFactory(employee=employee, type=task_type)
+    event = f.TrainingEventFactory(training_for=task_type)
+    f.TrainingEventFactory(
+        training_for=task_type,
+        start_time=event.start_time - timedelta(days=1),
+        end_time=event.end_time - timedelta(days=1),
+    ).employee_tasks.add(task)
+    event.employee_tasks.add(task)
+    f.TaskFactory(employee=employee)
+    f.TaskFactory(type=task_type)
+
+    queryset = Task.objects.order_by("pk")
+    assert_parity(TaskReadSerializer, queryset, {"request": get_request(employee.user)})
+    assert_parity(TaskReadSerializer, queryset)
+
+
+def test_task_histories_parity():
+    certificate = f.TaskHistoryCertificateFactory()
+    for page in ("certificates/1.pdf", "certificates/2.pdf"):
+        TaskHistoryCertificatePage.objects.create(certificate=certificate, page=page)
+    f.TaskHistoryCertificateFactory()
+    f.TaskHistoryFactory(type=f.CourseFactory().task_type)
+
+    assert_parity(TaskHistoryReadSerializer, TaskHistory.objects.order_by("pk"))
+
+
+def test_courses_parity(employee):
+    course = f.CourseFactory(published=True)
+    items = f.CourseItemFactory.create_batch(2, course=course)
+    f.CourseItemBooleanFactory(item=items[0])
+    f.EmployeeCourseFactory(employee=employee, course=course)
+    f.EmployeeCourseFactory(course=course)
+    f.EmployeeCourseItemFactory(employee=employee, course_item=items[1])
+    f.CourseFactory()
+
+    queryset = Course.objects.order_by("pk")
+    assert_parity(CourseSerializer, queryset, {"request": get_request(employee.user)})
+    assert_parity(CourseSerializer, queryset)
+
+
+def test_every_compiled_field_has_a_parity_test():
+    declared = {
+        (cls, name)
+        for cls in get_subclasses(serializers.Serializer)
+        for name in vars(cls).get("compiled_fields", {})
+    }
+    reached = set()
+    # The serializers of the parity tests above.
+    for serializer_class in (TaskReadSerializer, TaskHistoryReadSerializer, CourseSerializer):
+        reached |= get_reached_compiled_fields(serializer_class)
+
+    assert declared
+    assert declared <= reached, "Without a parity test: {}".format(declared - reached)
+
+
+def test_method_fields_arent_compiled():
+    assert compile_serializer(EmployeeReadSerializer) is None
+
+
+def test_expanded_list_isnt_compiled():
+    view = CourseViewSet()
+    view.request = get_request(expand="items")
+    assert not view.can_compile_list(CourseSerializer, Course.objects.all())
+
+    view.request = get_request()
+    assert view.can_compile_list(CourseSerializer, Course.objects.all())
+
+
+def test_custom_prefetches_arent_compiled():
+    view = ResponsibilityViewSet()
+    view.request = get_request()
+    queryset = Responsibility.objects.prefetch_related(
+        Prefetch("position_set", queryset=Position.objects.filter(name="Nurse"))
+    )
+    assert not view.can_compile_list(ResponsibilityReadWriteSerializer, queryset)
+
+    queryset = Responsibility.objects.prefetch_related("position_set")
+    assert view.can_compile_list(ResponsibilityReadWriteSerializer, queryset)
+
+
+class TestCompiledList(ApiMixin):
+    view_name = "cloudcare-employees-list"
+
+    def test_relations_are_fetched_once(self, cloudcare_client, employees):
+        r = cloudcare_client.get(self.reverse())
+        h.responseOk(r)
+        assert len(r.data) == 3
+
+        with CaptureQueriesContext(connection) as queries:
+            cloudcare_client.get(self.reverse())
+        f.EmployeeFactory().positions.set(Position.objects.all())
+        with CaptureQueriesContext(connection) as more_queries:
+            cloudcare_client.get(self.reverse())
+
+        assert len(more_queries) == len(queries)
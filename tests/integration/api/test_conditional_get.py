@@ -0,0 +1,130 @@
+import pytest
+
+from apps.api.trainings.views import CourseViewSet
+from apps.trainings.models import Course
+
+import tests.factories as f
+import tests.helpers as h
+from tests.mixins import ApiMixin
+
+pytestmark = pytest.mark.django_db
+
+
+class TestConditionalGet(ApiMixin):
+    view_name = "position-list"
+
+    def test_unchanged_list_isnt_sent_again(self, manager_client, resident_and_staff_subscription):
+        f.PositionFactory()
+        r = manager_client.get(self.reverse())
+        h.responseOk(r)
+        assert r["ETag"]
+        assert "private" in r["Cache-Control"]
+
+        r = manager_client.get(self.reverse(), HTTP_IF_NONE_MATCH=r["ETag"])
+        assert r.status_code == 304
+        assert not r.content
+
+    def test_changes_are_sent(self, manager_client, resident_and_staff_subscription):
+        position = f.PositionFactory()
+        etag = manager_client.get(self.reverse())["ETag"]
+
+        position.name = "Nurse"
+        position.save()
+        r = manager_client.get(self.reverse(), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+        assert r["ETag"] != etag
+        etag = r["ETag"]
+
+        position.delete()
+        r = manager_client.get(self.reverse(), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+        assert r.data == []
+
+    def test_related_changes_are_sent(self, manager_client, resident_and_staff_subscription):
+        responsibility = f.ResponsibilityFactory()
+        f.PositionFactory(responsibilities=[responsibility])
+        etag = manager_client.get(self.reverse())["ETag"]
+
+        responsibility.name = "Kitchen"
+        responsibility.save()
+        r = manager_client.get(self.reverse(), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+
+    def test_swapped_members_are_sent(self, manager_client, resident_and_staff_subscription):
+        kitchen, laundry = f.ResponsibilityFactory(), f.ResponsibilityFactory()
+        cook = f.PositionFactory(responsibilities=[kitchen])
+        washer = f.PositionFactory(responsibilities=[laundry])
+        etag = manager_client.get(self.reverse())["ETag"]
+
+        cook.responsibilities.set([laundry])
+        washer.responsibilities.set([kitchen])
+        r = manager_client.get(self.reverse(), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+
+    def test_etag_depends_on_the_query(self, manager_client, resident_and_staff_subscription):
+        f.PositionFactory()
+        etag = manager_client.get(self.reverse())["ETag"]
+
+        r = manager_client.get(self.reverse(), {"name": "x"}, HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+
+    def test_retrieve(self, manager_client, resident_and_staff_subscription):
+        self.view_name = "position-detail"
+        position = f.PositionFactory()
+        etag = manager_client.get(self.reverse(kwargs={"pk": position.pk}))["ETag"]
+
+        r = manager_client.get(self.reverse(kwargs={"pk": position.pk}), HTTP_IF_NONE_MATCH=etag)
+        assert r.status_code == 304
+
+        r = manager_client.get(self.reverse(kwargs={"pk": 0}), HTTP_IF_NONE_MATCH=etag)
+        h.responseNotFound(r)
+
+
+class TestCourseConditionalGet(ApiMixin):
+    view_name = "courses-list"
+
+    def test_unchanged_list_isnt_sent_again(self, employee_client):
+        f.CourseFactory(published=True)
+        r = employee_client.get(self.reverse())
+        h.responseOk(r)
+        assert r["ETag"]
+        assert r["Last-Modified"]
+        assert "private" in r["Cache-Control"]
+
+        r = employee_client.get(self.reverse(), HTTP_IF_NONE_MATCH=r["ETag"])
+        assert r.status_code == 304
+        assert not r.content
+
+    def test_object_list_keeps_the_validators(self, employee_client):
+        f.CourseFactory(published=True)
+        params = {"object": "true"}
+        r = employee_client.get(self.reverse(), params)
+        h.responseOk(r)
+        assert r.data["count"] == 1
+        assert r["ETag"]
+        assert "private" in r["Cache-Control"]
+
+        r = employee_client.get(self.reverse(), params, HTTP_IF_NONE_MATCH=r["ETag"])
+        assert r.status_code == 304
+
+    def test_progress_changes_are_sent(self, employee_client):
+        course = f.CourseFactory(published=True)
+        etag = employee_client.get(self.reverse())["ETag"]
+
+        f.EmployeeCourseFactory(employee=employee_client.user.employee, course=course)
+        r = employee_client.get(self.reverse(), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+        assert r.data[0]["course_taken"]
+
+
+def test_related_rows_are_counted_separately():
+    course = f.CourseFactory()
+    for item in f.CourseItemFactory.create_batch(2, course=course):
+        f.CourseItemTextFactory.create_batch(2, item=item)
+        f.CourseItemVideoFactory(item=item)
+
+    state = CourseViewSet().get_conditional_get_state(Course.objects.all())
+    assert state["count"] == 1
+    assert state["items_count"] == 2
+    assert state["items__texts_count"] == 4
+    assert state["items__videos_count"] == 2
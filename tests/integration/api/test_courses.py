@@ -1,6 +1,8 @@
 from datetime import timedelta
 
 from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 import mock
@@ -11,6 +13,7 @@ from rest_framework.test import APIClient
 from apps.facilities.models import FacilityUser, TrainingsTimedAuthToken
 from apps.trainings.models import (
     EmployeeCourse,
+    EmployeeCourseItem,
     TaskHistory,
     TaskHistoryCertificate,
     TaskHistoryCertificatePage,
@@ -461,6 +464,143 @@ class TestCourseOpen(ApiMixin):
         assert r.data["task"]["id"] != task.id  # different task id created
 
 
+class TestCourseBundle(ApiMixin):
+    view_name = "courses-bundle"
+
+    def make_course(self, items=1):
+        course = f.CourseFactory(published=True)
+        for _ in range(items):
+            item = f.CourseItemFactory(course=course)
+            f.CourseItemTextFactory(item=item)
+            f.CourseItemBooleanFactory(item=item)
+            choice = f.CourseItemMultiChoiceFactory(item=item)
+            option = f.MultiChoiceOptionFactory()
+            choice.options.add(option)
+            choice.answers.add(option)
+        return course
+
+    def test_bundle_has_the_content_and_progress(self, employee_client):
+        course = self.make_course(items=2)
+        item = course.items.first()
+        f.EmployeeCourseItemFactory(
+            course_item=item, employee=employee_client.user.employee, is_correct=True
+        )
+        r = employee_client.get(self.reverse(kwargs={"pk": course.pk}))
+        h.responseOk(r)
+
+        content = r.data["content"]
+        assert content["id"] == course.pk
+        assert content["max_points"] == 4
+        assert len(content["items"]) == 2
+        choice = content["items"][0]["choices"][0]
+        assert choice["options"][0]["label"]
+        assert choice["answers"] == [choice["options"][0]["id"]]
+
+        progress = r.data["progress"]
+        assert progress["task"]["id"]
+        assert progress["last_started_course_item"] == item.pk
+        assert progress["last_completed_course_item"] is None
+        assert progress["current_score"] == 1
+        assert [i["course_item"] for i in progress["items"]] == [item.pk]
+
+    def test_unchanged_bundle_isnt_sent_again(self, employee_client):
+        course = self.make_course()
+        employee_client.get(self.reverse(kwargs={"pk": course.pk}))
+        r = employee_client.get(self.reverse(kwargs={"pk": course.pk}))
+        h.responseOk(r)
+
+        r = employee_client.get(
+            self.reverse(kwargs={"pk": course.pk}), HTTP_IF_NONE_MATCH=r["ETag"]
+        )
+        assert r.status_code == 304
+
+    def test_edits_and_progress_are_sent(self, employee_client):
+        course = self.make_course()
+        employee_client.get(self.reverse(kwargs={"pk": course.pk}))
+        etag = employee_client.get(self.reverse(kwargs={"pk": course.pk}))["ETag"]
+
+        text = f.CourseItemTextFactory(item=course.items.first())
+        r = employee_client.get(self.reverse(kwargs={"pk": course.pk}), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+        assert len(r.data["content"]["items"][0]["texts"]) == 2
+        etag = r["ETag"]
+
+        f.EmployeeCourseItemFactory(course_item=text.item, employee=employee_client.user.employee)
+        r = employee_client.get(self.reverse(kwargs={"pk": course.pk}), HTTP_IF_NONE_MATCH=etag)
+        h.responseOk(r)
+        assert r.data["progress"]["last_started_course_item"] == text.item.pk
+
+    def test_queries_dont_depend_on_the_items(self, employee_client):
+        course = self.make_course(items=1)
+        bigger_course = self.make_course(items=5)
+        for c in (course, bigger_course):
+            f.TaskFactory(type=c.task_type, employee=employee_client.user.employee)
+
+        with CaptureQueriesContext(connection) as queries:
+            employee_client.get(self.reverse(kwargs={"pk": course.pk}))
+        with CaptureQueriesContext(connection) as more_queries:
+            employee_client.get(self.reverse(kwargs={"pk": bigger_course.pk}))
+
+        assert len(more_queries) == len(queries)
+
+
+class TestCourseAnswers(ApiMixin):
+    view_name = "courses-answers"
+
+    def test_user_can_answer_the_items_at_once(self, employee_client):
+        employee = employee_client.user.employee
+        course = f.CourseFactory(published=True)
+        started_item = f.CourseItemFactory(course=course)
+        f.CourseItemBooleanFactory(item=started_item, answer=True)
+        f.EmployeeCourseItemFactory(course_item=started_item, employee=employee)
+        choice = f.CourseItemMultiChoiceFactory(item=f.CourseItemFactory(course=course))
+        option = f.MultiChoiceOptionFactory()
+        choice.answers.add(option)
+        text = f.CourseItemTextFactory(item=f.CourseItemFactory(course=course))
+        data = {
+            "answers": [
+                {"course_item": started_item.pk, "answer": True},
+                {"course_item": choice.item_id, "answer": option.pk + 1},
+                {"course_item": text.item_id},
+            ]
+        }
+
+        r = employee_client.post(self.reverse(kwargs={"pk": course.pk}), data)
+        h.responseOk(r)
+        assert r.data["total"] == 2
+        assert r.data["score"] == 1
+        assert len(r.data["items"]) == 3
+        items = EmployeeCourseItem.objects.filter(employee=employee)
+        assert items.count() == 3
+        assert not items.filter(completed_at__isnull=True).exists()
+        assert EmployeeCourse.objects.filter(employee=employee, course=course).exists()
+
+        data = {"answers": [{"course_item": choice.item_id, "answer": option.pk}]}
+        r = employee_client.post(self.reverse(kwargs={"pk": course.pk}), data)
+        h.responseOk(r)
+        assert r.data["score"] == 2
+        assert items.count() == 3
+
+    def test_answers_in_the_future_are_rejected(self, employee_client):
+        course = f.CourseFactory(published=True)
+        item = f.CourseItemFactory(course=course)
+        completed_at = timezone.now() + timedelta(hours=1)
+        data = {"answers": [{"course_item": item.pk, "completed_at": completed_at.isoformat()}]}
+
+        r = employee_client.post(self.reverse(kwargs={"pk": course.pk}), data)
+        h.responseBadRequest(r)
+
+    def test_items_of_other_courses_are_rejected(self, employee_client):
+        course = f.CourseFactory(published=True)
+        f.CourseItemFactory(course=course)
+        other_item = f.CourseItemFactory()
+        data = {"answers": [{"course_item": other_item.pk, "answer": True}]}
+
+        r = employee_client.post(self.reverse(kwargs={"pk": course.pk}), data)
+        h.responseBadRequest(r)
+        assert not EmployeeCourseItem.objects.exists()
+
+
 class TestCourseComplete(ApiMixin):
     view_name = "courses-complete"
     view_detail = "courses-detail"
@@ -488,7 +628,7 @@ class TestCourseComplete(ApiMixin):
             is_correct=True,
         )
         f.EmployeeCourseItemFactory(
-            course_item=course_item,
+            course_item=f.CourseItemFactory(course=course),
             employee=employee_client.user.employee,
             is_correct=False,
         )
@@ -1,7 +1,8 @@
 import base64
 from datetime import timedelta
 
-from django.test.utils import freeze_time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, freeze_time
 from django.utils import timezone
 
 import mock
@@ -838,6 +839,38 @@ class TestResidentsList(ApiMixin):
         h.responseOk(r)
         assert set(r.data[0].keys()) == {"first_name", "last_name"}
 
+    def test_limited_fields_only_query_what_they_need(
+        self, account_admin_client, resident_and_staff_subscription
+    ):
+        resident = f.ResidentFactory()
+        ResidentMedication.objects.create(resident=resident, medication="Aspirin")
+
+        with CaptureQueriesContext(connection) as queries:
+            r = account_admin_client.get(
+                self.reverse(query_params={"fields": "first_name,last_name"})
+            )
+
+        h.responseOk(r)
+        sql = " ".join(query["sql"] for query in queries)
+        assert '"residents_resident"."first_name"' in sql
+        assert '"residents_resident"."diagnosis"' not in sql
+        assert "residents_residentmedication" not in sql
+
+    def test_limited_fields_compute_their_values(
+        self, account_admin_client, resident_and_staff_subscription
+    ):
+        resident = f.ResidentFactory(date_of_birth=timezone.now().date() - timedelta(days=800))
+        ResidentMedication.objects.create(resident=resident, medication="Aspirin")
+
+        r = account_admin_client.get(
+            self.reverse(query_params={"fields": "age,medications,has_examiners_assigned"})
+        )
+
+        h.responseOk(r)
+        assert r.data[0]["age"] == resident.age
+        assert [m["medication"] for m in r.data[0]["medications"]] == ["Aspirin"]
+        assert r.data[0]["has_examiners_assigned"] is False
+
     def test_filter_by_is_active_can_include_active_residents(
         self, account_admin_client, resident_and_staff_subscription
     ):
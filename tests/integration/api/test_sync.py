@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+import pytest
+
+from apps.api.trainings.views import SYNC_EPOCH
+from apps.trainings.models import Employee, Task, Tombstone
+from apps.trainings.tasks import PruneTombstones
+
+import tests.factories as f
+import tests.helpers as h
+from tests.mixins import ApiMixin
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def no_overlap(settings):
+    settings.SYNC_CURSOR_OVERLAP = timedelta(0)
+
+
+class TestSync(ApiMixin):
+    view_name = "sync"
+
+    def test_guest_cant_sync(self, client):
+        r = client.get(self.reverse())
+        h.responseUnauthorized(r)
+
+    def test_first_sync_sends_everything(self, employee_client):
+        employee = Employee.objects.get()
+        task = f.TaskFactory(employee=employee)
+        f.TaskFactory()
+
+        r = employee_client.get(self.reverse())
+        h.responseOk(r)
+        assert r.data["reset"]
+        assert r.data["cursor"]
+        assert r.data["employee"]["id"] == employee.pk
+        assert [data["id"] for data in r.data["tasks"]] == [task.pk]
+
+    def test_sync_sends_the_changes(self, employee_client):
+        employee = Employee.objects.get()
+        task = f.TaskFactory(employee=employee)
+        history = f.TaskHistoryFactory(employee=employee)
+        cursor = employee_client.get(self.reverse()).data["cursor"]
+
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        h.responseOk(r)
+        assert not r.data["reset"]
+        assert r.data["employee"] is None
+        assert r.data["tasks"] == []
+        assert r.data["task_histories"] == []
+
+        history_pk = history.pk
+        task.save()
+        history.delete()
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        assert [data["id"] for data in r.data["tasks"]] == [task.pk]
+        assert r.data["deleted"]["task_histories"] == [history_pk]
+
+        r = employee_client.get(self.reverse(), {"cursor": r.data["cursor"]})
+        assert r.data["tasks"] == []
+        assert r.data["deleted"]["task_histories"] == []
+
+    def test_sync_sends_the_course_progress(self, employee_client):
+        employee = Employee.objects.get()
+        course = f.CourseFactory(published=True)
+        f.CourseFactory(published=True)
+        cursor = employee_client.get(self.reverse()).data["cursor"]
+
+        employee_course = f.EmployeeCourseFactory(employee=employee, course=course)
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        assert [data["id"] for data in r.data["courses"]] == [course.pk]
+        cursor = r.data["cursor"]
+
+        employee_course_pk = employee_course.pk
+        employee_course.delete()
+        course.published = False
+        course.save()
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        assert r.data["courses"] == []
+        assert r.data["deleted"]["employee_courses"] == [employee_course_pk]
+        assert r.data["deleted"]["courses"] == [course.pk]
+
+    def test_sync_sends_the_deleted_courses(self, employee_client):
+        course = f.CourseFactory(published=True)
+        item = f.CourseItemFactory(course=f.CourseFactory(published=True))
+        cursor = employee_client.get(self.reverse()).data["cursor"]
+
+        course_pk = course.pk
+        course.delete()
+        item.delete()
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        assert r.data["deleted"]["courses"] == [course_pk]
+        assert [data["id"] for data in r.data["courses"]] == [item.course_id]
+
+    def test_sync_sends_the_bulk_deletes(self, employee_client):
+        employee = Employee.objects.get()
+        tasks = f.TaskFactory.create_batch(2, employee=employee)
+        cursor = employee_client.get(self.reverse()).data["cursor"]
+
+        Task.objects.filter(employee=employee).delete()
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        assert sorted(r.data["deleted"]["tasks"]) == sorted(task.pk for task in tasks)
+
+    def test_expired_cursor_sends_everything(self, employee_client, settings):
+        since = timezone.now() - settings.SYNC_TOMBSTONE_RETENTION - timedelta(days=1)
+        cursor = str((since - SYNC_EPOCH) // timedelta(microseconds=1))
+        r = employee_client.get(self.reverse(), {"cursor": cursor})
+        h.responseOk(r)
+        assert r.data["reset"]
+
+    def test_invalid_cursor(self, employee_client):
+        r = employee_client.get(self.reverse(), {"cursor": "yesterday"})
+        h.responseBadRequest(r)
+
+
+def test_prune_tombstones(settings):
+    employee = f.EmployeeFactory()
+    f.TaskFactory(employee=employee).delete()
+    old = f.TaskFactory(employee=employee)
+    old_pk = old.pk
+    old.delete()
+    Tombstone.objects.filter(object_id=old_pk).update(
+        deleted=timezone.now() - settings.SYNC_TOMBSTONE_RETENTION - timedelta(days=1)
+    )
+
+    PruneTombstones().do()
+
+    assert Tombstone.objects.count() == 1
@@ -0,0 +1,47 @@
+import pytest
+
+from apps.alfdirectory.models import Facility as DirectoryFacility
+from apps.alfdirectory.utils import ImportResult, ParsedFacility, import_facilities
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+
+def test_import_syncs_the_directory():
+    unchanged = f.DirectoryFacilityFactory(
+        name="SUNNY ACRES ALF", license_number="12345", oss_beds=4, private_beds=20
+    )
+    changed = f.DirectoryFacilityFactory(
+        name="QUIET PINES", license_number="67890", oss_beds=0, private_beds=6
+    )
+    removed = f.DirectoryFacilityFactory(name="OLD OAKS", license_number="11111")
+    facility = f.FacilityFactory(directory_facility=removed)
+
+    result = import_facilities(
+        [
+            ParsedFacility("SUNNY ACRES ALF", "12345", 4, 20),
+            ParsedFacility("QUIET PINES", "67890", 0, 8),
+            ParsedFacility("NEW HORIZONS", "22222", 2, 10),
+        ]
+    )
+
+    assert result == ImportResult(parsed=3, created=1, updated=1, deleted=1)
+    assert set(DirectoryFacility.objects.values_list("name", flat=True)) == {
+        "SUNNY ACRES ALF",
+        "QUIET PINES",
+        "NEW HORIZONS",
+    }
+    assert DirectoryFacility.objects.get(pk=changed.pk).private_beds == 8
+    assert DirectoryFacility.objects.filter(pk=unchanged.pk).exists()
+    facility.refresh_from_db()
+    assert facility.directory_facility is None
+
+
+def test_import_without_facilities_keeps_the_directory():
+    f.DirectoryFacilityFactory()
+
+    with pytest.raises(ValueError):
+        import_facilities([])
+
+    assert DirectoryFacility.objects.exists()
@@ -0,0 +1,75 @@
+import pytest
+
+from apps.trainings.scoring import check_answer
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def course():
+    return f.CourseFactory()
+
+
+def test_scoring_follows_the_questions(course):
+    boolean_item = f.CourseItemFactory(course=course)
+    f.CourseItemBooleanFactory(item=boolean_item, answer=True)
+    f.CourseItemBooleanFactory(item=boolean_item, answer=False, order=1)
+    choice_item = f.CourseItemFactory(course=course)
+    choice = f.CourseItemMultiChoiceFactory(item=choice_item)
+    option = f.MultiChoiceOptionFactory()
+    choice.answers.add(option)
+    f.CourseItemTextFactory(item=f.CourseItemFactory(course=course))
+
+    course.refresh_from_db()
+    assert course.max_points == 3
+    assert course.scorable_items == 2
+    assert course.answer_key == {str(boolean_item.pk): True, str(choice_item.pk): option.pk}
+
+
+def test_scoring_follows_deletions(course):
+    item = f.CourseItemFactory(course=course)
+    boolean = f.CourseItemBooleanFactory(item=item, answer=True)
+    choice = f.CourseItemMultiChoiceFactory(item=f.CourseItemFactory(course=course))
+    option = f.MultiChoiceOptionFactory()
+    choice.answers.add(option)
+
+    boolean.delete()
+    option.delete()
+    course.refresh_from_db()
+    assert course.scorable_items == 1
+    assert course.answer_key == {str(choice.item_id): None}
+
+    choice.item.delete()
+    course.refresh_from_db()
+    assert course.max_points == 0
+    assert course.answer_key == {}
+
+
+def test_scoring_follows_the_answers_of_an_option(course):
+    choice = f.CourseItemMultiChoiceFactory(item=f.CourseItemFactory(course=course))
+    option = f.MultiChoiceOptionFactory()
+
+    option.choice_answers.add(choice)
+    course.refresh_from_db()
+    assert course.answer_key == {str(choice.item_id): option.pk}
+
+    option.choice_answers.clear()
+    course.refresh_from_db()
+    assert course.answer_key == {str(choice.item_id): None}
+
+
+def test_check_answer(course):
+    boolean = f.CourseItemBooleanFactory(item=f.CourseItemFactory(course=course), answer=False)
+    choice = f.CourseItemMultiChoiceFactory(item=f.CourseItemFactory(course=course))
+    option = f.MultiChoiceOptionFactory()
+    choice.answers.add(option)
+    text = f.CourseItemTextFactory(item=f.CourseItemFactory(course=course))
+    course.refresh_from_db()
+
+    assert check_answer(course, boolean.item_id, False)
+    assert not check_answer(course, boolean.item_id, 0)
+    assert check_answer(course, choice.item_id, option.pk)
+    assert not check_answer(course, choice.item_id, option.pk + 1)
+    assert not check_answer(course, text.item_id, None)
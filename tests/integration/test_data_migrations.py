@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+import pytest
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def migrate(targets):
+    executor = MigrationExecutor(connection)
+    executor.migrate(targets)
+    return executor.loader.project_state(targets).apps
+
+
+@pytest.fixture
+def migrate_back():
+    """Migrates to the targets of the test, then to the latest migrations again."""
+    yield migrate
+    migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+
+def test_duplicate_course_progress_keeps_the_most_complete_row(migrate_back):
+    employee = f.EmployeeFactory()
+    completed_item, started_item = f.CourseItemFactory.create_batch(2)
+    old_apps = migrate_back([("trainings", "0167_course_scoring")])
+    EmployeeCourseItem = old_apps.get_model("trainings", "EmployeeCourseItem")
+    now = timezone.now()
+
+    def progress(course_item, completed_at, modified):
+        row = EmployeeCourseItem.objects.create(
+            employee_id=employee.pk,
+            course_item_id=course_item.pk,
+            started_at=now - timedelta(days=3),
+            completed_at=completed_at,
+        )
+        EmployeeCourseItem.objects.filter(pk=row.pk).update(modified=modified)
+        return row.pk
+
+    # A later completion wins over a later change and over a started row.
+    progress(completed_item, now - timedelta(days=2), now)
+    latest_completion = progress(completed_item, now - timedelta(days=1), now - timedelta(days=1))
+    progress(completed_item, None, now + timedelta(days=1))
+    # Without a completion, the latest changed row wins.
+    latest_change = progress(started_item, None, now)
+    progress(started_item, None, now - timedelta(days=1))
+
+    new_apps = migrate_back([("trainings", "0168_employeecourseitem_unique")])
+
+    EmployeeCourseItem = new_apps.get_model("trainings", "EmployeeCourseItem")
+    assert set(EmployeeCourseItem.objects.values_list("pk", flat=True)) == {
+        latest_completion,
+        latest_change,
+    }
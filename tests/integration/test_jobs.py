@@ -0,0 +1,87 @@
+import datetime
+
+from django.utils import timezone
+
+import pytest
+from mock import patch
+
+from apps.base.jobs import split, start_run
+from apps.base.models import JobRun
+from apps.base.tasks import run_job_part
+from apps.trainings.tasks import EmailMonthlyReminders, email_monthly_reminders
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+JOB_PATH = "apps.trainings.tasks.EmailMonthlyReminders"
+
+
+def test_split_bounds_the_parts():
+    assert split([1, 2, 3, 4, 5], 2) == [[1, 3, 5], [2, 4]]
+    assert split([1, 2], 4) == [[1], [2]]
+    assert split([], 4) == []
+
+
+def test_run_is_recorded_in_the_ledger(outbox, settings):
+    settings.JOB_FANOUT_CONCURRENCY = 2
+    for _ in range(3):
+        f.EmployeeFactory(receives_emails=True)
+
+    email_monthly_reminders()
+
+    run = JobRun.objects.get(name=JOB_PATH)
+    assert run.finished
+    assert (run.parts, run.parts_done) == (2, 2)
+    assert (run.keys, run.keys_done, run.keys_failed) == (3, 3, 0)
+    assert len(outbox) == 3
+
+
+def test_failing_facility_does_not_stop_the_run(outbox):
+    facilities = [f.EmployeeFactory(receives_emails=True).facility for _ in range(2)]
+    do_facility = EmailMonthlyReminders.do_facility
+
+    def fail_first(job, facility):
+        if facility == facilities[0]:
+            raise ValueError
+        do_facility(job, facility)
+
+    with patch.object(EmailMonthlyReminders, "do_facility", fail_first):
+        email_monthly_reminders()
+
+    run = JobRun.objects.get(name=JOB_PATH)
+    assert run.finished
+    assert (run.keys_done, run.keys_failed) == (1, 1)
+    assert len(outbox) == 1
+
+
+def test_run_is_skipped_while_another_one_is_running(outbox):
+    f.EmployeeFactory(receives_emails=True)
+    JobRun.objects.create(name=JOB_PATH, parts=1)
+
+    assert start_run(JOB_PATH, [1]) is None
+    assert len(outbox) == 0
+
+
+def test_stale_run_does_not_block_the_next_ones(outbox, settings):
+    f.EmployeeFactory(receives_emails=True)
+    stale = JobRun.objects.create(name=JOB_PATH, parts=1)
+    JobRun.objects.filter(pk=stale.pk).update(
+        started=timezone.now() - settings.JOB_RUN_STALE_AFTER - datetime.timedelta(minutes=1)
+    )
+
+    email_monthly_reminders()
+
+    assert JobRun.objects.filter(finished__isnull=False).count() == 1
+    assert len(outbox) == 1
+
+
+def test_crashed_part_fails_the_run():
+    run = JobRun.objects.create(name=JOB_PATH, parts=2)
+
+    run_job_part.apply(args=(run.pk, "apps.trainings.tasks.MissingJob", [1]))
+
+    run.refresh_from_db()
+    assert run.finished
+    assert run.failed
+    assert run.parts_done == 0
@@ -0,0 +1,85 @@
+import pytest
+from mock import patch
+
+from apps.base.models import OutboxJob
+from apps.base.outbox import enqueue
+from apps.base.tasks import DispatchOutbox
+from apps.trainings.tasks import (
+    apply_facility_questions,
+    reapply_employee_positions,
+    reapply_position,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def lazy_celery():
+    with patch.object(reapply_position.app.conf, "task_always_eager", False):
+        yield
+
+
+def test_eager_enqueue_runs_the_task():
+    with patch.object(reapply_position, "delay") as delay:
+        enqueue(reapply_position, 1)
+
+    delay.assert_called_once_with(1)
+    assert not OutboxJob.objects.exists()
+
+
+def test_enqueue_publishes_after_commit(lazy_celery, django_capture_on_commit_callbacks):
+    with patch("apps.base.outbox.dispatch_outbox.apply_async") as apply_async:
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            enqueue(reapply_position, 1)
+            enqueue(reapply_position, 2)
+            apply_async.assert_not_called()
+
+    assert len(callbacks) == 1
+    apply_async.assert_called_once()
+
+
+def test_enqueue_merges_identical_jobs(lazy_celery):
+    for _ in range(3):
+        enqueue(reapply_position, 1)
+    enqueue(reapply_position, 2)
+    enqueue(reapply_employee_positions, 1)
+
+    assert OutboxJob.objects.count() == 3
+
+
+def test_enqueue_keeps_the_order_of_the_jobs_of_a_task(lazy_celery):
+    enqueue(apply_facility_questions, 1, [1])
+    enqueue(apply_facility_questions, 1, [2])
+    enqueue(apply_facility_questions, 1, [1])
+
+    assert list(OutboxJob.objects.order_by("id").values_list("args", flat=True)) == [
+        [1, [1]],
+        [1, [2]],
+        [1, [1]],
+    ]
+
+
+def test_dispatch_publishes_identical_jobs_once():
+    for pk in (1, 1, 2):
+        OutboxJob.objects.create(
+            task=reapply_position.name, args=[pk], key="position-{}".format(pk)
+        )
+
+    with patch("apps.base.tasks.current_app.send_task") as send_task:
+        DispatchOutbox().do()
+
+    assert send_task.call_count == 2
+    send_task.assert_any_call(reapply_position.name, args=[1], kwargs={})
+    assert not OutboxJob.objects.exists()
+
+
+def test_dispatch_keeps_the_order_of_the_jobs_of_a_task():
+    for pk in (1, 1, 2, 1):
+        OutboxJob.objects.create(
+            task=reapply_position.name, args=[pk], key="position-{}".format(pk)
+        )
+
+    with patch("apps.base.tasks.current_app.send_task") as send_task:
+        DispatchOutbox().do()
+
+    assert [call.kwargs["args"] for call in send_task.call_args_list] == [[1], [2], [1]]
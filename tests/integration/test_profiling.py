@@ -0,0 +1,67 @@
+import pytest
+
+from apps.base.models import RequestProfile
+from apps.base.profiling import fingerprint, make_token
+
+import tests.factories as f
+import tests.helpers as h
+from tests.mixins import ApiMixin
+
+pytestmark = pytest.mark.django_db
+
+
+def test_fingerprint_ignores_values():
+    assert fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND x = 'a''b'") == fingerprint(
+        "SELECT * FROM t WHERE id IN (%s) AND x = 'c'"
+    )
+
+
+class TestProfiling(ApiMixin):
+    view_name = "position-list"
+
+    def test_requests_are_not_profiled_by_default(
+        self, manager_client, resident_and_staff_subscription
+    ):
+        h.responseOk(manager_client.get(self.reverse()))
+        assert not RequestProfile.objects.exists()
+
+    def test_requests_with_invalid_token_are_not_profiled(
+        self, manager_client, resident_and_staff_subscription
+    ):
+        h.responseOk(manager_client.get(self.reverse(), HTTP_X_PROFILE="invalid"))
+        assert not RequestProfile.objects.exists()
+
+    def test_requests_with_token_are_profiled(
+        self, manager_client, resident_and_staff_subscription
+    ):
+        f.PositionFactory.create_batch(3)
+
+        r = manager_client.get(self.reverse(), HTTP_X_PROFILE=make_token(cprofile=True))
+
+        h.responseOk(r)
+        profile = RequestProfile.objects.get()
+        assert (profile.method, profile.status_code) == ("GET", 200)
+        assert profile.user_id == manager_client.user.pk
+        assert profile.queries > 0
+        assert profile.serializer_time > 0
+        assert "cumulative" in profile.profile
+
+    def test_sampled_requests_are_profiled(
+        self, manager_client, resident_and_staff_subscription, settings
+    ):
+        settings.PROFILING_SAMPLE_RATE = 1
+
+        h.responseOk(manager_client.get(self.reverse()))
+
+        assert RequestProfile.objects.get().profile == ""
+
+    def test_only_the_last_profiles_are_kept(
+        self, manager_client, resident_and_staff_subscription, settings
+    ):
+        settings.PROFILING_BUFFER_SIZE = 2
+        token = make_token()
+
+        for _ in range(3):
+            manager_client.get(self.reverse(), HTTP_X_PROFILE=token)
+
+        assert RequestProfile.objects.count() == 2
@@ -0,0 +1,139 @@
+import datetime
+import json
+
+from django.db import connection
+from django.utils import timezone
+
+import pytest
+
+from apps.trainings.models import Employee, Task, TaskHistory, TaskHistoryStatus
+from apps.trainings.tasks import EmailFacilityCompliant, EmailOverdueTasksThisWeek
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+ANALYZED_TABLES = {
+    Employee._meta.db_table,
+    Task._meta.db_table,
+    TaskHistory._meta.db_table,
+}
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        # The test tables are tiny, so a sequential scan is always the cheapest
+        # plan. Disabling it makes the planner pick an index whenever there is
+        # one it can use, and only fall back to a sequential scan otherwise.
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def assert_uses_index(queryset, index_name):
+    index_names = {node.get("Index Name") for node in plan_nodes(explain(queryset))}
+    assert index_name in index_names, "{} not used, the plan uses {}".format(
+        index_name, ", ".join(sorted(filter(None, index_names))) or "no index"
+    )
+
+
+def get_index_name(model, columns):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return next(
+        name
+        for name, constraint in constraints.items()
+        if constraint["index"] and constraint["columns"] == columns
+    )
+
+
+@pytest.fixture
+def employee():
+    facility = f.FacilityFactory()
+    employees = [f.EmployeeFactory(facility=facility) for _ in range(5)]
+    today = timezone.now().date()
+    for i, employee in enumerate(employees):
+        task_type = f.TaskTypeFactory(name="type {}".format(i))
+        f.TaskFactory(employee=employee, type=task_type, due_date=today)
+        f.TaskHistoryFactory(employee=employee, type=task_type)
+    with connection.cursor() as cursor:
+        for table in ANALYZED_TABLES:
+            cursor.execute("ANALYZE {}".format(table))
+    return employees[0]
+
+
+class TestTaskQueryPlans:
+    def test_expired_tasks(self, employee):
+        queryset = EmailOverdueTasksThisWeek().get_expired_tasks(employee.facility)
+        assert_uses_index(queryset, "trainings_emp_facility_active")
+
+    def test_expiring_tasks(self, employee):
+        queryset = EmailOverdueTasksThisWeek().get_expiring_tasks(employee.facility)
+        assert_uses_index(queryset, "trainings_emp_facility_active")
+
+    def test_required_tasks_by_due_date(self, employee):
+        now = timezone.now().date()
+        queryset = Task.objects.filter(
+            is_optional=False,
+            due_date__gte=now,
+            due_date__lt=now + datetime.timedelta(days=90),
+        )
+        assert_uses_index(queryset, "trainings_task_required_due")
+
+    def test_overdue_tasks_exist(self, employee):
+        job = EmailFacilityCompliant()
+        queryset = Task.objects.filter(
+            due_date__lt=job.now.date(),
+            employee__is_active=True,
+            employee__facility=employee.facility,
+            is_optional=False,
+        )
+        assert_uses_index(queryset, "trainings_emp_facility_active")
+
+    def test_employee_task_of_type(self, employee):
+        history = employee.trainings_taskhistory_set.first()
+        # Served by the index of `unique_together`, which Django names itself.
+        assert_uses_index(
+            Task.objects.filter(employee=employee, type=history.type),
+            get_index_name(Task, ["employee_id", "type_id"]),
+        )
+
+
+class TestTaskHistoryQueryPlans:
+    def test_completed_of_type_by_completion_date(self, employee):
+        history = employee.trainings_taskhistory_set.first()
+        queryset = TaskHistory.objects.filter(
+            employee=employee, status=TaskHistoryStatus.completed, type=history.type
+        ).order_by("-completion_date")
+        assert_uses_index(queryset, "trainings_th_emp_status_type")
+
+    def test_latest_history_of_type(self, employee):
+        history = employee.trainings_taskhistory_set.first()
+        queryset = TaskHistory.objects.filter(employee=employee, type=history.type).order_by(
+            "-expiration_date"
+        )
+        assert_uses_index(queryset, "trainings_th_emp_type_expires")
+
+    def test_completed_type_ids(self, employee):
+        queryset = (
+            employee.trainings_taskhistory_set.filter(status=TaskHistoryStatus.completed)
+            .values_list("type_id", flat=True)
+            .distinct()
+        )
+        assert_uses_index(queryset, "trainings_th_emp_status_type")
+
+
+class TestEmployeeQueryPlans:
+    def test_active_employees_of_facility(self, employee):
+        queryset = Employee.objects.filter(facility=employee.facility, is_active=True)
+        assert_uses_index(queryset, "trainings_emp_facility_active")
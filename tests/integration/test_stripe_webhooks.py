@@ -0,0 +1,198 @@
+import time
+
+from django.urls import reverse
+
+import pytest
+from mock import patch
+
+from apps.subscriptions.models import STRIPE_EVENT_HANDLERS, InvoiceItem, Subscription
+from apps.subscriptions.tasks import process_stripe_events
+from djstripeevents.models import Event
+
+import tests.factories as f
+import tests.helpers as h
+
+pytestmark = pytest.mark.django_db
+
+
+def subscription_event(event_id, subscription, status, created):
+    return {
+        "id": event_id,
+        "type": "customer.subscription.updated",
+        "created": created,
+        "request": None,
+        "pending_webhooks": 1,
+        "data": {
+            "object": {
+                "object": "subscription",
+                "id": subscription.stripe_id,
+                "status": status,
+                "cancel_at_period_end": False,
+                "current_period_start": created,
+                "current_period_end": created + 30 * 24 * 60 * 60,
+            }
+        },
+    }
+
+
+def invoice_event(event_id, subscription, lines, created):
+    return {
+        "id": event_id,
+        "type": "invoice.updated",
+        "created": created,
+        "request": None,
+        "pending_webhooks": 1,
+        "data": {
+            "object": {
+                "object": "invoice",
+                "id": "in_1",
+                "subscription": subscription.stripe_id,
+                "customer": "cus_1",
+                "charge": None,
+                "currency": "usd",
+                "amount_due": 1000,
+                "subtotal": 1000,
+                "tax": None,
+                "total": 1000,
+                "period_start": created,
+                "period_end": created,
+                "receipt_number": None,
+                "attempted": False,
+                "attempt_count": 0,
+                "paid": False,
+                "closed": False,
+                "date": created,
+                "lines": {"data": lines},
+            }
+        },
+    }
+
+
+def invoice_line(stripe_id, amount):
+    return {"id": stripe_id, "currency": "usd", "amount": amount, "description": None}
+
+
+class TestStripeWebhook:
+    def test_events_are_marked_processed(self, client):
+        subscription = f.SubscriptionFactory(stripe_id="sub_1", status=Subscription.Status.active)
+        data = subscription_event("evt_1", subscription, "past_due", int(time.time()))
+
+        r = client.post(reverse("stripe-webhook"), data)
+
+        h.responseOk(r)
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.Status.past_due
+        event = Event.objects.get(stripe_id="evt_1")
+        assert event.processed is not None
+        assert event.latency is not None
+
+    def test_stale_event_is_discarded(self, client):
+        subscription = f.SubscriptionFactory(stripe_id="sub_1", status=Subscription.Status.active)
+        now = int(time.time())
+
+        client.post(
+            reverse("stripe-webhook"), subscription_event("evt_2", subscription, "past_due", now)
+        )
+        client.post(
+            reverse("stripe-webhook"),
+            subscription_event("evt_1", subscription, "active", now - 60),
+        )
+
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.Status.past_due
+
+    def test_retried_event_is_not_applied_twice(self, client):
+        subscription = f.SubscriptionFactory(stripe_id="sub_1", status=Subscription.Status.active)
+        data = subscription_event("evt_1", subscription, "past_due", int(time.time()))
+        client.post(reverse("stripe-webhook"), data)
+        Subscription.objects.filter(pk=subscription.pk).update(status=Subscription.Status.active)
+
+        client.post(reverse("stripe-webhook"), data)
+
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.Status.active
+
+    def test_invoice_items_are_upserted(self, client):
+        subscription = f.SubscriptionFactory(stripe_id="sub_1")
+        now = int(time.time())
+        client.post(
+            reverse("stripe-webhook"),
+            invoice_event("evt_1", subscription, [invoice_line("ii_1", 500)], now),
+        )
+
+        client.post(
+            reverse("stripe-webhook"),
+            invoice_event(
+                "evt_2",
+                subscription,
+                [invoice_line("ii_1", 700), invoice_line("ii_2", 300)],
+                now + 1,
+            ),
+        )
+
+        assert InvoiceItem.objects.count() == 2
+        assert InvoiceItem.objects.get(stripe_id="ii_1").amount == 7
+
+    def test_failed_event_doesnt_block_the_queue(self, client):
+        subscription = f.SubscriptionFactory(stripe_id="sub_1", status=Subscription.Status.active)
+        now = int(time.time())
+
+        def fail(event):
+            raise ValueError("boom")
+
+        with patch.dict(STRIPE_EVENT_HANDLERS, {"customer.subscription.updated": fail}):
+            r = client.post(
+                reverse("stripe-webhook"),
+                subscription_event("evt_1", subscription, "past_due", now),
+            )
+        h.responseOk(r)
+        failed = Event.objects.get(stripe_id="evt_1")
+        assert failed.processed is None
+        assert failed.attempts == 1
+        assert "boom" in failed.error
+
+        client.post(
+            reverse("stripe-webhook"),
+            subscription_event("evt_2", subscription, "past_due", now + 1),
+        )
+
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.Status.past_due
+        assert not Event.objects.filter(processed__isnull=True).exists()
+
+    def test_failed_event_is_retried(self, client):
+        subscription = f.SubscriptionFactory(stripe_id="sub_1", status=Subscription.Status.active)
+        data = subscription_event("evt_1", subscription, "past_due", int(time.time()))
+
+        def fail(event):
+            raise ValueError("boom")
+
+        with patch.dict(STRIPE_EVENT_HANDLERS, {"customer.subscription.updated": fail}):
+            client.post(reverse("stripe-webhook"), data)
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.Status.active
+
+        process_stripe_events()
+
+        subscription.refresh_from_db()
+        assert subscription.status == Subscription.Status.past_due
+        event = Event.objects.get(stripe_id="evt_1")
+        assert event.processed is not None
+        assert event.attempts == 2
+
+    def test_failing_event_is_given_up(self, client, settings):
+        settings.STRIPE_EVENT_MAX_ATTEMPTS = 2
+        subscription = f.SubscriptionFactory(stripe_id="sub_1", status=Subscription.Status.active)
+        data = subscription_event("evt_1", subscription, "past_due", int(time.time()))
+
+        def fail(event):
+            raise ValueError("boom")
+
+        with patch.dict(STRIPE_EVENT_HANDLERS, {"customer.subscription.updated": fail}):
+            client.post(reverse("stripe-webhook"), data)
+            assert Event.objects.get(stripe_id="evt_1").processed is None
+            client.post(reverse("stripe-webhook"), data)
+
+        event = Event.objects.get(stripe_id="evt_1")
+        assert event.processed is not None
+        assert event.attempts == 2
@@ -0,0 +1,89 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+import pytest
+from django_celery_results.models import TaskResult
+from mock import Mock
+
+from apps.base.instrumentation import start_task_probe, stop_task_probe
+from apps.base.models import TaskMetrics
+from apps.base.tasks import PruneTaskResults
+from apps.trainings.models import Facility
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+
+def run_measured(name, queries=2, state="SUCCESS"):
+    task = Mock()
+    task.name = name
+    task.request.is_eager = False
+    start_task_probe(task_id="1", task=task)
+    for _ in range(queries):
+        list(Facility.objects.all())
+    stop_task_probe(task_id="1", task=task, state=state)
+
+
+def test_task_runs_are_measured():
+    f.FacilityFactory()
+    run_measured("tasks.measured", queries=2)
+    run_measured("tasks.measured", queries=1, state="FAILURE")
+
+    metrics = TaskMetrics.objects.get(task="tasks.measured")
+    assert (metrics.runs, metrics.failures) == (2, 1)
+    assert metrics.queries == 3
+    assert metrics.rows == 3
+    assert metrics.wall_time >= metrics.max_wall_time > 0
+
+
+def test_eager_tasks_are_not_measured():
+    task = Mock()
+    task.request.is_eager = True
+    start_task_probe(task_id="1", task=task)
+    stop_task_probe(task_id="1", task=task, state="SUCCESS")
+
+    assert not TaskMetrics.objects.exists()
+
+
+def test_metrics_are_exported_to_scrapers(client, settings):
+    settings.METRICS_TOKEN = "secret"
+    TaskMetrics.objects.create(task="tasks.measured", runs=3)
+
+    response = client.get("/metrics/tasks", HTTP_AUTHORIZATION="Bearer secret")
+
+    assert response.status_code == 200
+    assert 'celery_task_runs{task="tasks.measured"} 3' in response.content.decode()
+
+
+def test_metrics_are_not_exported_to_anonymous_users(client, settings):
+    settings.METRICS_TOKEN = "secret"
+
+    response = client.get("/metrics/tasks", HTTP_AUTHORIZATION="Bearer wrong")
+
+    assert response.status_code == 302
+
+
+def test_command_summarizes_metrics():
+    TaskMetrics.objects.create(task="tasks.measured", runs=2, wall_time=3)
+    stdout = StringIO()
+
+    call_command("task_metrics", "--reset", stdout=stdout)
+
+    assert "tasks.measured" in stdout.getvalue()
+    assert not TaskMetrics.objects.exists()
+
+
+def test_old_task_results_are_pruned(settings):
+    old = TaskResult.objects.create(task_id="old")
+    recent = TaskResult.objects.create(task_id="recent")
+    TaskResult.objects.filter(pk=old.pk).update(
+        date_done=timezone.now() - settings.TASK_RESULT_RETENTION - datetime.timedelta(days=1)
+    )
+
+    PruneTaskResults().do()
+
+    assert list(TaskResult.objects.values_list("pk", flat=True)) == [recent.pk]
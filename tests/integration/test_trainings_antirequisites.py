@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+from apps.trainings.antirequisites import apply_antirequisites, get_employee_antirequisites
+from apps.trainings.models import Task, TaskHistoryStatus
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+
+def test_get_employee_antirequisites():
+    antirequisite = f.AntirequisiteFactory(valid_after_hire_date=date(2015, 7, 4))
+    hired_before = f.EmployeeFactory(date_of_hire=date(2015, 7, 3))
+    hired_after = f.EmployeeFactory(date_of_hire=date(2015, 7, 4))
+    completed = f.EmployeeFactory(date_of_hire=date(2015, 7, 4))
+    f.TaskHistoryFactory(
+        employee=completed,
+        type=antirequisite.antirequisite_of,
+        status=TaskHistoryStatus.completed,
+    )
+
+    pairs = get_employee_antirequisites([hired_before, hired_after, completed])
+
+    assert pairs == [(hired_after, antirequisite)]
+
+
+def test_apply_antirequisites(django_assert_num_queries):
+    antirequisite = f.AntirequisiteFactory(
+        task_type__is_one_off=True,
+        valid_after_hire_date=date(2015, 7, 4),
+        due_date=date(2016, 1, 1),
+    )
+    new, existing, done = [f.EmployeeFactory(date_of_hire=date(2015, 7, 4)) for _ in range(3)]
+    task = Task.objects.create(employee=existing, type=antirequisite.task_type)
+    f.TaskHistoryFactory(
+        employee=done,
+        type=antirequisite.task_type,
+        status=TaskHistoryStatus.completed,
+        completion_date=date(2015, 8, 1),
+    )
+
+    with django_assert_num_queries(4):
+        apply_antirequisites((employee, antirequisite) for employee in (new, existing, done))
+
+    created = Task.objects.get(employee=new, type=antirequisite.task_type)
+    assert created.antirequisite == antirequisite
+    assert created.due_date == date(2016, 1, 1)
+    task.refresh_from_db()
+    assert task.due_date == date(2016, 1, 1)
+    assert not Task.objects.filter(employee=done, type=antirequisite.task_type).exists()
@@ -16,6 +16,7 @@ from apps.trainings.models import (
     TaskHistoryStatus,
     TaskStatus,
 )
+from apps.trainings.tasks import apply_facility_questions
 
 import tests.factories as f
 
@@ -90,6 +91,22 @@ class TestTask:
         with pytest.raises(RuntimeError):
             Task.objects.bulk_create([Task()])
 
+    def test_bulk_create_missing_skips_existing_tasks(self):
+        employee = f.EmployeeFactory()
+        existing = f.TaskFactory(employee=employee, due_date=date(2014, 1, 2))
+        task_type = f.TaskTypeFactory()
+
+        tasks = Task.objects.bulk_create_missing(
+            [
+                Task(employee=employee, type=existing.type),
+                Task(employee=employee, type=task_type),
+                Task(employee=employee, type=task_type),
+            ]
+        )
+        assert sorted(task.type_id for task in tasks) == sorted([existing.type_id, task_type.pk])
+        assert all(task.pk for task in tasks)
+        assert Task.objects.get(pk=existing.pk).due_date == date(2014, 1, 2)
+
     def test_duplicate_task_chooses_earlier_due_date(self):
         employee = f.EmployeeFactory()
         task_type = f.TaskTypeFactory()
@@ -259,6 +276,30 @@ class TrainingEventFinishTests(TestCase):
             type=training_for, employee=attendee, status=TaskHistoryStatus.incomplete
         )
 
+    def test_tasks_and_superseded_tasks_updated_for_every_attendee(self):
+        training_for = f.TaskTypeFactory(validity_period=timedelta(days=365))
+        superseded = f.TaskTypeFactory()
+        training_for.supersedes.add(superseded)
+        attendees = [f.EmployeeFactory() for _ in range(3)]
+        for attendee in attendees:
+            f.TaskFactory(type=training_for, employee=attendee)
+            f.TaskFactory(type=superseded, employee=attendee, due_date=date(2000, 1, 1))
+        event = f.TrainingEventFactory(training_for=training_for, attendees=attendees)
+
+        event.finish([attendees[0].pk])
+
+        incomplete = TaskHistory.objects.get(employee=attendees[0], type=training_for)
+        self.assertEqual(TaskHistoryStatus.incomplete, incomplete.status)
+        for attendee in attendees[1:]:
+            history = TaskHistory.objects.get(
+                type=training_for, employee=attendee, status=TaskHistoryStatus.completed
+            )
+            task = Task.objects.get(employee=attendee, type=training_for)
+            self.assertEqual(history.expiration_date, task.due_date)
+            self.assertEqual(TaskStatus.open, task.status)
+            task = Task.objects.get(employee=attendee, type=superseded)
+            self.assertEqual(history.expiration_date, task.due_date)
+
 
 class TrainingEventFinishContinuingEdTests(TestCase):
     def setUp(self):
@@ -390,6 +431,42 @@ class TaskTypeAutoCreateTaskForEmployeeTests:
         self.assertEqual(1, len(tasks))
 
 
+class TestTaskTypeChanges:
+    def test_unrelated_change_doesnt_touch_tasks(self):
+        responsibility = f.ResponsibilityFactory()
+        task_type = f.TaskTypeFactory(required_for=[responsibility])
+        employee = f.EmployeeFactory(other_responsibilities=[responsibility])
+        task = Task.objects.get(employee=employee, type=task_type)
+
+        task_type.name = "New name"
+        with patch("apps.trainings.signals.recompute_task_type.delay") as recompute:
+            task_type.save()
+
+        recompute.assert_not_called()
+        assert Task.objects.get(pk=task.pk).modified == task.modified
+
+    def test_required_within_change_recomputes_due_dates(self):
+        responsibility = f.ResponsibilityFactory()
+        task_type = f.TaskTypeFactory(required_for=[responsibility])
+        employee = f.EmployeeFactory(other_responsibilities=[responsibility])
+
+        task_type.required_within = timedelta(days=30)
+        task_type.save()
+
+        task = Task.objects.get(employee=employee, type=task_type)
+        assert task.due_date == employee.date_of_hire + timedelta(days=30)
+
+    def test_capacity_change_deletes_tasks_out_of_capacity(self):
+        responsibility = f.ResponsibilityFactory()
+        task_type = f.TaskTypeFactory(required_for=[responsibility])
+        employee = f.EmployeeFactory(other_responsibilities=[responsibility])
+
+        task_type.min_capacity = employee.facility.capacity + 1
+        task_type.save()
+
+        assert not Task.objects.filter(employee=employee, type=task_type).exists()
+
+
 class AllowedTaskTypeTests(TestCase):
     def test_no_prereq(self):
         f.TaskTypeFactory()
@@ -772,6 +849,14 @@ class FacilityQuestionRuleTest(TestCase):
         self.assertIn(new_responsibility, responsibilities)
         self.assertEqual(2, responsibilities.count())
 
+    def test_late_question_job_applies_the_current_answers(self):
+        self.facility.questions.remove(self.question)
+
+        # A job of the earlier add, run after the removal.
+        apply_facility_questions(self.facility.pk, [self.question.pk])
+
+        self.assertNotIn(self.responsibility, self.employee.other_responsibilities.all())
+
 
 class AntirequisiteTest(TestCase):
     def test_old_employees_must_have_antirequisite_task(self):
@@ -1012,6 +1097,21 @@ class FacilityTest(TestCase):
             assert (task_type.id,) in ids
             assert (task_type_2.id,) in ids
 
+    def test_update_capacity_moves_employee_requirements(self):
+        facility = f.FacilityFactory(capacity=4)
+        responsibility = f.ResponsibilityFactory()
+        small = f.TaskTypeFactory(required_for=[responsibility], min_capacity=1, max_capacity=5)
+        large = f.TaskTypeFactory(required_for=[responsibility], min_capacity=6)
+        employee = f.EmployeeFactory(facility=facility, other_responsibilities=[responsibility])
+        assert list(employee.trainings_task_set.values_list("type_id", flat=True)) == [small.id]
+
+        facility.capacity = 10
+        facility.save()
+
+        task = employee.trainings_task_set.get()
+        assert task.type == large
+        assert task.due_date == employee.date_of_hire + timedelta(days=3)
+
 
 class TestGlobalRequirement:
     def test_employee_task_is_created_when_requirement_is_created(self):
@@ -1090,3 +1190,35 @@ class TestFacilityQuestionsChanged:
         facility.questions.add(question_rule.facility_question)
         facility.questions.remove(question_rule.facility_question)
         assert employee.other_responsibilities.count() == 0
+
+    def test_creates_and_deletes_tasks_of_responsibility_when_question_toggled(self):
+        facility = f.FacilityFactory()
+        nurse = f.PositionFactory()
+        get_good = f.ResponsibilityFactory()
+        task_type = f.TaskTypeFactory(required_for=[get_good])
+        employees = [f.EmployeeFactory(positions=[nurse]) for _ in range(3)]
+
+        question_rule = f.FacilityQuestionRuleFactory(position=nurse, responsibility=get_good)
+        facility.questions.add(question_rule.facility_question)
+        for employee in employees:
+            task = employee.trainings_task_set.get(type=task_type)
+            assert task.due_date == employee.date_of_hire + task_type.required_within
+
+        facility.questions.remove(question_rule.facility_question)
+        for employee in employees:
+            assert not employee.trainings_task_set.filter(type=task_type).exists()
+
+    def test_keeps_tasks_still_required_when_question_removed(self):
+        facility = f.FacilityFactory()
+        nurse = f.PositionFactory()
+        get_good = f.ResponsibilityFactory()
+        stay_good = f.ResponsibilityFactory()
+        task_type = f.TaskTypeFactory(required_for=[get_good, stay_good])
+        employee = f.EmployeeFactory(positions=[nurse])
+        employee.other_responsibilities.add(stay_good)
+
+        question_rule = f.FacilityQuestionRuleFactory(position=nurse, responsibility=get_good)
+        facility.questions.add(question_rule.facility_question)
+        facility.questions.remove(question_rule.facility_question)
+        assert list(employee.other_responsibilities.all()) == [stay_good]
+        assert employee.trainings_task_set.filter(type=task_type).exists()
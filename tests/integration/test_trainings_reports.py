@@ -0,0 +1,80 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.utils import timezone
+
+import pytest
+
+from apps.trainings.models import (
+    Employee,
+    Task,
+    TaskHistory,
+    TaskHistoryCertificatePage,
+    TaskStatus,
+)
+from apps.trainings.reports import (
+    load_employee_rows,
+    load_task_history_rows,
+    load_task_rows,
+    order_by_ids,
+)
+
+import tests.factories as f
+
+pytestmark = pytest.mark.django_db
+
+
+def test_order_by_ids():
+    Obj = namedtuple("Obj", "pk")
+    objects = [Obj(1), Obj(2), Obj(3)]
+
+    assert order_by_ids(objects, [3, 1, 2]) == [Obj(3), Obj(1), Obj(2)]
+
+
+def test_load_employee_rows(django_assert_num_queries):
+    position = f.PositionFactory(name="Cook")
+    for _ in range(3):
+        f.EmployeeFactory().positions.set([position])
+
+    with django_assert_num_queries(2):
+        rows = load_employee_rows(Employee.objects.all())
+
+    assert [row.positions for row in rows] == ["Cook"] * 3
+
+
+def test_load_task_rows(django_assert_num_queries):
+    training = f.TaskTypeFactory(is_training=True)
+    now = timezone.now()
+    for _ in range(3):
+        task = f.TaskFactory(type=training, status=TaskStatus.scheduled)
+        for days in (5, -2):
+            event = f.TrainingEventFactory(
+                training_for=training,
+                start_time=now + timedelta(days=days),
+                end_time=now + timedelta(days=days, hours=1),
+            )
+            event.employee_tasks.add(task)
+
+    with django_assert_num_queries(2):
+        rows = load_task_rows(Task.objects.all())
+        for row in rows:
+            assert row.scheduled_event.start_time == now - timedelta(days=2)
+            assert row.status_name == "Awaiting Certificate"
+            assert row.task.employee.first_name
+            assert row.task.type.name
+
+
+def test_load_task_history_rows(django_assert_num_queries):
+    for _ in range(3):
+        certificate = f.TaskHistoryCertificateFactory()
+        for name in ("first.png", "second.pdf"):
+            TaskHistoryCertificatePage.objects.create(certificate=certificate, page=name)
+    f.TaskHistoryFactory()
+
+    with django_assert_num_queries(2):
+        rows = load_task_history_rows(TaskHistory.objects.order_by("pk"))
+
+    assert [row.certificate is not None for row in rows] == [True, True, True, False]
+    for row in rows[:3]:
+        assert row.first_page.page.name == "first.png"
+        assert row.first_page.isImage
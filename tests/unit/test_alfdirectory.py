@@ -0,0 +1,38 @@
+import pytest
+from mock import MagicMock, patch
+
+from apps.alfdirectory.utils import ParsedFacility, import_facilities_from_pdf, parse_facilities
+
+DIRECTORY_TEXT = """
+      SUNNY ACRES ALF                      LIC TYPE: ALF
+      License #12345
+      OSS BEDS : 4
+                                                          PRIVATE BEDS :
+                                                          20
+      QUIET PINES                          LIC TYPE: ALF
+      License #67890
+      OSS BEDS :
+                                                          PRIVATE BEDS :
+                                                          8
+"""
+
+
+def test_parse_facilities_streams_each_facility():
+    facilities = list(parse_facilities(iter(DIRECTORY_TEXT.splitlines(keepends=True))))
+
+    assert facilities == [
+        ParsedFacility(name="SUNNY ACRES ALF", license_number="12345", oss_beds=4, private_beds=20),
+        ParsedFacility(name="QUIET PINES", license_number="67890", oss_beds=0, private_beds=8),
+    ]
+
+
+def test_pdftotext_is_stopped_when_the_parsing_fails():
+    process = MagicMock()
+    with patch("apps.alfdirectory.utils.subprocess.Popen", return_value=process), patch(
+        "apps.alfdirectory.utils.parse_facilities", side_effect=ValueError
+    ):
+        with pytest.raises(ValueError):
+            import_facilities_from_pdf("directory.pdf")
+
+    process.kill.assert_called_once_with()
+    process.wait.assert_called_once_with()
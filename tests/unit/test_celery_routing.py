@@ -0,0 +1,35 @@
+from django.conf import settings
+
+from celery import Celery
+from celery.signals import celeryd_init
+
+from apps.celery import app
+
+
+def route(task_name):
+    return app.amqp.router.route({}, task_name)
+
+
+def test_tasks_are_routed_by_kind_of_work():
+    assert route("apps.residents.tasks.send_ltc_status_notification")["routing_key"] == (
+        "interactive"
+    )
+    assert route("apps.trainings.tasks.reapply_employee_positions")["routing_key"] == "bulk"
+    assert route("apps.trainings.tasks.regenerate_task_certificates")["routing_key"] == (
+        "cpu_heavy"
+    )
+    assert route("apps.trainings.tasks.email_monthly_reminders")["queue"].name == "default"
+
+
+def test_admin_changes_jump_ahead_of_beat_reconciliations():
+    urgent = route("apps.trainings.tasks.apply_antirequisite")
+    beat = route("apps.base.tasks.run_job_part")
+    assert urgent["priority"] > beat["priority"]
+
+
+def test_worker_gets_the_settings_of_its_queue():
+    conf = Celery("test").conf
+    celeryd_init.send(sender="worker", conf=conf, options={"queues": "cpu_heavy"}, instance=None)
+
+    for key, value in settings.QUEUE_WORKER_SETTINGS["cpu_heavy"].items():
+        assert conf[key] == value
@@ -0,0 +1,113 @@
+import gzip
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+import brotli
+from rest_framework.renderers import JSONRenderer
+
+from apps.api.fields import TimedeltaField
+from apps.api.renderers import FastJSONRenderer
+from apps.base.middleware import CompressionMiddleware, get_accepted_encodings
+
+DATA = [
+    {
+        "id": 1,
+        "name": "Fire safety   é",
+        "completed": datetime(2023, 3, 4, 10, 11, 12, 345678, tzinfo=timezone.utc),
+        "local": datetime(2023, 3, 4, 10, 11, 12),
+        "date": date(2023, 3, 4),
+        "time": time(8, 30, 15, 5000),
+        "hours": Decimal("1.50"),
+        "ratio": 0.1,
+        "duration": timedelta(hours=2, seconds=1),
+        "validity": TimedeltaField().to_representation(timedelta(days=365)),
+        "label": gettext_lazy("Yes"),
+        "tags": ("a", "b"),
+        "nested": {"empty": [], "none": None, 3: True},
+    }
+]
+
+
+def test_fast_renderer_renders_like_json_renderer():
+    assert FastJSONRenderer().render(DATA) == JSONRenderer().render(DATA)
+
+
+def test_fast_renderer_indents_like_json_renderer():
+    accepted = "application/json; indent=4"
+    assert FastJSONRenderer().render(DATA, accepted) == JSONRenderer().render(DATA, accepted)
+
+
+def test_fast_renderer_renders_large_integers():
+    data = {"big": 2**70}
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_fast_renderer_renders_nothing_for_none():
+    assert FastJSONRenderer().render(None) == b""
+
+
+def compress(response, accept_encoding="gzip, deflate, br"):
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+def json_response(size=2048):
+    response = HttpResponse(b"[" + b"1," * (size // 2) + b"1]", content_type="application/json")
+    response["ETag"] = '"abc"'
+    return response
+
+
+def test_accepted_encodings():
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip;q=0, BR; q=0.5, identity")
+    assert get_accepted_encodings(request) == {"br", "identity"}
+
+
+def test_compresses_large_responses():
+    original = json_response()
+    content = original.content
+    response = compress(original, "gzip")
+
+    assert response["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.content) == content
+    assert response["Content-Length"] == str(len(response.content))
+    assert response["Vary"] == "Accept-Encoding"
+    assert response["ETag"] == 'W/"abc"'
+
+
+@override_settings(COMPRESSION_MIN_SIZE=4096)
+def test_doesnt_compress_small_responses():
+    response = compress(json_response(2048))
+    assert not response.has_header("Content-Encoding")
+
+
+def test_doesnt_compress_when_not_accepted():
+    response = compress(json_response(), "identity")
+    assert not response.has_header("Content-Encoding")
+    assert response["Vary"] == "Accept-Encoding"
+
+
+def test_doesnt_compress_compressed_types():
+    response = compress(HttpResponse(b"%PDF" * 1000, content_type="application/pdf"))
+    assert not response.has_header("Content-Encoding")
+
+
+def test_compresses_streaming_responses_with_gzip():
+    original = StreamingHttpResponse([b"a" * 2048] * 2, content_type="text/csv")
+    response = compress(original)
+
+    assert response["Content-Encoding"] == "gzip"
+    assert gzip.decompress(b"".join(response.streaming_content)) == b"a" * 4096
+
+
+def test_prefers_brotli():
+    original = json_response()
+    content = original.content
+    response = compress(original)
+
+    assert response["Content-Encoding"] == "br"
+    assert brotli.decompress(response.content) == content
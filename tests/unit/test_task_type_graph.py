@@ -0,0 +1,76 @@
+import uuid
+
+import pytest
+
+from apps.trainings.graph import TaskTypeGraph, get_task_type_graph, recheck_task_type_graph
+from apps.trainings.models import TaskType, TaskTypeGraphVersion
+
+import tests.factories as f
+
+TASK_TYPES = [(1, None, False), (2, 1, False), (3, None, True), (4, None, False)]
+
+
+@pytest.fixture
+def graph():
+    return TaskTypeGraph(
+        version=1,
+        task_types=TASK_TYPES,
+        prerequisites=[(2, 1), (4, 2), (4, 4), (1, 4)],
+        supersedes=[(4, 1), (4, 3)],
+    )
+
+
+def test_relations(graph):
+    assert graph.ids == (1, 2, 3, 4)
+    assert graph.one_off_ids == {3}
+    assert graph.supersedes[4] == (1, 3)
+    assert graph.superseded_by[1] == (4,)
+    assert graph.superseded_by[2] == ()
+    assert graph.required_after_self[1] == (2,)
+
+
+def test_is_immutable(graph):
+    with pytest.raises(TypeError):
+        graph.prerequisites[1] = ()
+
+
+def test_allowed_by_prerequisites(graph):
+    assert graph.allowed_by_prerequisites([]) == [3]
+    assert graph.allowed_by_prerequisites([4]) == [1, 3]
+    assert graph.allowed_by_prerequisites([1, 2, 4]) == [1, 2, 3, 4]
+
+
+def test_with_prerequisites_handles_cycles(graph):
+    assert graph.with_prerequisites(2) == {1, 2, 4}
+    assert graph.with_prerequisites(3) == {3}
+
+
+@pytest.mark.django_db
+def test_graph_is_rebuilt_when_relations_change():
+    task_type = f.TaskTypeFactory()
+    prerequisite = f.TaskTypeFactory()
+    assert get_task_type_graph().prerequisites[task_type.pk] == ()
+
+    task_type.prerequisites.add(prerequisite)
+    assert get_task_type_graph().prerequisites[task_type.pk] == (prerequisite.pk,)
+
+    task_type.prerequisites.clear()
+    graph = get_task_type_graph()
+    assert graph.prerequisites[task_type.pk] == ()
+    assert get_task_type_graph() is graph
+
+
+@pytest.mark.django_db
+def test_graph_version_is_read_once_per_request(django_assert_num_queries):
+    task_type = f.TaskTypeFactory()
+    graph = get_task_type_graph()
+    with django_assert_num_queries(0):
+        assert get_task_type_graph() is graph
+
+    # Changed without signals, e.g. by another process.
+    TaskType.objects.filter(pk=task_type.pk).update(is_one_off=True)
+    TaskTypeGraphVersion.objects.update(version=uuid.uuid4())
+    assert get_task_type_graph() is graph
+
+    recheck_task_type_graph()
+    assert task_type.pk in get_task_type_graph().one_off_ids